@@ -0,0 +1,236 @@
+# FQSHA - Fault-based Seismic Hazard Assessment Toolkit
+# Copyright (C) 2025 Tavakolizadeh et al., (2025)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# run_benchmarks.py
+
+"""
+Benchmarks of the moment budget to OpenQuake inputs stages on synthetic fault catalogs.
+
+Each stage is timed separately (best of `--repeat` runs, stdout discarded), then run once
+more under `tracemalloc` for its peak memory. The results are written as JSON, together
+with the commit and the environment, so that runs of different commits can be compared::
+
+    python benchmarks/run_benchmarks.py --sizes 10 1000 --output base.json
+    git checkout my-branch
+    python benchmarks/run_benchmarks.py --sizes 10 1000 --output new.json --compare base.json
+"""
+
+import argparse
+import contextlib
+import copy
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fqsha import Pipeline
+from fqsha.FQSHA_Functions import conflate_pdfs, export_faults_to_xml
+from fqsha.OpenQuake_input_generator import generate_job_ini
+from fqsha.SeismicActivityRate import MAG_STEP, momentbudget, sactivityrate
+from synthetic import synthetic_faults
+
+RESULTS_VERSION = 1
+
+DEFAULT_SIZES = (10, 1000, 10000, 100000)
+
+# Magnitude estimates conflated per fault in the conflate_pdfs stage, and faults per call
+CONFLATION_ESTIMATES = 5
+CONFLATION_CHUNK = 512
+
+FAULT_BEHAVIOURS = {
+    "CG-BPT": "Characteristic Gaussian",
+    "CG-Poisson": "Characteristic Gaussian",
+    "TGR": "Truncated Gutenberg Richter",
+}
+
+
+def _budget_faults(faults):
+    """Returns a copy of `faults` with the moment budget results, as read by `sactivityrate`."""
+    budget = copy.deepcopy(faults)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        momentbudget(budget, 0.5, 0.2, 0.3, 'output_files', 'NAN, "",NaN', 'NAN, "",NaN', plots='none')
+    for fault in budget.values():
+        fault['mag_scale'] = Pipeline.DEFAULT_SETTINGS["mag_scale"]
+    return budget
+
+
+def _conflation_inputs(faults):
+    """Normal magnitude PDFs around Mobs, `CONFLATION_ESTIMATES` per fault, on a shared grid."""
+    rng = np.random.default_rng(0)
+    mobs = np.array([fault['Mobs'] for fault in faults.values()])
+    means = mobs[:, None] + rng.normal(0, 0.2, (len(mobs), CONFLATION_ESTIMATES))
+    sds = rng.uniform(0.1, 0.4, means.shape)
+    x = np.arange(4.0, 9.0 + MAG_STEP / 2, MAG_STEP)
+    return x, means, sds
+
+
+def _run_conflation(x, means, sds):
+    for start in range(0, len(means), CONFLATION_CHUNK):
+        m, s = means[start:start + CONFLATION_CHUNK, :, None], sds[start:start + CONFLATION_CHUNK, :, None]
+        pdfs = np.exp(-0.5 * ((x - m) / s) ** 2) / (s * np.sqrt(2 * np.pi))
+        conflate_pdfs(x, pdfs)
+
+
+def stages(faults, workdir):
+    """
+    Yields ``(stage name, setup, run)`` for each benchmarked stage. ``setup()`` prepares the
+    arguments outside of the measurement and ``run(*arguments)`` is the measured call.
+    """
+    yield ("momentbudget", lambda: (copy.deepcopy(faults),),
+           lambda f: momentbudget(f, 0.5, 0.2, 0.3, 'output_files', 'NAN, "",NaN', 'NAN, "",NaN', plots='none'))
+
+    budget = _budget_faults(faults)
+    last = next(reversed(budget))
+    for label, behaviour in FAULT_BEHAVIOURS.items():
+        def setup(label=label):
+            subset = copy.deepcopy(budget)
+            # The characteristic model is BPT when the last fault has an elapsed time
+            subset[last]['Telap'] = 0 if label == "CG-Poisson" else 100.0
+            return (subset,)
+        yield (f"sactivityrate[{label}]", setup,
+               lambda f, behaviour=behaviour: sactivityrate(f, behaviour, 50.0, 0.1, 'output_files', plots='none'))
+
+    conflation = _conflation_inputs(faults)
+    yield "conflate_pdfs", lambda: conflation, _run_conflation
+
+    rates = copy.deepcopy(budget)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        sactivityrate(rates, "Truncated Gutenberg Richter", 50.0, 0.1, 'output_files', plots='none')
+    yield ("export_faults_to_xml", lambda: (rates, tempfile.mkdtemp(dir=workdir)),
+           export_faults_to_xml)
+
+    inputs = Pipeline.settings_to_inputs(Pipeline.DEFAULT_SETTINGS, rates)
+    yield ("generate_job_ini", lambda: (inputs, tempfile.mkdtemp(dir=workdir), rates),
+           generate_job_ini)
+
+
+def measure(setup, run, repeat, memory=True):
+    """Returns the best wall time of `repeat` runs and the peak traced memory in MB (or None)."""
+    best = float('inf')
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            args = setup()
+            start = time.perf_counter()
+            run(*args)
+            best = min(best, time.perf_counter() - start)
+        peak_mb = None
+        if memory:
+            args = setup()
+            tracemalloc.start()
+            try:
+                run(*args)
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            finally:
+                tracemalloc.stop()
+    return best, peak_mb
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "version": RESULTS_VERSION,
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmarks(sizes, repeat=3, memory=True, seed=0):
+    """Runs every stage on a synthetic catalog of each size and returns the results dictionary."""
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # The stages write their text tables in the working directory
+        os.chdir(workdir)
+        try:
+            for size in sizes:
+                faults = synthetic_faults(size, seed=seed)
+                for name, setup, run in stages(faults, workdir):
+                    seconds, peak_mb = measure(setup, run, repeat, memory)
+                    results.append({"stage": name, "faults": size, "seconds": seconds,
+                                    "repeats": repeat, "peak_mb": peak_mb})
+                    peak = f"{peak_mb:10.1f} MB" if peak_mb is not None else ""
+                    print(f"{name:32s} {size:>7d} faults {seconds:10.4f} s {peak}", flush=True)
+        finally:
+            os.chdir(cwd)
+    return dict(environment(), results=results)
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Prints the relative change of each (stage, faults) timing present in both result dictionaries
+    and returns the list of regressions, i.e. the stages more than `threshold` slower.
+    """
+    previous = {(r["stage"], r["faults"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get((result["stage"], result["faults"]))
+        if before is None:
+            continue
+        change = result["seconds"] / before["seconds"] - 1 if before["seconds"] > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(dict(result, baseline_seconds=before["seconds"], change=change))
+            flag = "  ⚠️ slower"
+        print(f"{result['stage']:32s} {result['faults']:>7d} faults {before['seconds']:10.4f} s -> "
+              f"{result['seconds']:10.4f} s ({change:+.1%}){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="numbers of faults of the synthetic catalogs")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage (the best is kept)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic catalogs")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc peak-memory run")
+    parser.add_argument('--output', help="JSON file for the results")
+    parser.add_argument('--compare', metavar='BASELINE', help="results JSON of a previous run to compare with")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="relative slowdown reported as a regression by --compare")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, repeat=args.repeat, memory=not args.no_memory, seed=args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# FQSHA - Fault-based Seismic Hazard Assessment Toolkit
+# Copyright (C) 2025 Tavakolizadeh et al., (2025)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# synthetic.py
+
+"""
+Synthetic fault catalogs in the JSON input schema (see ``fqsha/tests/Faults_test.json``).
+"""
+
+import numpy as np
+
+# Scaling relationship codes, with the rake of their fault kind
+SCALING_RAKES = {"WC94-N": -90, "WC94-R": 90, "WC94-S": 0, "WC94-A": 90,
+                 "Le10-D": 90, "Le10-S": 0, "Le10-SCR": 90}
+
+# Faults per square degree, so that large catalogs cover a proportionally larger region
+DENSITY = 2.0
+
+
+def synthetic_faults(nfault, seed=0):
+    """
+    Returns a dictionary of `nfault` faults with random but plausible parameters.
+
+    The same `nfault` and `seed` always give the same catalog. About 20% of the faults have
+    no Last_eq_time and 10% no ShearModulus or StrainDrop, which exercises the defaults.
+    """
+    rng = np.random.default_rng(seed)
+    codes = list(SCALING_RAKES)
+    side = max(np.sqrt(nfault / DENSITY), 1.0)
+    faults = {}
+    for i in range(nfault):
+        code = codes[i % len(codes)]
+        upper = int(rng.integers(0, 10))
+        lower = upper + int(rng.integers(5, 20))
+        srmin = float(rng.uniform(0.1, 5.0))
+        length = float(np.round(rng.uniform(8, 200), 1))
+
+        # Trace of 2 to 8 vertices, `length` km long
+        nvertex = int(rng.integers(2, 9))
+        strike = rng.uniform(0, 2 * np.pi)
+        headings = strike + rng.normal(0, 0.15, nvertex - 1)
+        steps = length / (nvertex - 1) / 111.2
+        start = np.array([50.0 + rng.uniform(0, side), 30.0 + rng.uniform(0, side)])
+        offsets = np.cumsum(np.column_stack([np.sin(headings), np.cos(headings)]) * steps, axis=0)
+        trace = np.vstack([start, start + offsets])
+
+        faults[f"F{i}"] = {
+            "ScR": code,
+            "year_for_calculations": 2024,
+            "Length": length,
+            "Dip": int(rng.integers(20, 90)),
+            "upperSeismoDepth": upper,
+            "lowerSeismoDepth": lower,
+            "SRmin": round(srmin, 2),
+            "SRmax": round(srmin * float(rng.uniform(1.1, 2.0)), 2),
+            "Mobs": float(np.round(rng.uniform(5.0, 7.8), 1)),
+            "sdMobs": float(np.round(rng.uniform(0.05, 0.3), 2)),
+            "Last_eq_time": None if rng.random() < 0.2 else int(rng.integers(1000, 2020)),
+            "SCC": float(np.round(rng.uniform(0.1, 1.0), 3)),
+            "ShearModulus": None if rng.random() < 0.1 else 3,
+            "StrainDrop": None if rng.random() < 0.1 else 3,
+            "Mmin": 5.0,
+            "b-value": 1.0,
+            "fault_rake": SCALING_RAKES[code],
+            "fault_trace": np.round(trace, 6).tolist(),
+        }
+    return faults
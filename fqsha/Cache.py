@@ -0,0 +1,184 @@
+# FQSHA - Fault-based Seismic Hazard Assessment Toolkit
+# Copyright (C) 2025 Tavakolizadeh et al., (2025)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Cache.py
+
+import hashlib
+import json
+import os
+
+from .FQSHA_Functions import _json_default
+
+
+# Bumped whenever momentbudget changes its results, so old entries are ignored
+CACHE_VERSION = 4
+
+# Parameters of `momentbudget` that enter the cache key
+CACHE_PARAMETERS = ("Zeta", "Khi", "Siggma")
+
+
+def fault_cache_key(fault_name, record, parameters):
+    """
+    Returns the SHA-256 hex digest identifying the results of one fault.
+
+    Parameters
+    ----------
+    fault_name : str
+        Name of the fault.
+    record : dict
+        Input parameters of the fault, before `momentbudget` updates them.
+    parameters : dict
+        Values of `CACHE_PARAMETERS`.
+    """
+    payload = {
+        "version": CACHE_VERSION,
+        "name": fault_name,
+        "record": record,
+        "parameters": {key: parameters[key] for key in CACHE_PARAMETERS},
+    }
+    text = json.dumps(payload, sort_keys=True, default=_json_default, allow_nan=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of per-fault results, one JSON file per key, with size-bounded LRU eviction.
+
+    Reading an entry refreshes its modification time, and `evict` removes the least recently
+    used entries until the folder holds at most `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 2 ** 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def __contains__(self, key):
+        return os.path.isfile(self._path(key))
+
+    def __len__(self):
+        return sum(1 for entry in os.scandir(self.directory) if entry.name.endswith('.json'))
+
+    def get(self, key):
+        """Returns the record stored under `key`, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return record
+
+    def put(self, key, record):
+        """Stores `record` (a JSON-serializable dict, NumPy values allowed) under `key`."""
+        path = self._path(key)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(record, f, default=_json_default, allow_nan=True)
+        os.replace(temporary, path)
+
+    def evict(self):
+        """Removes the least recently used entries beyond `max_bytes`. Returns the number removed."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                os.remove(entry.path)
+
+
+def renumber_faults(faults, start=1):
+    """
+    Gives the faults processed by `momentbudget` consecutive ids from `start` in catalog order,
+    as a single uncached run does, after faults from the cache and fresh results are merged
+    (or after a catalog is processed in chunks). Returns the next free id.
+    """
+    kk = start
+    for fault in faults.values():
+        if 'id' not in fault:
+            continue
+        fault['id'] = kk
+        kk = kk + 1
+    return kk
+
+
+def cached_seismic_activity(faults, parameters, compute, cache):
+    """
+    Serves the faults found in `cache` and runs `compute` on the others only.
+
+    Parameters
+    ----------
+    faults : dict
+        Fault parameters keyed by fault name, updated in place.
+    parameters : dict
+        Values of `CACHE_PARAMETERS` for this run.
+    compute : callable
+        ``compute(subset)`` runs momentbudget on a fault dictionary in place.
+    cache : ResultCache
+        Cache of previous results.
+
+    Returns
+    -------
+    list of str
+        Names of the faults served from the cache.
+
+    Notes
+    -----
+    - Only the moment budget is cached: run `sactivityrate` on the merged `faults`
+      afterwards, so its tables and figures cover every fault with its final id.
+    - Faults rejected by `momentbudget` (no id) are never cached.
+    """
+    keys = {name: fault_cache_key(name, record, parameters) for name, record in faults.items()}
+    cached = {name: cache.get(key) for name, key in keys.items()}
+    misses = {name: faults[name] for name in faults if cached[name] is None}
+    hits = [name for name in faults if cached[name] is not None]
+    print(f"Cache: {len(hits)} of {len(faults)} faults served from {cache.directory}")
+
+    if misses:
+        compute(misses)
+    for name in hits:
+        faults[name].clear()
+        faults[name].update(cached[name])
+    renumber_faults(faults)
+
+    for name in misses:
+        if 'id' in faults[name]:
+            cache.put(keys[name], faults[name])
+    cache.evict()
+    return hits
@@ -21,23 +21,17 @@ Created on October 2024
 @authors: Nasrin Tavakolizadeh, Hamzeh Mohammadigheymasi
 """
 # import self
-from fontTools.merge import layout
-from openquake.hazardlib.valid import mag_scale_rel
-
-from .SeismicActivityRate import momentbudget, sactivityrate  # Import the function
-from .FQSHA_Functions import export_faults_to_xml
-from .OpenQuake_input_generator import gmpe_generate_xml
-from .OpenQuake_input_generator import source_model_logic_tree
-from .OpenQuake_input_generator import generate_job_ini
-from .Mapping import create_contour_map_with_faults
+from . import Pipeline
+from .FaultCatalog import read_faults
 import sys, argparse, json
+import threading
+import copy
 
 
 from PyQt5.QtWidgets import QFileDialog
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 import os
-import subprocess
 import glob
 global faults
 
@@ -211,23 +205,61 @@ class OutWindow(QtWidgets.QWidget):
         self.setLayout(layout)
 
 
+class PipelineWorker(QtCore.QObject):
+    """
+    Runs `Pipeline.run_pipeline` on a background QThread.
+
+    Progress is reported per stage through the `progress` signal (stage, done, total).
+    `cancel()` may be called from the GUI thread; it stops the pipeline at the next check
+    and terminates the OpenQuake engine if it is running.
+    """
+    progress = QtCore.pyqtSignal(str, int, int)
+    finished = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, settings, faults, inputs):
+        super().__init__()
+        self.settings = settings
+        self.faults = faults
+        self.inputs = inputs
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            output_directory = Pipeline.run_pipeline(self.settings, self.faults, inputs=self.inputs,
+                                                     progress=self.progress.emit, cancel=self.cancel_event)
+        except Pipeline.PipelineCancelled as e:
+            print(e)
+            self.cancelled.emit()
+        except Exception as e:
+            print("An error occurred while running the pipeline:", e)
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(output_directory)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
 def browse_file(self):
     """
     Opens a file dialog for selecting a JSON input file.
 
-    Loads the selected fault model file and stores it in the `self.faults` variable.
+    Loads the selected fault model file and stores it in the `self.faults` variable. A columnar
+    catalog is opened by selecting its meta.json file.
     """
     options = QFileDialog.Options()
     file_path, _ = QFileDialog.getOpenFileName(None, "Select the input file:", "Choose one:",
-                                               "JSON files (*.json);;All files (*)", options=options)
+                                               "JSON files (*.json);;Columnar catalog (meta.json);;All files (*)",
+                                               options=options)
     if file_path:
         print("Selected file:", file_path)
         self.input_file_var = file_path
 
         # Load the selected JSON file
         try:
-            with open(file_path, 'r') as f:
-                self.faults = json.load(f)
+            self.faults = read_faults(file_path)
 
             if self.faults:
                 print(f"Loaded JSON data: {len(self.faults)} faults found.")
@@ -337,47 +369,73 @@ class Ui_Frame(object):
 
 
     def find_latest_hazard_map(self, output_directory):
-        import glob
-        import os
-
-        output_dir = os.path.join(output_directory, "OutPut")
-        file_pattern = os.path.join(output_dir, "hazard_map-mean_*.csv")
-        files = glob.glob(file_pattern)
-
-        if not files:
-            print("No hazard map files found.")
-            return None
-
-        files.sort(key=lambda f: os.path.getmtime(f), reverse=True)
-        return files[0]  # Return the most recently modified file
+        return Pipeline.find_latest_hazard_map(output_directory)
 
 
 
     def export_inputs(self, main_output_directory, filename='inputs.json'):
-        # Ensure the main output directory exists
-        os.makedirs(main_output_directory, exist_ok=True)
+        Pipeline.export_inputs(self.inputs, main_output_directory, filename)
 
-        # Define the full path for inputs.json within the output directory
-        full_path = os.path.join(main_output_directory, filename)
-
-        # Write the full inputs to the file in the specified directory
-        with open(full_path, 'w') as file:
-            json.dump(self.inputs, file, indent=4)
-        print(f"Inputs saved to {full_path}")
 
-        # Export only fault traces to a separate JSON file
-        fault_traces = {
-            fault_name: {'fault_trace': fault_info['fault_trace']}
-            for fault_name, fault_info in self.inputs.get('faults', {}).items()
-            if 'fault_trace' in fault_info
-        }
-        fault_traces_path = os.path.join(main_output_directory, 'fault_traces.json')
 
-        with open(fault_traces_path, 'w') as file:
-            json.dump(fault_traces, file, indent=4)
-        print(f"Fault traces saved to {fault_traces_path}")
+    def collect_settings(self):
+        """
+    Reads the run settings (see `Pipeline.DEFAULT_SETTINGS`) from the input fields,
+    using the default values for the fields left blank.
+    """
+        PTI = self.textEdit_3.toPlainText()
+        bin = self.textEdit_4.toPlainText()
+        Khi = self.textEdit.toPlainText()
+        Zeta = self.textEdit_11.toPlainText()
+        Siggma = self.textEdit_8.toPlainText()
+        Mag_Scale = self.textEdit_12.toPlainText()
 
+        # Set default values if empty
+        if not Mag_Scale:
+            Mag_Scale = "WC1994"
+            print('Window of observation: Where necessary you are using default magnitude scale relationship: WC1994')
+        if not PTI:
+            PTI = "50"
+            print('Window of observation: Where necessary you are using default value 50 years')
+        if not bin:
+            bin = "0.1"
+            print('binstep: Where necessary you are using default value 0.1')
+        if not Zeta:
+            Zeta = "0.5"
+            print('Magnitude difference: Where necessary you are using default value 0.5')
+        if not Khi:
+            Khi = "0.2"
+            print('Multiplication Factor: Where necessary you are using default value 0.2')
+        if not Siggma:
+            Siggma = "0.3"
+            print('Standard Deviation: Where necessary you are using default value 0.3')
+        try:
+            PTI = float(PTI)
+            bin = float(bin)
+            Khi = float(Khi)
+            Zeta = float(Zeta)
+            Siggma = float(Siggma)
+        except ValueError:
+            raise ValueError(
+                "Consider inputting a proper number for 'Probability Time Interval', and 'Magnitude Bin Size'")
 
+        settings = dict(Pipeline.DEFAULT_SETTINGS)
+        settings.update({
+            "output_folder": self.textEdit_13.toPlainText().strip() or "FQSHA_output",
+            "fault_behaviour": getattr(self, 'mfdo', Pipeline.DEFAULT_SETTINGS["fault_behaviour"]),
+            "probability_time_interval": PTI,
+            "bin": bin,
+            "zeta": Zeta,
+            "khi": Khi,
+            "siggma": Siggma,
+            "mag_scale": Mag_Scale,
+            "calculation_mode": self.comboBox_2.currentText(),
+            # Unchanged faults are served from the previous runs in this output folder
+            "cache_folder": os.path.join(self.textEdit_13.toPlainText().strip() or "FQSHA_output", "cache"),
+            # Figures are drawn off the GUI thread, in worker processes
+            "plots": "lazy",
+        })
+        return settings
 
     def run_seismic_and_export(self):
         """
@@ -389,99 +447,51 @@ class Ui_Frame(object):
     - Calculating seismic activity rates,
     - Running OpenQuake,
     - Generating and displaying hazard maps.
-    """
 
+    The workflow runs on a background QThread (`PipelineWorker`), so the window stays
+    responsive; the CANCEL button stops it.
+    """
         self.collect_inputs()
-
-        # Get the main output directory
-        main_output_directory, sources_directory = self.get_output_directory()
-
-        # Export inputs to the main output directory
-        self.export_inputs(main_output_directory)
-
-        # Continue with other steps
-        source_model_logic_tree(self.inputs['faults'], main_output_directory)
-
-        all_fault_traces = []
-        # Loop through each fault in the 'faults' dictionary
-        for fault_name, fault_data in self.inputs['faults'].items():
-            if 'fault_trace' in fault_data:  # Check if the key exists (safety)
-                all_fault_traces.extend(fault_data['fault_trace'])  # Concatenate the traces
-
-        longitudess = [point[0] for point in all_fault_traces]
-        latitudess = [point[1] for point in all_fault_traces]
-
-        # Step 2: Calculate min/max and ranges
-        lon_min, lon_max = min(longitudess), max(longitudess)
-        lat_min, lat_max = min(latitudess), max(latitudess)
-
-        lon_range = lon_max - lon_min
-        lat_range = lat_max - lat_min
-
-        # Step 3: Compute 10% confidence intervals
-        confidence = 0.3  # 10%
-
-        lon_min_ci = lon_min - (lon_range * confidence)
-        lon_max_ci = lon_max + (lon_range * confidence)
-
-        lat_min_ci = lat_min - (lat_range * confidence)
-        lat_max_ci = lat_max + (lat_range * confidence)
-
-        if self.inputs['textEdit_2'] == '':
-            self.inputs['textEdit_2']= str(lat_max_ci)
-
-        if self.inputs['textEdit_7'] == '':
-            self.inputs['textEdit_7'] = str(lat_min_ci)
-
-        if self.inputs['textEdit_6'] == '':
-            self.inputs['textEdit_6'] = str(lon_max_ci)
-
-        if self.inputs['textEdit_5'] == '':
-            self.inputs['textEdit_5'] = str(lon_min_ci)
-
-        if self.inputs['textEdit_12'] == '':
-            self.inputs['textEdit_12'] = 'WC1994'
-
-        if self.inputs['textEdit_10'] == '':
-            self.inputs['textEdit_10'] = str(100)
-
-        if self.inputs['textEdit_9'] == '':
-            self.inputs['textEdit_9'] = str(800)
-
-
-
-        generate_job_ini(self.inputs, main_output_directory, self.faults)
-
-        self.SeismicActivityRate(self.faults, self.mfdo)
-        gmpe_generate_xml(self.inputs, main_output_directory)
-        export_faults_to_xml(self.faults, sources_directory)
-
-        print("Seismic activity rate calculation and OpenQuake input generation completed.")
-        self.run_oq_engine(main_output_directory)
-        print("Hazard Calculation Completed.")
-
-        # Find and use the latest hazard map CSV file for mapping
-        csv_file = self.find_latest_hazard_map(main_output_directory)
-        if csv_file is not None:
-            fault_file = os.path.join(main_output_directory, "fault_traces.json")
-            create_contour_map_with_faults(csv_file, fault_file, main_output_directory)
-        else:
-            print("No suitable hazard map CSV file found.")
+        settings = self.collect_settings()
+
+        self.worker_thread = QtCore.QThread()
+        # momentbudget updates the fault dictionaries, the loaded catalog is kept for the next run
+        self.worker = PipelineWorker(settings, copy.deepcopy(self.faults), self.inputs)
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.on_pipeline_progress)
+        for signal in (self.worker.finished, self.worker.cancelled, self.worker.failed):
+            signal.connect(self.worker_thread.quit)
+        self.worker.finished.connect(lambda output_directory: self.on_pipeline_done("Hazard calculation completed"))
+        self.worker.cancelled.connect(lambda: self.on_pipeline_done("Cancelled"))
+        self.worker.failed.connect(lambda message: self.on_pipeline_done(f"Failed: {message}"))
+        self.worker_thread.finished.connect(self.worker.deleteLater)
+
+        self.pushButton_2.setEnabled(False)
+        self.pushButton_cancel.setEnabled(True)
+        self.progressBar.setValue(0)
+        self.worker_thread.start()
+
+    def cancel_run(self):
+        if getattr(self, 'worker', None) is not None:
+            self.label_progress.setText("Cancelling...")
+            self.worker.cancel()
+
+    def on_pipeline_progress(self, stage, done, total):
+        # Every stage takes an equal share of the progress bar
+        index = Pipeline.STAGES.index(stage)
+        fraction = (index + (done / total if total else 1)) / len(Pipeline.STAGES)
+        self.progressBar.setValue(int(100 * fraction))
+        self.label_progress.setText(f"{stage}: {done}/{total}")
+
+    def on_pipeline_done(self, message):
+        self.pushButton_2.setEnabled(True)
+        self.pushButton_cancel.setEnabled(False)
+        self.label_progress.setText(message)
+        self.worker = None
 
     def run_oq_engine(self, main_output_directory):
-        try:
-            # Change to the output directory
-            os.chdir(main_output_directory)
-
-            # Run the commands
-            subprocess.run(['oq', 'engine', '--delete-uncompleted-calculations'], check=True, capture_output=True,
-                           text=True)
-            result = subprocess.run(['oq', 'engine', '--run', 'job.ini', '--exports=csv'], check=True,
-                                    capture_output=True, text=True)
-
-            print("Command output:", result.stdout)
-        except subprocess.CalledProcessError as e:
-            print("An error occurred while running the command:", e.stderr)
+        Pipeline.run_oq_engine(main_output_directory)
 
 
 
@@ -1027,6 +1037,24 @@ class Ui_Frame(object):
         self.pushButton_2.setObjectName("pushButton_2")
         self.pushButton_2.clicked.connect(self.run_seismic_and_export)
 
+        self.pushButton_cancel = QtWidgets.QPushButton(self.frame)
+        self.pushButton_cancel.setText("CANCEL")
+        self.pushButton_cancel.setGeometry(QtCore.QRect(110, 775, 201, 41))
+        self.pushButton_cancel.setFont(font)
+        self.pushButton_cancel.setEnabled(False)
+        self.pushButton_cancel.setObjectName("pushButton_cancel")
+        self.pushButton_cancel.clicked.connect(self.cancel_run)
+
+        self.progressBar = QtWidgets.QProgressBar(self.frame)
+        self.progressBar.setGeometry(QtCore.QRect(60, 825, 301, 25))
+        self.progressBar.setRange(0, 100)
+        self.progressBar.setValue(0)
+        self.progressBar.setObjectName("progressBar")
+
+        self.label_progress = QtWidgets.QLabel(self.frame)
+        self.label_progress.setGeometry(QtCore.QRect(60, 855, 301, 25))
+        self.label_progress.setObjectName("label_progress")
+
 
         self.label_2 = QtWidgets.QLabel(self.frame)
         self.label_2.setGeometry(QtCore.QRect(90, 330, 211, 41))
@@ -1336,62 +1364,10 @@ class Ui_Frame(object):
     - Applies either Gaussian or GR model to compute seismicity.
     - Default values are used if the user leaves input fields blank.
     """
-        ProjFol = self.textEdit.toPlainText()
-        PTI = self.textEdit_3.toPlainText()
-        bin = self.textEdit_4.toPlainText()
-        Khi = self.textEdit.toPlainText()
-        Zeta = self.textEdit_11.toPlainText()
-        Siggma = self.textEdit_8.toPlainText()
-        Mag_Scale = self.textEdit_12.toPlainText()
-
-        # Set default values if empty
-        if not Mag_Scale:
-            Mag_Scale = "WC1994"
-            print('Window of observation: Where necessary you are using default magnitude scale relationship: WC1994')
-        if not PTI:
-            PTI = "50"
-            print('Window of observation: Where necessary you are using default value 50 years')
-        if not bin:
-            bin = "0.1"
-            print('binstep: Where necessary you are using default value 0.1')
-        try:
-            PTI = float(PTI)
-            bin = float(bin)
-        except ValueError:
-            raise ValueError(
-                "Consider inputting a proper number for 'Probability Time Interval', and 'Magnitude Bin Size'")
-
-        if not Zeta:
-            Zeta = "0.5"
-            print('Magnitude difference: Where necessary you are using default value 0.5')
-        if not Khi:
-            Khi = "0.2"
-            print('Multiplication Factor: Where necessary you are using default value 0.2')
-
-        if not Siggma:
-            Siggma = "0.3"
-            print('Standard Deviation: Where necessary you are using default value 0.3')
-        try:
-            Khi = float(Khi)
-            Zeta = float(Zeta)
-            Siggma = float(Siggma)
-
-        except ValueError:
-            raise ValueError(
-                "Consider inputting a proper number for 'Probability Time Interval', and 'Magnitude Bin Size'")
-
-
-
-
-        faults_u = momentbudget(faults, Zeta, Khi, Siggma, ProjFol='output_files', logical_nan='NAN, "",NaN',
-                                logical_nan_sdmag='NAN, "",NaN')
-
-        for key, sub_dict in faults_u.items():
-            sub_dict['mag_scale'] = Mag_Scale
-
-        if ProjFol == '':
-            ProjFol == 'output_files'
-        sactivityrate(faults_u, mfdo, PTI, bin, ProjFol='output_files')
+        settings = self.collect_settings()
+        settings["fault_behaviour"] = mfdo
+        settings["plots"] = "eager"
+        Pipeline.run_seismic_activity(faults, settings)
 
 
     # set_mfdo method
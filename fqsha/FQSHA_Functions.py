@@ -16,38 +16,147 @@
 
 # FQSHA_functions.py
 
-import numpy as np
-import scipy.stats as stats
-import matplotlib.pyplot as plt
+import functools
 import math
-import numpy as np
-import matplotlib.pyplot as plt
 import os
-import numpy as np
-from scipy.optimize import minimize
-from scipy.stats import norm
+import io
+import gzip
+import hashlib
 import json
-from scipy.integrate import trapezoid
+from collections.abc import Mapping
+import numpy as np
+from ._lazy import lazy_import
+from .Plotting import plot_cumulative_rates
+from .OutputSinks import TextSink
+
+stats = lazy_import('scipy.stats')
+plt = lazy_import('matplotlib.pyplot')
+
+
+
+
+
+def _simple_fault_source_xml(fault_name, fault_info):
+    """Returns the NRML ``<simpleFaultSource>`` element of one fault, indented for a ``<sourceModel>``."""
+    # Fault trace coordinates for the <gml:posList>
+    coordinates = " ".join(f"{lat} {lon}" for lat, lon in fault_info["fault_trace"])
+
+    # Upper and lower seismogenic depths
+    upper_depth = fault_info.get("upperSeismoDepth", fault_info["upperSeismoDepth"])
+    lower_depth = fault_info.get("lowerSeismoDepth", fault_info["lowerSeismoDepth"])
+
+    parts = [
+        f'        <simpleFaultSource id="{fault_info.get("id", fault_name)}" name="{fault_name} Source" tectonicRegion="Active Shallow Crust">\n',
+        '            <simpleFaultGeometry>\n',
+        '                <gml:LineString>\n',
+        '                    <gml:posList>\n',
+        f'                        {coordinates}\n',
+        '                    </gml:posList>\n',
+        '                </gml:LineString>\n',
+        f'                <dip>{fault_info["Dip"]}</dip>\n',
+        f'                <upperSeismoDepth>{upper_depth:.1f}</upperSeismoDepth>\n',
+        f'                <lowerSeismoDepth>{lower_depth:.1f}</lowerSeismoDepth>\n',
+        '            </simpleFaultGeometry>\n',
+        f'            <magScaleRel>{fault_info["mag_scale"]}</magScaleRel>\n',
+        '            <ruptAspectRatio>2.0000000E+00</ruptAspectRatio>\n',
+    ]
+
+    # Check for the 'bin' key and handle accordingly
+    bin_width = fault_info.get("bin", 0.1)  # Default value of 0.1 if 'bin' key is missing
+    if "rates" in fault_info:
+        # Characteristic Gaussian rates start at rates_Mmin, truncated GR rates at Mmin
+        min_mag = fault_info.get("rates_Mmin", fault_info.get("Mmin"))
+        parts.append(f'            <incrementalMFD minMag="{min_mag:.1f}" binWidth="{bin_width:.1f}">\n')
+        parts.append(f'                <occurRates>{" ".join(f"{rate:e}" for rate in fault_info["rates"])}</occurRates>\n')
+        parts.append('            </incrementalMFD>\n')
+
+    parts.append(f'            <rake>{fault_info["fault_rake"]}</rake>\n')
+    parts.append('        </simpleFaultSource>\n')
+    return "".join(parts)
+
+
+# Fields of a fault written to its NRML source, hashed by `fault_export_hash`
+EXPORT_FIELDS = ("id", "fault_trace", "Dip", "upperSeismoDepth", "lowerSeismoDepth", "mag_scale",
+                 "Mmin", "rates_Mmin", "bin", "rates", "fault_rake")
+# Bumped whenever `_simple_fault_source_xml` changes its output, so manifests are invalidated
+EXPORT_FORMAT_VERSION = 2
+
+
+def _json_default(value):
+    """Converts NumPy scalars and arrays, and fault records (`FaultCatalog.Fault`), for `json.dumps`."""
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def fault_export_hash(fault_name, fault_info):
+    """
+    Returns a stable SHA-256 hex digest of the export-relevant fields of one fault
+    (`EXPORT_FIELDS`), independent of dictionary order and of the other fields.
+    """
+    record = {"name": fault_name, "format": EXPORT_FORMAT_VERSION}
+    record.update({key: fault_info.get(key) for key in EXPORT_FIELDS})
+    text = json.dumps(record, sort_keys=True, default=_json_default, allow_nan=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _read_manifest(manifest):
+    """Reads a {fault name: hash} export manifest, returning an empty one if it is missing or invalid."""
+    try:
+        with open(manifest, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("format") != EXPORT_FORMAT_VERSION:
+        return {}
+    return data.get("sources", {})
+
 
+def _write_manifest(manifest, hashes):
+    """Writes the export manifest atomically."""
+    directory = os.path.dirname(os.path.abspath(manifest))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{manifest}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump({"format": EXPORT_FORMAT_VERSION, "sources": hashes}, f, indent=1, sort_keys=True)
+    os.replace(temporary, manifest)
 
 
+_NRML_HEADER = ('<?xml version="1.0" encoding="utf-8"?>\n'
+                '<nrml xmlns="http://openquake.org/xmlns/nrml/0.4" xmlns:gml="http://www.opengis.net/gml">\n')
+_NRML_FOOTER = '    </sourceModel>\n</nrml>\n'
 
 
-def export_faults_to_xml(faults, output_directory):
+def export_faults_to_xml(faults, output_directory, manifest=None):
     """
     Exports fault data into OpenQuake-compatible XML files.
 
     Parameters
     ----------
-    faults : dict
-        Dictionary containing fault parameters including geometry, dip, magnitude distribution, and rake.
+    faults : dict or iterable
+        Dictionary containing fault parameters including geometry, dip, magnitude distribution, and rake,
+        or an iterable of (fault name, parameters) pairs consumed one at a time.
     output_directory : str
         Path to the folder where XML files will be saved.
+    manifest : str, optional
+        JSON file holding the `fault_export_hash` of every exported fault. When given, faults
+        whose hash matches the manifest and whose XML file exists are not rewritten, and the
+        manifest is updated afterwards.
+
+    Returns
+    -------
+    list of str
+        Names of the faults whose XML file was (re)written.
 
     Notes
     -----
     - Generates one XML file per fault source.
     - Each XML file defines geometry, seismogenic depth, scaling relationship, and magnitude-frequency distribution.
+    - See `export_source_model` for a single file holding every source.
     """
     # Ensure the faults directory exists
     try:
@@ -55,70 +164,165 @@ def export_faults_to_xml(faults, output_directory):
         print(f"Directory {output_directory} created or already exists.")
     except Exception as e:
         print(f"Error creating directory: {e}")
-        return
+        return []
+
+    previous = _read_manifest(manifest) if manifest is not None else {}
+    hashes = {}
+    changed = []
+    nfault = 0
 
     # Iterate through the faults dictionary to create individual XML files
-    for fault_name, fault_info in faults.items():
-        # Define the XML filename for each fault
+    for fault_name, fault_info in (faults.items() if isinstance(faults, Mapping) else faults):
+        nfault += 1
         xml_filename = os.path.join(output_directory, f'{fault_name}.xml')
-
-        # Open the XML file and start writing
+        if manifest is not None:
+            hashes[fault_name] = fault_export_hash(fault_name, fault_info)
+            if previous.get(fault_name) == hashes[fault_name] and os.path.isfile(xml_filename):
+                continue
         with open(xml_filename, 'w') as fid:
-            # Write the header information
-            fid.write('<?xml version="1.0" encoding="utf-8"?>\n')
-            fid.write('<nrml xmlns="http://openquake.org/xmlns/nrml/0.4" xmlns:gml="http://www.opengis.net/gml">\n')
-            fid.write(f'    <sourceModel name="{fault_name}">\n')
-
-            # Start writing fault source information
-            fid.write(f'        <simpleFaultSource id="{fault_info.get("id", fault_name)}" name="{fault_name} Source" tectonicRegion="Active Shallow Crust">\n')
-            fid.write('            <simpleFaultGeometry>\n')
-            fid.write('                <gml:LineString>\n')
-
-            # Write the fault trace coordinates to the <gml:posList>
-            fid.write('                    <gml:posList>\n')
-            coordinates = " ".join(f"{lat} {lon}" for lat, lon in fault_info["fault_trace"])
-            fid.write(f'                        {coordinates}\n')
-            fid.write('                    </gml:posList>\n')
-
-            # Close the <gml:LineString> and continue with fault attributes
-            fid.write('                </gml:LineString>\n')
-            fid.write(f'                <dip>{fault_info["Dip"]}</dip>\n')
-
-            # Extract and write upper and lower seismogenic depths
-            upper_depth = fault_info.get("upperSeismoDepth", fault_info["upperSeismoDepth"])
-            lower_depth = fault_info.get("lowerSeismoDepth", fault_info["lowerSeismoDepth"])
-
-            fid.write(f'                <upperSeismoDepth>{upper_depth:.1f}</upperSeismoDepth>\n')
-            fid.write(f'                <lowerSeismoDepth>{lower_depth:.1f}</lowerSeismoDepth>\n')
-            fid.write('            </simpleFaultGeometry>\n')
-
-            # Write magnitude scale relationship from fault info
-            fid.write(f'            <magScaleRel>{fault_info["mag_scale"]}</magScaleRel>\n')
-            fid.write('            <ruptAspectRatio>2.0000000E+00</ruptAspectRatio>\n')
-
-            # Check for the 'bin' key and handle accordingly
-            bin_width = fault_info.get("bin", 0.1)  # Default value of 0.1 if 'bin' key is missing
-            if "rates" in fault_info:
-                fid.write(f'            <incrementalMFD minMag="{fault_info["Mmin"]:.1f}" binWidth="{bin_width:.1f}">\n')
-                fid.write(f'                <occurRates>{" ".join(f"{rate:e}" for rate in fault_info["rates"])}</occurRates>\n')
-                fid.write('            </incrementalMFD>\n')
-
-            # Finish up the fault source attributes
-            fid.write(f'            <rake>{fault_info["fault_rake"]}</rake>\n')
-            fid.write('        </simpleFaultSource>\n')
-
-            # Close the XML structure
-            fid.write('    </sourceModel>\n')
-            fid.write('</nrml>\n')
+            fid.write(_NRML_HEADER + f'    <sourceModel name="{fault_name}">\n'
+                      + _simple_fault_source_xml(fault_name, fault_info) + _NRML_FOOTER)
+        changed.append(fault_name)
+
+    if manifest is not None:
+        _write_manifest(manifest, hashes)
+        removed = sorted(set(previous) - set(hashes))
+        print(f"{len(changed)} of {nfault} fault sources changed: {', '.join(changed) or 'none'}")
+        if removed:
+            print(f"Faults no longer exported: {', '.join(removed)}")
 
     print(f"Fault XML files generated successfully in {output_directory}")
+    return changed
+
+
+def export_source_model(faults, output_file, name="FQSHA fault sources", compress=None, buffer_size=1 << 20):
+    """
+    Streams every fault into a single NRML ``<sourceModel>`` file.
+
+    Parameters
+    ----------
+    faults : dict or iterable
+        Dictionary containing fault parameters, or (fault name, parameters) pairs (as for
+        `export_faults_to_xml`).
+    output_file : str
+        Path of the source model, e.g. ``Sources/source_model.xml``.
+    name : str, optional
+        Name of the source model.
+    compress : bool, optional
+        Write a gzip file. Defaults to True when `output_file` ends with ``.gz``.
+    buffer_size : int, optional
+        Size of the write buffer in bytes.
+
+    Returns
+    -------
+    str
+        Path of the file written.
+
+    Notes
+    -----
+    - The sources are written one after the other through a single buffered stream, so the
+      cost per fault is constant and only one file is created.
+    - OpenQuake reads plain XML only; the gzip form is meant for archiving source models.
+    """
+    if compress is None:
+        compress = str(output_file).endswith('.gz')
+    if compress and not str(output_file).endswith('.gz'):
+        output_file = f"{output_file}.gz"
+    directory = os.path.dirname(output_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if compress:
+        fid = io.TextIOWrapper(io.BufferedWriter(gzip.open(output_file, 'wb'), buffer_size), encoding='utf-8')
+    else:
+        fid = open(output_file, 'w', buffering=buffer_size, encoding='utf-8')
+    with fid:
+        fid.write(_NRML_HEADER + f'    <sourceModel name="{name}">\n')
+        nfault = 0
+        for fault_name, fault_info in (faults.items() if isinstance(faults, Mapping) else faults):
+            fid.write(_simple_fault_source_xml(fault_name, fault_info))
+            nfault += 1
+        fid.write(_NRML_FOOTER)
+
+    print(f"Source model with {nfault} faults generated successfully in {output_file}")
+    return output_file
+
+
+
+
+
 
+def _rate_plot(plots, plot_store, fault_name, magnitude_range, cumulative_rates, color, figure_path):
+    """Draws ('eager') or records ('lazy') the cumulative-rate plot of one fault."""
+    if plots == 'eager':
+        os.makedirs(os.path.dirname(figure_path), exist_ok=True)
+        plot_cumulative_rates(fault_name, magnitude_range, cumulative_rates, color, figure_path)
+    elif plots == 'lazy':
+        plot_store.add(fault_name, magnitude_range, cumulative_rates, color, figure_path)
 
 
 
+def truncated_gr_rates(mts, mags, Morates, bs, bin):
+    """
+    Moment-balanced truncated Gutenberg-Richter rates of every fault, as one ragged array.
+
+    Parameters
+    ----------
+    mts, mags : array_like
+        Minimum and maximum magnitude of each fault.
+    Morates : array_like
+        Moment rate of each fault (N·m/yr).
+    bs : array_like
+        b-value of each fault.
+    bin : float
+        Magnitude bin width.
 
+    Returns
+    -------
+    magnitude_range : ndarray
+        ``np.arange(mts[i], mags[i] + bin, bin)`` of every fault, concatenated.
+    offsets : ndarray of int
+        Start of each fault in the flat arrays, plus the total length.
+    rates : ndarray
+        Incremental annual rate of each magnitude bin, balanced so that the moment rate of
+        each fault equals `Morates`.
 
-def TruncatedGR(faults, c, d, Project_foldername, faultnames, mags, mts, Morates, ids, nfault, bin, bs):
+    Notes
+    -----
+    - The maximum magnitude is assumed to be reached with an additional bin.
+    - The moment balancing is a segmented sum (`np.add.reduceat`) over the flat array, so the
+      rates equal those of a per-fault loop up to rounding. A last bin without moment (at
+      Mmax + bin) gets a zero rate instead of NaN.
+    """
+    d = 9.1;  c = 1.5
+    mts = np.asarray(mts, dtype=float)
+    mags = np.asarray(mags, dtype=float)
+    Morates = np.asarray(Morates, dtype=float)
+    bs = np.asarray(bs, dtype=float)
+    magnitude_range, offsets, segment = ragged_arange(mts, mags + bin, bin)
+
+    M = 10 ** (c * magnitude_range + d)
+    Beta = (2 / 3) * bs[segment]
+    Mt = 10 ** (c * mts[segment] + d)
+    Mxp = 10 ** (c * (mags[segment] + bin) + d)
+    TruncGR = (((Mt / M) ** Beta - (Mt / Mxp) ** Beta) / (1 - (Mt / Mxp) ** Beta))
+
+    # Incremental rates: difference with the next bin of the same fault, the last bin keeps its value
+    last = np.zeros(len(magnitude_range), dtype=bool)
+    nonempty = offsets[1:] > offsets[:-1]
+    last[offsets[1:][nonempty] - 1] = True
+    Incremental = TruncGR - np.where(last, 0.0, np.append(TruncGR[1:], 0.0))
+
+    # Balancing: the incremental rates are scaled so that their moment rate equals Morates
+    total = np.zeros(len(mts))
+    if len(magnitude_range):
+        total[nonempty] = np.add.reduceat(Incremental * M, offsets[:-1][nonempty])
+    rates = Incremental * (Morates / total)[segment]
+    return magnitude_range, offsets, rates
+
+
+def TruncatedGR(faults, c, d, Project_foldername, faultnames, mags, mts, Morates, ids, nfault, bin, bs,
+                plots='eager', plot_store=None, sink=None):
     """
     Calculates seismic activity rates using the Truncated Gutenberg-Richter model.
 
@@ -148,67 +352,138 @@ def TruncatedGR(faults, c, d, Project_foldername, faultnames, mags, mts, Morates
         Magnitude bin width.
     bs : list of float
         b-values for each fault.
+    plots : {'eager', 'lazy', 'none'}, optional
+        'eager' draws each cumulative-rate plot, 'lazy' records it in `plot_store`.
+    plot_store : Plotting.RateCurveStore, optional
+        Store filled in 'lazy' mode.
+    sink : OutputSinks.OutputSink, optional
+        Writer of the rate table, a `TextSink` in 'output_files' by default. The figures
+        go to the Figures folder of its root.
 
     Returns
     -------
     str
-        Filename of the output text file containing computed seismic activity rates.
+        Filename of the output file containing computed seismic activity rates.
 
     Notes
     -----
-    - Saves both cumulative rate plots and XML model files.
+    - Saves the cumulative rate plots; the XML sources are written from the updated faults
+      by `export_faults_to_xml` or `export_source_model`.
     - Updates the `faults` dictionary with magnitude-frequency distributions.
+    - The rates of all faults are computed together by `truncated_gr_rates`.
     """
-    outputname = f"{Project_foldername}_SAR_TruncatedGR.txt"
-    with open(os.path.join('./output_files', outputname), 'w') as fidout:
-        # Print a title, followed by a blank line
-        fidout.write('id Mmin bin rates name\n')
-        for i in range(nfault):  # Cycle for number of faults
-            magnitude_range = np.arange(mts[i], mags[i] + bin, bin)
-            M = 10 ** (c * magnitude_range + d)
-            Beta = (2 / 3) * bs[i]
-            Mt = 10 ** (c * mts[i] + d)
-            Mxp = 10 ** (c * (mags[i] + bin) + d)  # Assume max magnitude is reached with an additional bin.
-            TruncGR = (((Mt / M) ** Beta - (Mt / Mxp) ** Beta) / (1 - (Mt / Mxp) ** Beta))
-            Incremental = np.concatenate((np.diff(TruncGR[::-1])[::-1], [TruncGR[-1]]))
-            Incremental_Morate = Incremental * M
-            Incremental_Morate_balanced = Incremental_Morate * Morates[i] / np.sum(Incremental_Morate)
-            cons_tassi_ind = Incremental * Incremental_Morate_balanced / Incremental_Morate
+    if sink is None:
+        sink = TextSink()
+    mts = np.asarray(mts, dtype=float)
+    magnitude_range, offsets, rates = truncated_gr_rates(mts, mags, Morates, bs, bin)
+    for i in range(nfault):  # Cycle for number of faults
+        cons_tassi_ind = rates[offsets[i]:offsets[i + 1]]
+
+        # Adding the outputs of the moment budget to the faults dictionary
+        faults[faultnames[i]].update({
+            "rates": cons_tassi_ind.tolist(),
+            "bin": bin })
+
+        # Plotting
+        if plots != 'none':
             cumulative_rates = np.cumsum(cons_tassi_ind[::-1])[::-1]
-            Mbalanced = np.sum(cons_tassi_ind * M)
-            out_rates = cons_tassi_ind.tolist()
-
-            # Adding the outputs of the moment budget to the faults dictionary
-            faults[faultnames[i]].update({
-                "rates": out_rates,
-                "bin": bin })
-
-            # Write to output file
-            fidout.write(f"{ids[i]}, {mts[i]:3.1f}, {bin:3.1f}, ")
-            fidout.write(' '.join(f"{rate:5.4e}" for rate in cons_tassi_ind))
-            fidout.write('\n')  # Ensure each entry is on a new line
-
-            # Plotting
-            plt.figure(figsize=(8, 6))
-            plt.style.use('dark_background')
-            plt.semilogy(magnitude_range, cumulative_rates, 'oy')
-            plt.fill_between(magnitude_range, 0, cumulative_rates, color='gold', alpha=0.3)
-            plt.xlabel('magnitude')
-            plt.ylabel('annual cumulative rates')
-            plt.title(faultnames[i])
-
-            # Saving the figure
             figname = f"{Project_foldername}_SAR_TruncatedGR_rates_{faultnames[i]}.png"
-            plt.savefig(os.path.join('./output_files/Figures', figname), format='png')
-            plt.show()  # Show the plot
+            _rate_plot(plots, plot_store, faultnames[i], magnitude_range[offsets[i]:offsets[i + 1]],
+                       cumulative_rates, 'gold', os.path.join(sink.root, 'Figures', figname))
 
-    export_faults_to_xml(faults, Project_foldername)
+    # Write the rates of all faults in one go
+    outputname = sink.write_rates(f"{Project_foldername}_SAR_TruncatedGR", ids, mts, bin, offsets, rates,
+                                  faultnames, delimiter=' ', name_column=False)
+    outputname = os.path.basename(outputname)
 
     return outputname
 
 
 
-def CHGaussPoiss(faults, c, d, Project_foldername, faultname, mag, sdmag, Morate, id, nfault, w, Hpois, bin):
+def characteristic_gaussian_rates(mags, sdmags, bin):
+    """
+    Characteristic Gaussian magnitude-frequency distribution of every fault per unit moment
+    rate, as one ragged array.
+
+    Parameters
+    ----------
+    mags, sdmags : array_like
+        Characteristic magnitude and its standard deviation, for each fault.
+    bin : float
+        Magnitude bin width.
+
+    Returns
+    -------
+    magnitude_range : ndarray
+        ``np.arange(mags[i] - sdmags[i], mags[i] + sdmags[i] + bin, bin)`` of every fault, concatenated.
+    offsets : ndarray of int
+        Start of each fault in the flat arrays, plus the total length.
+    unit_rates : ndarray
+        Annual rate of each magnitude bin for a moment rate of 1 N·m/yr: the normal PDF of the
+        bins divided by its moment. Multiplying the rates of a fault by its moment rate gives
+        the moment-balanced rates.
+
+    Notes
+    -----
+    - The same distribution is balanced on the moment rate (`CHGaussPoiss`), on the
+      BPT-equivalent moment rate (`CHGaussBPT`) and gives the recurrence time of the
+      probabilities, so `sactivityrate` computes it once for all three.
+    """
+    d = 9.1;  c = 1.5
+    mags = np.asarray(mags, dtype=float)
+    sdmags = np.asarray(sdmags, dtype=float)
+    magnitude_range, offsets, segment = ragged_arange(mags - sdmags, mags + sdmags + bin, bin)
+    M = 10 ** (c * magnitude_range + d)
+    pdf_mag = stats.norm.pdf(magnitude_range, mags[segment], sdmags[segment])
+    total_moment = np.bincount(segment, weights=pdf_mag * M, minlength=len(mags))
+    return magnitude_range, offsets, pdf_mag / total_moment[segment]
+
+
+def _characteristic_gaussian_outputs(faults, c, d, Project_foldername, faultname, Morate, id, nfault, w,
+                                     probability, bin, kernel, model, color, plots, plot_store, sink):
+    """
+    Balances the `characteristic_gaussian_rates` kernel on `Morate`, stores the rates of each
+    fault and writes the rate and probability tables of `model` ('Poisson' or 'BPT') to `sink`.
+    Returns the balanced moment rate of each fault.
+    """
+    if sink is None:
+        sink = TextSink()
+    magnitude_range, offsets, unit_rates = kernel
+    segment = np.repeat(np.arange(nfault), np.diff(offsets))
+    rates = unit_rates * np.asarray(Morate, dtype=float)[segment]
+    Mo_balanced = np.bincount(segment, weights=rates * 10 ** (c * magnitude_range + d), minlength=nfault)
+    # First magnitude of each fault, NaN when its magnitude range is empty
+    Mag_min = np.full(nfault, np.nan)
+    filled = offsets[1:] > offsets[:-1]
+    Mag_min[filled] = magnitude_range[offsets[:-1][filled]]
+
+    # Cycle for number of faults
+    for i in range(nfault):
+        CHgaussRATES = rates[offsets[i]:offsets[i + 1]]
+
+        # Adding the rates, from magnitude Mag_min in steps of bin, to the faults dictionary
+        faults[faultname[i]].update({
+            "rates": CHgaussRATES.tolist(),
+            "rates_Mmin": float(Mag_min[i]),
+            "bin": bin,
+        })
+
+        # Plotting
+        if plots != 'none':
+            cumCHgaussRATES = np.flip(np.cumsum(np.flip(CHgaussRATES)))
+            figname = f"{Project_foldername}_SAR_TruncatedGR_rates_{faultname[i]}.png"
+            _rate_plot(plots, plot_store, faultname[i], magnitude_range[offsets[i]:offsets[i + 1]],
+                       cumCHgaussRATES, color, os.path.join(sink.root, 'Figures', figname))
+
+    # Write the rates and probabilities of all faults in one go
+    sink.write_rates(f"{Project_foldername}_SAR_ChGauss{model}_rates", id, Mag_min, bin, offsets, rates, faultname)
+    sink.write_probabilities(f"{Project_foldername}_SAR_ChGauss{model}_Probability", id, Mag_min, w, probability,
+                             faultname)
+    return Mo_balanced
+
+
+def CHGaussPoiss(faults, c, d, Project_foldername, faultname, mag, sdmag, Morate, id, nfault, w, Hpois, bin,
+                 plots='eager', plot_store=None, kernel=None, sink=None):
     """
     Computes seismic activity rates and exceedance probabilities using the 
     Characteristic Gaussian model and Poisson time-independent model.
@@ -239,87 +514,38 @@ def CHGaussPoiss(faults, c, d, Project_foldername, faultname, mag, sdmag, Morate
         Poisson exceedance probabilities.
     bin : float
         Magnitude bin size.
+    plots : {'eager', 'lazy', 'none'}, optional
+        'eager' draws each cumulative-rate plot, 'lazy' records it in `plot_store`.
+    plot_store : Plotting.RateCurveStore, optional
+        Store filled in 'lazy' mode.
+    kernel : tuple, optional
+        ``characteristic_gaussian_rates(mag, sdmag, bin)``, computed when not given.
+    sink : OutputSinks.OutputSink, optional
+        Writer of the rate and probability tables, a `TextSink` in 'output_files' by
+        default. The figures go to the Figures folder of its root.
 
     Returns
     -------
     float
-        Moment rate balance for final check.
+        Moment rate balance of the last fault, for a final check.
     
     Notes
     -----
-    - Outputs cumulative rate plots and XML source files.
-    - Saves `.txt` files for rates and exceedance probabilities.
-    """
-    outputname = f"{Project_foldername}_SAR_ChGaussPoisson_rates.txt"
-    outputnameProbability = f"{Project_foldername}_SAR_ChGaussPoisson_Probability.txt"
-
-    # Create output_files directory if it doesn't exist
-    os.makedirs('./output_files/', exist_ok=True)
-
-    # Open files for writing the outputs
-    with open(f'./output_files/{outputname}', 'w') as fidout, open(f'./output_files/{outputnameProbability}',
-                                                                   'w') as fidoutProb:
-        # Print a title, followed by a blank line
-        fidout.write('id Mmin bin rates name\n')
-        fidoutProb.write('id Mmin window Probability name\n')
-
-        # Cycle for number of faults
-        for i in range(nfault):
-            magnitude_range = np.arange(mag[i] - sdmag[i], mag[i] + sdmag[i] + bin, bin)
-            M = 10 ** (c * magnitude_range + d)
-            pdf_mag = norm.pdf(magnitude_range, mag[i], sdmag[i])
-            total_moment = np.sum(pdf_mag * M)
-            ratio = Morate[i] / total_moment
-            balanced_pdf_moment = ratio * pdf_mag
-            Mo_balanced = np.sum(balanced_pdf_moment * M)  # for a check
-            CHgaussRATES = balanced_pdf_moment
-            cumCHgaussRATES = np.flip(np.cumsum(np.flip(CHgaussRATES)))
-
-            Mag_min = magnitude_range[0]
-            out_Rates = [id[i], Mag_min, bin] + CHgaussRATES.tolist()
-            out_Prob = [id[i], Mag_min, w, Hpois[i]]
-
-            fault_data = {}
-            fault_data = {
-                "rates": out_Rates # Your 'i' index
-            }
-
-            # Adding the outputs of the moment budget to the faults dictionary
-            faults[faultname[i]].update(fault_data)
-
-
-            # Writing to output files
-            rates_str = ', '.join(f"{rate:5.4e}" for rate in CHgaussRATES)
-            fidout.write(f"{id[i]}, {Mag_min:3.1f}, {bin:3.1f}, {rates_str}, {faultname[i]}\n")
-            fidoutProb.write(f"{id[i]}, {Mag_min:3.1f}, {w}, {Hpois[i]:5.3e}, {faultname[i]}\n")
-
-
-            # Plotting
-            plt.figure()
-            plt.style.use('dark_background')
-            plt.figure(figsize=(8, 6))
-            plt.semilogy(magnitude_range, cumCHgaussRATES, 'oy')
-            plt.fill_between(magnitude_range, 0, cumCHgaussRATES, color='blue', alpha=0.3)
-            plt.xlabel('magnitude')
-            plt.ylabel('annual cumulative rates')
-            plt.title(faultname[i])
-
-            # Saving the figure
-            figname = f"{Project_foldername}_SAR_TruncatedGR_rates_{faultname[i]}.png"
-            plt.savefig(os.path.join('./output_files/Figures', figname), format='png')
-
-            plt.show()  # Show the plot
-
-
-    export_faults_to_xml(faults, Project_foldername)
-    return Mo_balanced
-
-
-
-
+    - Outputs cumulative rate plots; the XML sources are written from the updated faults
+      by `export_faults_to_xml` or `export_source_model`.
+    - Saves the rate and exceedance probability tables through `sink`.
+    - Each fault gets its incremental rates in ``rates``, from magnitude ``rates_Mmin``
+      (Mmax - sdMmax) in steps of ``bin``.
+    """
+    if kernel is None:
+        kernel = characteristic_gaussian_rates(mag, sdmag, bin)
+    Mo_balanced = _characteristic_gaussian_outputs(faults, c, d, Project_foldername, faultname, Morate, id, nfault,
+                                                   w, Hpois, bin, kernel, 'Poisson', 'blue', plots, plot_store, sink)
+    return Mo_balanced[-1]
 
 
-def CHGaussBPT(faults, c, d, Project_foldername, faultname, mag, sdmag, Tmean, Morate, id, nfault, w, Hbpt, bin):
+def CHGaussBPT(faults, c, d, Project_foldername, faultname, mag, sdmag, Tmean, Morate, id, nfault, w, Hbpt, bin,
+               plots='eager', plot_store=None, kernel=None, sink=None):
     """
     Computes seismic activity rates and exceedance probabilities using the 
     Characteristic Gaussian model and BPT (time-dependent) model.
@@ -352,6 +578,15 @@ def CHGaussBPT(faults, c, d, Project_foldername, faultname, mag, sdmag, Tmean, M
         BPT-based exceedance probabilities.
     bin : float
         Magnitude bin size.
+    plots : {'eager', 'lazy', 'none'}, optional
+        'eager' draws each cumulative-rate plot, 'lazy' records it in `plot_store`.
+    plot_store : Plotting.RateCurveStore, optional
+        Store filled in 'lazy' mode.
+    kernel : tuple, optional
+        ``characteristic_gaussian_rates(mag, sdmag, bin)``, computed when not given.
+    sink : OutputSinks.OutputSink, optional
+        Writer of the rate and probability tables, a `TextSink` in 'output_files' by
+        default. The figures go to the Figures folder of its root.
 
     Returns
     -------
@@ -361,81 +596,104 @@ def CHGaussBPT(faults, c, d, Project_foldername, faultname, mag, sdmag, Tmean, M
     Notes
     -----
     - Calculates fictitious recurrence time for each fault.
-    - Saves rates and probabilities in output text files.
-    """
-
-    outputname = f"{Project_foldername}_SAR_ChGaussBPT_rates.txt"
-    outputnameProbability = f"{Project_foldername}_SAR_ChGaussBPT_Probability.txt"
-
-    # Create output_files directory if it doesn't exist
-    os.makedirs('./output_files/', exist_ok=True)
-
-    # Open a file for writing the output
-    with open(f'./output_files/{outputname}', 'w') as fidout, open(f'./output_files/{outputnameProbability}',
-                                                                   'w') as fidoutProb:
-        # Print a title, followed by a blank line
-        fidout.write('id Mmin bin rates name\n')
-        fidoutProb.write('id Mmin window Probability name\n')
-
-        # Calculate Tmean following Pace et al., 2006 and a Mo rate
-        Tfict = (-1 * w) / np.log(1 - Hbpt)
-        Morate_fict = Morate * (Tmean / Tfict)
-
-        Mo_balanced_fict = []
-
-        # Cycle for number of faults
-        for i in range(nfault):
-            magnitude_range = np.arange(mag[i] - sdmag[i], mag[i] + sdmag[i] + bin, bin)
-            M = 10 ** (c * magnitude_range + d)
-            pdf_mag = norm.pdf(magnitude_range, mag[i], sdmag[i])
-            total_moment = np.sum(pdf_mag * M)
-            ratio = Morate_fict[i] / total_moment
-            balanced_pdf_moment = ratio * pdf_mag
-            Mo_balanced_fict.append(np.sum(balanced_pdf_moment * M))
-            CHgaussRATES = balanced_pdf_moment
-            cumCHgaussRATES = np.flip(np.cumsum(np.flip(CHgaussRATES)))
-
-            Mag_min = magnitude_range[0]
-            out_Rates = [id[i], Mag_min, bin] + CHgaussRATES.tolist()
-            out_Prob = [id[i], Mag_min, w, Hbpt[i]]
-
-            fault_data = {}
-            fault_data = {
-                "rates": out_Rates # Your 'i' index
-            }
-
-            # Adding the outputs of the moment budget to the faults dictionary
-            faults[faultname[i]].update(fault_data)
-
-            # Writing to output files
-            fidout.write(f"{id[i]}, {Mag_min:3.1f}, {bin:3.1f}, " + ', '.join(
-                f"{rate:5.4e}" for rate in CHgaussRATES) + f", {faultname[i]}\n")
-            fidoutProb.write(f"{id[i]}, {Mag_min:3.1f}, {w}, {Hbpt[i]:5.3e}, {faultname[i]}\n")
-
-            # Plotting
-            plt.figure()
-            plt.style.use('dark_background')
-            plt.figure(figsize=(8, 6))
-            plt.semilogy(magnitude_range, cumCHgaussRATES, 'oy')
-            plt.fill_between(magnitude_range, 0, cumCHgaussRATES, color='magenta', alpha=0.3)
-            plt.xlabel('magnitude')
-            plt.ylabel('annual cumulative rates')
-            plt.title(faultname[i])
-
-            # Saving the figure
-            figname = f"{Project_foldername}_SAR_TruncatedGR_rates_{faultname[i]}.png"
-            plt.savefig(os.path.join('./output_files/Figures', figname), format='png')
-
-            plt.show()  # Show the plot
-
-
-
-
-
-    export_faults_to_xml(faults, Project_foldername)
-
-    return Mo_balanced_fict
+    - Saves the rate and probability tables through `sink`.
+    - Each fault gets its incremental rates in ``rates``, from magnitude ``rates_Mmin``
+      (Mmax - sdMmax) in steps of ``bin``.
+    """
+    if kernel is None:
+        kernel = characteristic_gaussian_rates(mag, sdmag, bin)
+
+    # Calculate Tmean following Pace et al., 2006 and a Mo rate
+    Tfict = (-1 * w) / np.log(1 - np.asarray(Hbpt, dtype=float))
+    Morate_fict = Morate * (Tmean / Tfict)
+
+    Mo_balanced_fict = _characteristic_gaussian_outputs(faults, c, d, Project_foldername, faultname, Morate_fict,
+                                                        id, nfault, w, Hbpt, bin, kernel, 'BPT', 'magenta', plots,
+                                                        plot_store, sink)
+    return Mo_balanced_fict.tolist()
+
+
+
+# Scaling relationship registry
+
+
+# Coefficients by Wells & Coppersmith, 1994, to calculate Magnitude from length and area
+# Matrix format: [aRLD, bRLD, sdRLD, aRA, bRA, sdRA], rows: N, R, S, A
+WC94_COEFFICIENTS = np.array([[4.34, 1.54, 0.31, 3.93, 1.02, 0.25],
+                              [4.49, 1.49, 0.26, 4.33, 0.90, 0.25],
+                              [4.33, 1.49, 0.24, 3.98, 1.02, 0.23],
+                              [4.38, 1.49, 0.26, 4.07, 0.98, 0.24]])
+
+# Coefficients by Leonard, 2010, to calculate Moment from length and area
+# Matrix format: [aRLD, bRLDmin, bRLDmax, aRA, bRAmin, bRAmax], rows: dip-slip, strike-slip, stable
+LE10_COEFFICIENTS = np.array([[2.5, 7.53, 8.51, 1.5, 5.69, 6.6],
+                              [1.5, 12.01, 12.88, 1.5, 5.69, 6.47],
+                              [2.5, 7.87, 8.28, 1.5, 6.22, 6.52]])
+
+# Coefficients by D'Amico and Azzaro, 2014 and Villamor 2001, to calculate Ml (D'Amico) and
+# Mw (Villamor) from surface rupture length (D'Amico) and RA (Villamor)
+# Matrix format: [aSRLmin, aSRLmax, bSRLmin, bSRLmax, aRA, bRA]
+VOLC_COEFFICIENTS = np.array([[3.239, 3.543, 1.662, 2.49, 3.39, 1.33]])
+
+# ASPECT RATIO coefficients by Pace et al., 2002 (BGTA), ALWAYS used for computing Magnitudes
+# Matrix format: [aAS, bAS, sdAS]
+AR_TABLE = np.array([[3.0939, 1.2501, 0.25],
+                     [-4.4543, 2.1992, 0.25],
+                     [-7.096, 2.9807, 0.25],
+                     [-2.3725, 1.9354, 0.25]])
+
+# Coefficient tables returned by `kin2coeff`, keyed by the first four characters of ScR
+COEFFICIENT_TABLES = {"WC94": WC94_COEFFICIENTS, "LE10": LE10_COEFFICIENTS,
+                      "AZ15": VOLC_COEFFICIENTS, "VOLC": VOLC_COEFFICIENTS}
+
+# Families of formulas applied by `coeff2mag_arrays`. LE10_STABLE subtracts 6.07 inside the
+# area logarithm, as `coeff2mag` does for the stable continental region codes.
+WC94, LE10, LE10_STABLE, VOLC = 0, 1, 2, 3
+
+# ScR code -> (family, coefficient row, aspect ratio row)
+_SCALING_RELATIONSHIPS = {
+    "WC94-N": (WC94, WC94_COEFFICIENTS[0], AR_TABLE[0]),
+    "WC94-R": (WC94, WC94_COEFFICIENTS[1], AR_TABLE[1]),
+    "WC94-S": (WC94, WC94_COEFFICIENTS[2], AR_TABLE[2]),
+    "WC94-A": (WC94, WC94_COEFFICIENTS[3], AR_TABLE[3]),
+    "LE10-N": (LE10, LE10_COEFFICIENTS[0], AR_TABLE[3]),
+    "LE10-R": (LE10, LE10_COEFFICIENTS[0], AR_TABLE[3]),
+    "LE10-D": (LE10, LE10_COEFFICIENTS[0], AR_TABLE[3]),
+    "LE10-S": (LE10, LE10_COEFFICIENTS[1], AR_TABLE[2]),
+    "LE10-SCR": (LE10_STABLE, LE10_COEFFICIENTS[2], AR_TABLE[3]),
+    "LE10-STABLE": (LE10_STABLE, LE10_COEFFICIENTS[2], AR_TABLE[3]),
+    "VOLC": (VOLC, VOLC_COEFFICIENTS[0], AR_TABLE[0]),
+    "AZ15": (VOLC, VOLC_COEFFICIENTS[0], AR_TABLE[0]),
+}
+
+# Registry arrays, one row per entry of SCALING_CODES
+SCALING_CODES = tuple(_SCALING_RELATIONSHIPS)
+SCALING_FAMILY = np.array([family for family, _, _ in _SCALING_RELATIONSHIPS.values()])
+SCALING_COEFFICIENTS = np.array([row for _, row, _ in _SCALING_RELATIONSHIPS.values()])
+SCALING_AR = np.array([row for _, _, row in _SCALING_RELATIONSHIPS.values()])
+
+for _table in (WC94_COEFFICIENTS, LE10_COEFFICIENTS, VOLC_COEFFICIENTS, AR_TABLE,
+               SCALING_FAMILY, SCALING_COEFFICIENTS, SCALING_AR):
+    _table.flags.writeable = False
+
+
+@functools.lru_cache(maxsize=None)
+def scaling_index(ScR):
+    """
+    Returns the row of the scaling relationship registry for a ScR code, or -1 if unknown.
 
+    Codes are case insensitive, and every code starting with 'AZ15' uses the Azzaro et al.
+    relationship, as in `coeff2mag`.
+    """
+    if not isinstance(ScR, str):
+        return -1
+    code = ScR.upper()
+    if code[:4] == 'AZ15':
+        code = 'AZ15'
+    try:
+        return SCALING_CODES.index(code)
+    except ValueError:
+        return -1
 
 
 def kin2coeff(ScR):
@@ -449,9 +707,9 @@ def kin2coeff(ScR):
 
     Returns
     -------
-    coeff : list
-        Coefficients for computing magnitude from length or area.
-    ARtable : list
+    coeff : ndarray or None
+        Coefficients for computing magnitude from length or area (read-only registry table).
+    ARtable : ndarray
         Aspect ratio control coefficients from Pace et al. (2002).
     """
 
@@ -459,43 +717,7 @@ def kin2coeff(ScR):
     if isinstance(ScR, list):
         ScR = ''.join(ScR)
 
-    # Initialize coefficient matrices
-    coeff = None
-    ARtable = None
-
-    if ScR[:4].upper() == 'WC94':
-        # Coefficients by Wells & Coppersmith, 1994
-        # Coefficients to calculate Magnitude from length and area
-        # Matrix format: [aRLD, bRLD, sdRLD, aRA, bRA, sdRA]
-        coeff = [[4.34, 1.54, 0.31, 3.93, 1.02, 0.25],
-                 [4.49, 1.49, 0.26, 4.33, 0.90, 0.25],
-                 [4.33, 1.49, 0.24, 3.98, 1.02, 0.23],
-                 [4.38, 1.49, 0.26, 4.07, 0.98, 0.24]]
-
-    elif ScR[:4].upper() == 'LE10':
-        # Coefficients by Leonard, 2010
-        # Coefficients to calculate Moment from length and area
-        # Matrix format: [aRLD, bRLDmin, bRLDmax, aRA, bRAmin, bRAmax]
-        coeff = [[2.5, 7.53, 8.51, 1.5, 5.69, 6.6],
-                 [1.5, 12.01, 12.88, 1.5, 5.69, 6.47],
-                 [2.5, 7.87, 8.28, 1.5, 6.22, 6.52]]
-
-    elif ScR[:4].upper() == 'AZ15' or ScR[:4].upper() == 'VOLC':
-        # Coefficients by D'Amico and Azzaro, 2014 and Villamor 2001
-        # Coefficients to calculate Ml (D'Amico) and Mw (Villamor) from
-        # surface rupture length (D'Amico) and RA (Villamor)
-        # Matrix format: [aSRLmin, aSRLmax, bSRLmin, bSRLmax]
-        coeff = [[3.239, 3.543, 1.662, 2.49, 3.39, 1.33]]
-
-    # ASPECT RATIO coefficients by Pace et al., 2002 (BGTA)
-    # Matrix format: [aAS, bAS, sdAS]
-    # These coefficients are ALWAYS used for computing Magnitudes
-    ARtable = [[3.0939, 1.2501, 0.25],
-               [-4.4543, 2.1992, 0.25],
-               [-7.096, 2.9807, 0.25],
-               [-2.3725, 1.9354, 0.25]]
-
-    return coeff, ARtable
+    return COEFFICIENT_TABLES.get(ScR[:4].upper()), AR_TABLE
 
 ################################### Coefficient to magnitude function
 
@@ -696,9 +918,116 @@ def coeff2mag(ScR, coeff, Length, Width, ARtable, mu, straindrop):
 
 
 
+# Ragged magnitude ranges
+
+
+def ragged_arange(start, stop, step):
+    """
+    Concatenates ``np.arange(start[i], stop[i], step)`` for every fault into one flat array.
+
+    Parameters
+    ----------
+    start, stop : ndarray
+        First and (excluded) last magnitude of each range. Non-finite bounds give an empty range.
+    step : float
+        Magnitude bin size.
+
+    Returns
+    -------
+    values : ndarray
+        Concatenated ranges, with the same values as `np.arange` for each fault.
+    offsets : ndarray of int
+        Start of each range in `values`, plus the total length (``len(start) + 1`` entries).
+    segment : ndarray of int
+        Index of the fault each value belongs to, for `np.bincount` segmented sums.
+    """
+    start = np.asarray(start, dtype=float)
+    stop = np.asarray(stop, dtype=float)
+    with np.errstate(invalid='ignore'):
+        span = np.ceil((stop - start) / step)
+    lengths = np.where(np.isfinite(span) & (span > 0), span, 0).astype(int)
+    offsets = np.zeros(len(start) + 1, dtype=int)
+    np.cumsum(lengths, out=offsets[1:])
+    segment = np.repeat(np.arange(len(start)), lengths)
+    position = np.arange(offsets[-1]) - offsets[segment]
+    values = start[segment] + position * ((start + step) - start)[segment]
+    return values, offsets, segment
+
+
 # Conflation function
 
 
+def conflate_normals(means, sds, used=None):
+    """
+    Closed-form conflation of normal distributions, batched over any leading axes.
+
+    The normalized product of the densities N(m_i, s_i) is itself normal, with precision
+    1 / s**2 = sum(1 / s_i**2) and mean m = s**2 * sum(m_i / s_i**2).
+
+    Parameters
+    ----------
+    means, sds : ndarray
+        Means and standard deviations, the distributions to conflate along the last axis
+        (e.g. shape (nfault, k)).
+    used : ndarray of bool, optional
+        Distributions taking part in the conflation. Defaults to the finite entries.
+
+    Returns
+    -------
+    mean, sd : ndarray
+        Mean and standard deviation of the conflated distribution (e.g. shape (nfault,)).
+    """
+    means = np.asarray(means, dtype=float)
+    sds = np.asarray(sds, dtype=float)
+    if used is None:
+        used = np.isfinite(means) & np.isfinite(sds)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(used, 1 / sds ** 2, 0.0)
+        total = precision.sum(axis=-1)
+        mean = np.where(used, means * precision, 0.0).sum(axis=-1) / total
+        sd = 1 / np.sqrt(total)
+    return mean, sd
+
+
+def conflate_log_pdfs(x, log_pdfs, used=None):
+    """
+    Numerical conflation of arbitrary PDFs given in log space, batched over any leading axes.
+
+    Parameters
+    ----------
+    x : ndarray
+        Magnitude bins, shape (..., n).
+    log_pdfs : ndarray
+        Logarithm of the (possibly unnormalized) PDFs over `x`, shape (..., k, n).
+        Padding bins past the end of a ragged grid are marked with -inf.
+    used : ndarray of bool, optional
+        PDFs taking part in the conflation, shape (..., k). Defaults to all of them.
+
+    Returns
+    -------
+    ndarray
+        Conflated PDF over `x`, normalized to unit area, shape (..., n).
+
+    Notes
+    -----
+    - The product is accumulated as a sum of logarithms and rescaled by its maximum
+      (log-sum-exp) before exponentiation, so narrow PDFs do not underflow.
+    """
+    x = np.asarray(x, dtype=float)
+    log_pdfs = np.asarray(log_pdfs, dtype=float)
+    if used is None:
+        used = np.ones(log_pdfs.shape[:-1], dtype=bool)
+    log_conflated = np.sum(np.where(used[..., None], log_pdfs, 0.0), axis=-2)
+    with np.errstate(invalid='ignore'):
+        log_conflated = log_conflated - np.max(log_conflated, axis=-1, keepdims=True)
+    conflated = np.exp(log_conflated)
+    # Trapezoidal area, skipping the segments that touch padding bins
+    segments = np.isfinite(log_conflated[..., 1:]) & np.isfinite(log_conflated[..., :-1])
+    area = np.sum(np.where(segments, np.diff(x, axis=-1) * (conflated[..., 1:] + conflated[..., :-1]) / 2, 0.0),
+                  axis=-1)
+    return conflated / area[..., None]
+
+
 def conflate_pdfs(x, pdfs):
     """
     Combines multiple probability density functions (PDFs) into a single conflated distribution.
@@ -708,7 +1037,7 @@ def conflate_pdfs(x, pdfs):
     x : ndarray
         Array of magnitude bins.
     pdfs : ndarray
-        2D array where each row is a PDF over `x`.
+        2D array where each row is a PDF over `x` (or a stack of such arrays, one per fault).
 
     Returns
     -------
@@ -717,20 +1046,94 @@ def conflate_pdfs(x, pdfs):
 
     Notes
     -----
-    - Each input PDF is normalized before multiplication.
-    - Final result is re-normalized to ensure proper integration.
+    - The product is evaluated in log space by `conflate_log_pdfs`. When every input is a
+      normal distribution, `conflate_normals` gives the same result in closed form.
     """
+    with np.errstate(divide='ignore'):
+        log_pdfs = np.log(np.asarray(pdfs, dtype=float))
+    return conflate_log_pdfs(x, log_pdfs)
 
-    # Initialize the conflated distribution as a uniform distribution
-    conflated = np.ones(x.shape) / (x[-1] - x[0])
 
-    for i in range(pdfs.shape[0]):
-        pdf = pdfs[i, :] / trapezoid(x, pdfs[i, :])
-        conflated = conflated * pdf
+def coeff2mag_arrays(ScR, Length, Width, mu, straindrop):
+    """
+    Vectorized `coeff2mag` over a fault catalog, with one scaling relationship code per fault.
 
-    # Normalize the conflated distribution
-    conflated = -conflated / trapezoid(x, np.abs(conflated))
-    conflated=np.abs(conflated) # Ensure positive values
+    Parameters
+    ----------
+    ScR : array_like of str
+        Scaling relationship code of each fault.
+    Length, Width : ndarray
+        Fault lengths and widths in meters.
+    mu, straindrop : ndarray
+        Shear modulus (Pa) and strain drop of each fault.
+
+    Returns
+    -------
+    MRLD, MRA, dMRLD, dMRA, MAR, dMAR, LAR : ndarray
+        Same quantities as `coeff2mag`, one value per fault. ``dMAR`` is the aspect ratio
+        standard deviation (``ar_coeff[2]``). Unknown codes give NaN.
 
-    return conflated
+    Notes
+    -----
+    - Codes are resolved once per distinct value through the memoized `scaling_index`, and
+      the coefficients of each fault are gathered from the registry arrays.
+    """
+    Length = np.asarray(Length, dtype=float)
+    Width = np.asarray(Width, dtype=float)
+    mu = np.broadcast_to(np.asarray(mu, dtype=float), Length.shape)
+    straindrop = np.broadcast_to(np.asarray(straindrop, dtype=float), Length.shape)
+    codes, inverse = np.unique(np.asarray(ScR, dtype=object).astype(str), return_inverse=True)
+    index = np.array([scaling_index(code) for code in codes], dtype=int)[inverse.reshape(Length.shape)]
+
+    MRLD, MRA, dMRLD, dMRA, MAR, dMAR, LAR = (np.full(Length.shape, np.nan) for _ in range(7))
+    known = index >= 0
+    family = np.where(known, SCALING_FAMILY[index], -1)
+    coeff = SCALING_COEFFICIENTS[index]
+    ar_coeff = SCALING_AR[index]
+    Length_km = Length / 1000
+    Width_km = Width / 1000
 
+    with np.errstate(divide='ignore', invalid='ignore'):
+        group = family == WC94
+        if group.any():
+            wc, L, W = coeff[group], Length_km[group], Width_km[group]
+            MRLD[group] = wc[:, 0] + wc[:, 1] * np.log10(L)
+            MRA[group] = wc[:, 3] + wc[:, 4] * np.log10(L * W)
+            dMRLD[group] = wc[:, 2]
+            dMRA[group] = wc[:, 5]
+
+        group = (family == LE10) | (family == LE10_STABLE)
+        if group.any():
+            leo, L, W = coeff[group], Length[group], Width[group]
+            MRLDmin = (2 / 3) * np.log10(10 ** (leo[:, 1] + leo[:, 0] * np.log10(L))) - 6.07
+            MRLDmax = (2 / 3) * np.log10(10 ** (leo[:, 2] + leo[:, 0] * np.log10(L))) - 6.07
+            stable = family[group] == LE10_STABLE
+            MRAmin = np.where(stable,
+                              (2 / 3) * np.log10(10 ** (leo[:, 4] + leo[:, 3] * np.log10(L * W)) - 6.07),
+                              (2 / 3) * np.log10(10 ** (leo[:, 4] + leo[:, 3] * np.log10(L * W))) - 6.07)
+            MRAmax = np.where(stable,
+                              (2 / 3) * np.log10(10 ** (leo[:, 5] + leo[:, 3] * np.log10(L * W)) - 6.07),
+                              (2 / 3) * np.log10(10 ** (leo[:, 5] + leo[:, 3] * np.log10(L * W))) - 6.07)
+            MRLD[group] = MRLDmin + ((MRLDmax - MRLDmin) / 2)
+            MRA[group] = MRAmin + ((MRAmax - MRAmin) / 2)
+            dMRLD[group] = (MRLDmax - MRLDmin) / 2
+            dMRA[group] = (MRAmax - MRAmin) / 2
+
+        group = family == VOLC
+        if group.any():
+            vol, L, W = coeff[group], Length_km[group], Width_km[group]
+            Mlmin = vol[:, 0] + vol[:, 2] * np.log10(L)
+            Mlmax = vol[:, 1] + vol[:, 3] * np.log10(L)
+            Mwmin = (vol[:, 4] + vol[:, 5] * np.log10(L * W)) - 0.195
+            Mwmax = (vol[:, 4] + vol[:, 5] * np.log10(L * W)) + 0.195
+            MRLD[group] = Mlmin + ((Mlmax - Mlmin) / 2)
+            MRA[group] = Mwmin + ((Mwmax - Mwmin) / 2)
+            dMRLD[group] = (Mlmax - Mlmin) / 2
+            dMRA[group] = (Mwmax - Mwmin) / 2
+
+        # Aspect Ratio Control Formula (Pace and Peruzza, 2002), Length from Aspect Ratio in meters
+        LAR[known] = (ar_coeff[known, 0] + ar_coeff[known, 1] * Width_km[known]) * 1000
+        MAR[known] = (2 / 3) * (np.log10(straindrop[known] * mu[known] * LAR[known] ** 2 * Width[known]) - 9.05)
+        dMAR[known] = ar_coeff[known, 2]
+
+    return MRLD, MRA, dMRLD, dMRA, MAR, dMAR, LAR
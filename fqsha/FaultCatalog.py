@@ -0,0 +1,886 @@
+# FQSHA - Fault-based Seismic Hazard Assessment Toolkit
+# Copyright (C) 2025 Tavakolizadeh et al., (2025)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# FaultCatalog.py
+
+import json
+import math
+import os
+from collections.abc import MutableMapping
+
+import numpy as np
+
+
+# Scalar fault parameters loaded into float64 columns by `fault_columns`
+NUMERIC_COLUMNS = [
+    "Length", "Dip", "upperSeismoDepth", "lowerSeismoDepth", "Seismogenic_Thickness",
+    "SRmin", "SRmax", "Mobs", "sdMobs", "Last_eq_time", "SCC",
+    "ShearModulus", "StrainDrop", "year_for_calculations",
+]
+
+# Version of the columnar catalog written by `save_catalog`
+CATALOG_FORMAT = 1
+
+# Description file of a columnar catalog folder, next to one .npy file per column
+CATALOG_META = "meta.json"
+
+# Ragged [lon, lat] vertex list stored as one vertex array plus offsets
+TRACE_KEY = "fault_trace"
+
+
+def _to_float(value):
+    """Converts a fault parameter to float, mapping None, '' and 'nan' strings to NaN."""
+    if value is None or (isinstance(value, str) and (value == '' or value.lower() == 'nan')):
+        return math.nan
+    return float(value)
+
+
+def fault_columns(faults, names=None):
+    """
+    Loads the scalar parameters of a fault catalog into NumPy columns.
+
+    Parameters
+    ----------
+    faults : dict
+        Dictionary of fault parameters keyed by fault name (the JSON input schema).
+    names : list of str, optional
+        Faults to load, in order. Defaults to every fault in `faults`.
+
+    Returns
+    -------
+    dict
+        Column table with ``name`` and ``ScR`` object arrays plus one float64 array per
+        entry of `NUMERIC_COLUMNS`. Missing or empty values are stored as NaN.
+
+    Notes
+    -----
+    - Values are copied as they are found in the dictionaries, no unit conversion is applied.
+    - ``Seismogenic_Thickness`` falls back to ``lowerSeismoDepth - upperSeismoDepth``.
+    """
+    if names is None:
+        names = list(faults.keys())
+    nfault = len(names)
+
+    columns = {
+        "name": np.array(names, dtype=object),
+        "ScR": np.empty(nfault, dtype=object),
+    }
+    for key in NUMERIC_COLUMNS:
+        columns[key] = np.full(nfault, np.nan)
+
+    for i, fault_name in enumerate(names):
+        fault = faults[fault_name]
+        columns["ScR"][i] = fault.get("ScR")
+        for key in NUMERIC_COLUMNS:
+            if key in fault:
+                columns[key][i] = _to_float(fault[key])
+
+    return _fill_thickness(columns)
+
+
+def _fill_thickness(columns):
+    missing = np.isnan(columns["Seismogenic_Thickness"])
+    columns["Seismogenic_Thickness"][missing] = (columns["lowerSeismoDepth"][missing]
+                                                 - columns["upperSeismoDepth"][missing])
+    return columns
+
+
+# Scaling relationship codes accepted by `momentbudget`
+VALID_SCR = ("WC94-N", "WC94-R", "WC94-S", "WC94-A", "Le10-D", "Le10-S", "Le10-SCR")
+
+# Parameters every fault must define (Seismogenic_Thickness may come from the depths)
+REQUIRED_PARAMETERS = ("ScR", "Length", "SRmin", "SRmax", "Seismogenic_Thickness", "Dip", "Mobs", "sdMobs",
+                       "Last_eq_time", "SCC", "ShearModulus", "StrainDrop", "year_for_calculations")
+
+# Parameters that must be given as numbers (NaN included) rather than text or null
+NUMBER_PARAMETERS = ("Length", "SRmin", "SRmax", "Dip", "Mobs")
+
+# Input units of ShearModulus (1e10 Pa) and StrainDrop (1e-5), and the values used when they are null
+SHEAR_MODULUS_UNIT = 1e10
+STRAIN_DROP_UNIT = 1e-5
+DEFAULT_SHEAR_MODULUS = 3
+DEFAULT_STRAIN_DROP = 3
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and (value == '' or value.lower() == 'nan'))
+
+
+def _inspect_values(values, present):
+    """
+    Returns the ``value`` (float64, NaN when blank or not a number), ``number`` (int or float),
+    ``integer`` (int) and ``blank`` (null, '' or 'nan') arrays of a list of parameter values.
+    """
+    nfault = len(values)
+    entry = {"present": present, "value": np.full(nfault, np.nan)}
+    for mask in ("number", "integer", "blank"):
+        entry[mask] = np.zeros(nfault, dtype=bool)
+    for i in np.flatnonzero(present):
+        value = values[i]
+        entry["number"][i] = isinstance(value, (float, int))
+        entry["integer"][i] = isinstance(value, int)
+        entry["blank"][i] = _is_blank(value)
+        if not entry["blank"][i]:
+            try:
+                entry["value"][i] = float(value)
+            except (TypeError, ValueError):
+                pass
+    return entry
+
+
+def _raw_columns(faults, names, keys):
+    """
+    Reads `keys` of the faults `names` into the arrays of `_inspect_values`, plus the
+    ``present`` mask and ``raw``, a callable returning the original value.
+    """
+    raw = {}
+    for key in keys:
+        present = np.array([key in faults[name] for name in names], dtype=bool)
+        values = [faults[name][key] if present[i] else None for i, name in enumerate(names)]
+        raw[key] = _inspect_values(values, present)
+        raw[key]["raw"] = lambda i, values=values: values[i]
+    return raw
+
+
+def _raw_catalog_columns(catalog, keys):
+    """`_raw_columns` for a columnar catalog (`load_catalog`), using the column types."""
+    nfault = len(catalog["names"])
+    raw = {}
+    for key in keys:
+        column = catalog["columns"].get(key)
+        null = catalog.get("null", {}).get(key)
+        present = np.ones(nfault, dtype=bool) if column is not None else np.zeros(nfault, dtype=bool)
+        if key in catalog["present"]:
+            present &= np.asarray(catalog["present"][key])
+        if column is None:
+            column = np.full(nfault, np.nan)
+        if column.dtype == object:
+            entry = _inspect_values(column.tolist(), present)
+        elif column.dtype.kind == 'U':
+            entry = {"present": present}
+            entry["blank"] = present & np.isin(np.char.lower(column), ['', 'nan'])
+            entry["number"] = np.zeros(nfault, dtype=bool)
+            entry["integer"] = np.zeros(nfault, dtype=bool)
+            entry["value"] = np.full(nfault, np.nan)
+            for i in np.flatnonzero(present & ~entry["blank"]):
+                try:
+                    entry["value"][i] = float(column[i])
+                except ValueError:
+                    pass
+        else:
+            # Null values were flagged by `faults_to_catalog`, other NaN are numbers
+            entry = {"present": present}
+            entry["value"] = np.where(present, np.asarray(column, dtype=float), np.nan)
+            entry["blank"] = present & np.asarray(null) if null is not None else np.zeros(nfault, dtype=bool)
+            entry["number"] = present & ~entry["blank"]
+            integer = column.dtype.kind == 'i' or key in catalog.get("integer", ())
+            entry["integer"] = entry["number"] & np.isfinite(entry["value"]) if integer else np.zeros(nfault, dtype=bool)
+        entry["raw"] = lambda i, column=column, null=null: (
+            column[i] if column.dtype == object else None if null is not None and null[i] else column[i].item())
+        raw[key] = entry
+    return raw
+
+
+def normalize_faults(faults):
+    """
+    Validates a fault catalog and converts it to the typed, unit-normalized column table read
+    by `SeismicActivityRate.momentbudget_arrays`.
+
+    Parameters
+    ----------
+    faults : dict or FaultCatalog
+        Fault dictionary (JSON input schema), `FaultCatalog`, columnar catalog (`load_catalog`)
+        or a table already returned by this function, which is returned as it is.
+
+    Returns
+    -------
+    table : dict
+        Column table of the valid faults, as in `fault_columns`, with ShearModulus in Pa,
+        StrainDrop dimensionless, Seismogenic_Thickness filled from the depths and null
+        Last_eq_time as NaN. ``table["normalized"]`` is True.
+    errors : dict
+        Error table with one row per problem: ``name``, ``parameter`` and ``message`` arrays,
+        in catalog order. A fault is valid when it has no row.
+
+    Notes
+    -----
+    - `faults` is never modified, so normalizing twice gives the same table.
+    - ScR must be one of `VALID_SCR`, the `NUMBER_PARAMETERS` must be numbers and
+      Seismogenic_Thickness an integer, as checked by `momentbudget` so far.
+    - Null ShearModulus and StrainDrop values take `DEFAULT_SHEAR_MODULUS` and `DEFAULT_STRAIN_DROP`.
+    """
+    if isinstance(faults, FaultCatalog):
+        faults = faults.columnar()
+    elif faults.get("normalized") is True:
+        empty = np.array([], dtype=object)
+        return faults, {"name": empty, "parameter": empty, "message": empty}
+
+    keys = list(dict.fromkeys(NUMERIC_COLUMNS + ["ScR"]))
+    if "trace_offsets" in faults:
+        names = [str(name) for name in faults["names"]]
+        raw = _raw_catalog_columns(faults, keys)
+    else:
+        names = list(faults.keys())
+        raw = _raw_columns(faults, names, keys)
+    nfault = len(names)
+
+    # Seismogenic_Thickness falls back to lowerSeismoDepth - upperSeismoDepth
+    thickness = raw["Seismogenic_Thickness"]
+    lower, upper = raw["lowerSeismoDepth"], raw["upperSeismoDepth"]
+    derived = ~thickness["present"] & lower["present"] & upper["present"]
+    thickness["value"] = np.where(derived, lower["value"] - upper["value"], thickness["value"])
+    thickness["integer"] = np.where(derived, lower["integer"] & upper["integer"], thickness["integer"])
+    thickness["present"] = thickness["present"] | derived
+
+    rows = []  # (fault index, parameter order, parameter, message) arrays
+    for order, key in enumerate(REQUIRED_PARAMETERS):
+        column = raw[key]
+        present = column["present"]
+        invalid = ~present
+        rows.append((np.flatnonzero(invalid), order, key, lambda i, key=key: f"Missing required parameter: '{key}'"))
+        if key == "ScR":
+            scr = np.array([column["raw"](i) if present[i] else None for i in range(nfault)], dtype=object)
+            bad = present & ~np.isin(scr, np.array(VALID_SCR, dtype=object))
+            message = lambda i: ("ScR type is incorrect, consider revising the input file or invalid value: "
+                                 f"{scr[i]}")
+        elif key in NUMBER_PARAMETERS or key == "Seismogenic_Thickness":
+            bad = present & ~(column["integer"] if key == "Seismogenic_Thickness" else column["number"])
+            if key == "Seismogenic_Thickness":
+                type_name = lambda i, column=column: type(column["raw"](i)).__name__ if not derived[i] else "float"
+            else:
+                type_name = lambda i, column=column: type(column["raw"](i)).__name__
+            message = lambda i, key=key, type_name=type_name: (f"{key} type is incorrect, consider revising the "
+                                                               f"input file: {type_name(i)}")
+        else:
+            bad = present & ~column["blank"] & np.isnan(column["value"]) & ~column["number"]
+            message = lambda i, key=key, column=column: f"{key} is not a number: {column['raw'](i)!r}"
+        rows.append((np.flatnonzero(bad), order, key, message))
+
+    entries = sorted((int(i), order, key, message(i)) for indices, order, key, message in rows for i in indices)
+    errors = {
+        "name": np.array([names[i] for i, _, _, _ in entries], dtype=object),
+        "parameter": np.array([key for _, _, key, _ in entries], dtype=object),
+        "message": np.array([text for _, _, _, text in entries], dtype=object),
+    }
+    valid = np.ones(nfault, dtype=bool)
+    valid[[i for i, _, _, _ in entries]] = False
+
+    for i in np.flatnonzero(valid & raw["ShearModulus"]["blank"]):
+        print(f"Fault {names[i]} has a 'NaN' ShearModulus value.")
+    table = {
+        "name": np.array(names, dtype=object)[valid],
+        "ScR": np.array([raw["ScR"]["raw"](i) for i in np.flatnonzero(valid)], dtype=object),
+    }
+    for key in NUMERIC_COLUMNS:
+        table[key] = raw[key]["value"][valid]
+    table["ShearModulus"] = np.where(raw["ShearModulus"]["blank"][valid], DEFAULT_SHEAR_MODULUS,
+                                     table["ShearModulus"]) * SHEAR_MODULUS_UNIT
+    table["StrainDrop"] = np.where(raw["StrainDrop"]["blank"][valid], DEFAULT_STRAIN_DROP,
+                                   table["StrainDrop"]) * STRAIN_DROP_UNIT
+    table["normalized"] = True
+    return table, errors
+
+
+def _column_kind(key, values):
+    """Returns 'int', 'float' or 'str' for the values of one fault parameter."""
+    if all(isinstance(value, str) for value in values):
+        return 'str'
+    if all(isinstance(value, (int, np.integer)) and not isinstance(value, bool) for value in values):
+        return 'int'
+    for value in values:
+        if isinstance(value, (list, tuple, dict, bool)):
+            raise ValueError(f"Parameter '{key}' cannot be stored in a columnar catalog: {value!r}")
+        try:
+            _to_float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Parameter '{key}' mixes numbers and text: {value!r}")
+    return 'float'
+
+
+def faults_to_catalog(faults):
+    """
+    Converts a fault dictionary (the JSON input schema) to a columnar catalog.
+
+    Parameters
+    ----------
+    faults : dict
+        Dictionary of fault parameters keyed by fault name.
+
+    Returns
+    -------
+    dict
+        ``names`` (unicode array), ``keys`` (parameter order), ``columns`` (one int64, float64
+        or unicode array per parameter), ``present`` (bool array for the parameters some
+        faults do not define), ``null`` (bool array of the null values of the float64 columns
+        that have some), ``trace`` (all trace vertices, shape (nvertex, ncoord)) and
+        ``trace_offsets`` (start of each fault's vertices plus the total, nfault + 1 entries),
+        and ``integer``, the float64 columns whose defined values are integers.
+
+    Notes
+    -----
+    - Columns mixing numbers and None, empty or 'nan' strings are stored as float64 with
+      NaN and flagged in ``null``: these values come back as None from `catalog_to_faults`,
+      and are blank for `normalize_faults` (so null ShearModulus and StrainDrop take their
+      default values) while NaN numbers stay NaN.
+    """
+    names = list(faults.keys())
+    keys = list(dict.fromkeys(key for name in names for key in faults[name]))
+    catalog = {"names": np.array(names, dtype=str), "keys": keys, "columns": {}, "present": {}, "null": {},
+               "integer": []}
+
+    for key in keys:
+        if key == TRACE_KEY:
+            continue
+        present = np.array([key in faults[name] for name in names], dtype=bool)
+        values = [faults[name][key] for name in names if key in faults[name]]
+        kind = _column_kind(key, values)
+        if kind == 'str':
+            column = np.array([faults[name].get(key, '') for name in names], dtype=str)
+        elif kind == 'int' and present.all():
+            column = np.array(values, dtype=np.int64)
+        else:
+            column = np.array([_to_float(faults[name].get(key)) for name in names], dtype=float)
+            if all(isinstance(value, (int, np.integer)) for value in values if not math.isnan(_to_float(value))):
+                catalog["integer"].append(key)
+            null = present & np.array([_is_blank(faults[name].get(key)) for name in names], dtype=bool)
+            if null.any():
+                catalog["null"][key] = null
+        catalog["columns"][key] = column
+        if not present.all():
+            catalog["present"][key] = present
+
+    traces = [np.asarray(faults[name].get(TRACE_KEY, []), dtype=float) for name in names]
+    ncoord = max((trace.shape[-1] for trace in traces if trace.size), default=2)
+    traces = [trace.reshape(-1, ncoord) for trace in traces]
+    offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(trace) for trace in traces], out=offsets[1:])
+    catalog["trace"] = np.concatenate(traces) if traces else np.empty((0, ncoord))
+    catalog["trace_offsets"] = offsets
+    if TRACE_KEY in keys:
+        catalog["present"][TRACE_KEY] = np.array([TRACE_KEY in faults[name] for name in names], dtype=bool)
+    return catalog
+
+
+def catalog_to_faults(catalog):
+    """Converts a columnar catalog back to the fault dictionary of the JSON input schema."""
+    names = [str(name) for name in catalog["names"]]
+    offsets = catalog["trace_offsets"]
+    faults = {name: {} for name in names}
+    for key in catalog["keys"]:
+        present = catalog["present"].get(key)
+        if key == TRACE_KEY:
+            column = [catalog["trace"][offsets[i]:offsets[i + 1]].tolist() for i in range(len(names))]
+        elif key in catalog["integer"]:
+            column = [int(value) if math.isfinite(value) else value for value in catalog["columns"][key].tolist()]
+        else:
+            column = catalog["columns"][key].tolist()
+        if key in catalog.get("null", {}):
+            for i in np.flatnonzero(catalog["null"][key]):
+                column[i] = None
+        for i, name in enumerate(names):
+            if present is None or present[i]:
+                faults[name][key] = column[i]
+    return faults
+
+
+def save_catalog(catalog, path):
+    """
+    Writes a columnar catalog to the folder `path`: one .npy file per array and `CATALOG_META`.
+
+    `catalog` is a columnar catalog (`faults_to_catalog`) or a fault dictionary.
+    """
+    if "trace_offsets" not in catalog:
+        catalog = faults_to_catalog(catalog)
+    os.makedirs(path, exist_ok=True)
+    meta = {"format": CATALOG_FORMAT, "nfault": len(catalog["names"]), "keys": catalog["keys"],
+            "integer": catalog["integer"], "columns": {}, "present": {}, "null": {}}
+    np.save(os.path.join(path, "names.npy"), catalog["names"])
+    np.save(os.path.join(path, "trace.npy"), catalog["trace"])
+    np.save(os.path.join(path, "trace_offsets.npy"), catalog["trace_offsets"])
+    # Parameter names may not be valid file names, the files are numbered
+    for i, (key, column) in enumerate(catalog["columns"].items()):
+        meta["columns"][key] = f"column_{i}.npy"
+        np.save(os.path.join(path, meta["columns"][key]), column)
+    for i, (key, present) in enumerate(catalog["present"].items()):
+        meta["present"][key] = f"present_{i}.npy"
+        np.save(os.path.join(path, meta["present"][key]), present)
+    for i, (key, null) in enumerate(catalog.get("null", {}).items()):
+        meta["null"][key] = f"null_{i}.npy"
+        np.save(os.path.join(path, meta["null"][key]), null)
+    with open(os.path.join(path, CATALOG_META), 'w') as f:
+        json.dump(meta, f, indent=1)
+    return path
+
+
+def load_catalog(path, mmap_mode='r'):
+    """
+    Loads a columnar catalog folder written by `save_catalog`.
+
+    Parameters
+    ----------
+    path : str
+        Catalog folder (or its `CATALOG_META` file).
+    mmap_mode : {'r', 'c', None}, optional
+        Arrays are memory-mapped read-only by default, so only the pages in use are read.
+        None loads them in memory.
+    """
+    if os.path.basename(path) == CATALOG_META:
+        path = os.path.dirname(path)
+    with open(os.path.join(path, CATALOG_META), 'r') as f:
+        meta = json.load(f)
+    if meta.get("format") != CATALOG_FORMAT:
+        raise ValueError(f"Unsupported fault catalog format {meta.get('format')!r} in {path}")
+
+    def load(filename):
+        return np.load(os.path.join(path, filename), mmap_mode=mmap_mode)
+
+    return {
+        "names": load("names.npy"),
+        "keys": meta["keys"],
+        "columns": {key: load(filename) for key, filename in meta["columns"].items()},
+        "present": {key: load(filename) for key, filename in meta["present"].items()},
+        "null": {key: load(filename) for key, filename in meta.get("null", {}).items()},
+        "integer": meta["integer"],
+        "trace": load("trace.npy"),
+        "trace_offsets": load("trace_offsets.npy"),
+    }
+
+
+def is_catalog(path):
+    """True if `path` is a columnar catalog folder or its `CATALOG_META` file."""
+    if os.path.basename(path) == CATALOG_META:
+        return os.path.isfile(path)
+    return os.path.isfile(os.path.join(path, CATALOG_META))
+
+
+def read_faults(path):
+    """Reads a fault dictionary from a JSON fault file or a columnar catalog folder."""
+    if is_catalog(path):
+        return catalog_to_faults(load_catalog(path))
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def catalog_columns(catalog):
+    """
+    Column table of `fault_columns` taken directly from a columnar catalog, without building
+    the per-fault dictionaries. Memory-mapped columns are only read here.
+    """
+    nfault = len(catalog["names"])
+    columns = {"name": np.asarray(catalog["names"]).astype(object)}
+    scr = catalog["columns"].get("ScR")
+    columns["ScR"] = np.asarray(scr).astype(object) if scr is not None else np.full(nfault, None, dtype=object)
+    if "ScR" in catalog["present"]:
+        columns["ScR"][~np.asarray(catalog["present"]["ScR"])] = None
+
+    for key in NUMERIC_COLUMNS:
+        column = catalog["columns"].get(key)
+        if column is None:
+            columns[key] = np.full(nfault, np.nan)
+            continue
+        if column.dtype.kind == 'U':
+            columns[key] = np.array([_to_float(value) for value in column.tolist()])
+        else:
+            columns[key] = np.array(column, dtype=float)
+        if key in catalog["present"]:
+            columns[key][~np.asarray(catalog["present"][key])] = np.nan
+    return _fill_thickness(columns)
+
+
+def _ndjson_record(record, number):
+    """Returns (name, parameters) from one NDJSON line: {"name": ..., ...} or {name: {...}}."""
+    if isinstance(record, dict) and "name" in record:
+        record = dict(record)
+        return str(record.pop("name")), record
+    if isinstance(record, dict) and len(record) == 1:
+        (name, parameters), = record.items()
+        if isinstance(parameters, dict):
+            return name, parameters
+    raise ValueError(f"Line {number}: expected {{\"name\": ..., ...}} or {{name: {{...}}}}")
+
+
+def _iter_json_object(f, buffer_size):
+    """Yields the (key, value) pairs of the top-level JSON object read from `f`, one at a time."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def read(size):
+        nonlocal buffer, pos, eof
+        data = f.read(size)
+        if not data:
+            eof = True
+        buffer = buffer[pos:] + data
+        pos = 0
+
+    def next_char():
+        # First non-blank character at or after pos, reading more data if needed ('' at the end)
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos:pos + 1]
+            read(buffer_size)
+
+    def decode():
+        nonlocal pos
+        while True:
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+                return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Grow the reads with the buffer so a large record is parsed a bounded number of times
+                read(max(buffer_size, len(buffer) - pos))
+
+    if next_char() != '{':
+        raise ValueError("The fault file must contain a JSON object keyed by fault name")
+    pos += 1
+    while True:
+        char = next_char()
+        if char == '}':
+            return
+        if char != '"':
+            raise ValueError(f"Expected a fault name, found {buffer[pos:pos + 20]!r}")
+        name = decode()
+        if next_char() != ':':
+            raise ValueError(f"Expected ':' after fault name {name!r}")
+        pos += 1
+        next_char()
+        record = decode()
+        if not isinstance(record, dict):
+            raise ValueError(f"Fault {name!r} is not a JSON object")
+        yield name, record
+        char = next_char()
+        if char == ',':
+            pos += 1
+        elif char != '}':
+            raise ValueError(f"Expected ',' or '}}' after fault {name!r}")
+
+
+def iter_faults(path, buffer_size=1 << 16):
+    """
+    Yields ``(fault name, parameters)`` pairs from a fault file without loading it whole.
+
+    Parameters
+    ----------
+    path : str
+        JSON fault file (one object keyed by fault name) or, for the ``.ndjson`` and
+        ``.jsonl`` extensions, one fault per line as ``{"name": ..., ...}`` or ``{name: {...}}``.
+    buffer_size : int, optional
+        Number of characters read at a time from a JSON object file.
+
+    Notes
+    -----
+    - Only the record being decoded is held in memory, plus the read buffer.
+    """
+    with open(path, 'r') as f:
+        if str(path).endswith(('.ndjson', '.jsonl')):
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield _ndjson_record(json.loads(line), number)
+        else:
+            yield from _iter_json_object(f, buffer_size)
+
+
+def iter_fault_chunks(records, chunk_size=1000):
+    """Groups ``(name, parameters)`` pairs (e.g. from `iter_faults`) into fault dictionaries of `chunk_size` faults."""
+    chunk = {}
+    for name, parameters in records:
+        chunk[name] = parameters
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = {}
+    if chunk:
+        yield chunk
+
+
+def field_array(faults, key, default=np.nan):
+    """
+    Float64 array of one parameter of every fault, in catalog order.
+
+    For a `FaultCatalog` the stored column is returned without copying when every fault
+    defines `key` in a float64 column. Faults without `key` get `default`, or raise KeyError
+    when `default` is None.
+    """
+    names = list(faults.keys())
+    if isinstance(faults, FaultCatalog) and key in faults._columns and faults._columns[key].dtype != object:
+        present = faults.present(key)
+        if default is None and not present.all():
+            raise KeyError(key)
+        column = np.asarray(faults.column(key), dtype=float)
+        return column if present.all() else np.where(present, column, default)
+    if default is None:
+        return np.array([faults[name][key] for name in names], dtype=float)
+    return np.array([faults[name].get(key, default) for name in names], dtype=float)
+
+
+class Fault(MutableMapping):
+    """
+    Parameters of one fault of a `FaultCatalog`, read from and written to the catalog columns.
+
+    Behaves as the fault dictionary of the JSON schema. Views are created on access and hold
+    no data of their own.
+    """
+
+    __slots__ = ("_catalog", "_index")
+
+    def __init__(self, catalog, index):
+        self._catalog = catalog
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._catalog._get(self._index, key)
+
+    def __setitem__(self, key, value):
+        self._catalog._set(self._index, key, value)
+
+    def __delitem__(self, key):
+        self._catalog._delete(self._index, key)
+
+    def __contains__(self, key):
+        return self._catalog._has(self._index, key)
+
+    def __iter__(self):
+        return (key for key in list(self._catalog._keys) if self._catalog._has(self._index, key))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Fault({self._catalog._names[self._index]!r}, {dict(self)!r})"
+
+
+class FaultCatalog(MutableMapping):
+    """
+    Fault catalog stored as one NumPy column per parameter, used wherever the
+    ``{fault name: parameters}`` dictionary is accepted.
+
+    ``catalog[name]`` is a `Fault` view. Values written by the stages (``update``, item
+    assignment) go to the columns: numbers to int64/float64 columns, other values (rate
+    lists, text) to object columns. Null values of the float64 columns read from a fault
+    file are stored as NaN and read back as None. `column` gives the stored arrays without copying.
+
+    Parameters
+    ----------
+    catalog : dict, optional
+        Columnar catalog from `faults_to_catalog` or `load_catalog`. Memory-mapped columns are
+        copied the first time they are written.
+    """
+
+    def __init__(self, catalog=None):
+        if catalog is None:
+            catalog = faults_to_catalog({})
+        self._names = [str(name) for name in catalog["names"]]
+        self._index = {name: i for i, name in enumerate(self._names)}
+        self._keys = list(catalog["keys"])
+        self._columns = dict(catalog["columns"])
+        self._present = dict(catalog["present"])
+        self._null = dict(catalog.get("null", {}))
+        self._integer = set(catalog.get("integer", ()))
+        self._trace = catalog["trace"]
+        self._trace_offsets = catalog["trace_offsets"]
+
+    @classmethod
+    def from_faults(cls, faults):
+        """Builds a catalog from a fault dictionary (JSON input schema)."""
+        return cls(faults_to_catalog(faults))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Opens a columnar catalog folder (`save_catalog`), memory-mapped by default."""
+        return cls(load_catalog(path, mmap_mode=mmap_mode))
+
+    # Mapping of fault names
+
+    def __getitem__(self, name):
+        return Fault(self, self._index[name])
+
+    def __setitem__(self, name, parameters):
+        if name not in self._index:
+            self._append(name)
+        fault = self[name]
+        fault.clear()
+        fault.update(parameters)
+
+    def __delitem__(self, name):
+        keep = np.ones(len(self._names), dtype=bool)
+        keep[self._index[name]] = False
+        self._materialize_trace()
+        self._columns = {key: column[keep] for key, column in self._columns.items()}
+        self._present = {key: present[keep] for key, present in self._present.items()}
+        self._null = {key: null[keep] for key, null in self._null.items()}
+        self._names = [n for n in self._names if n != name]
+        self._index = {n: i for i, n in enumerate(self._names)}
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        return iter(list(self._names))
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return f"FaultCatalog({len(self)} faults, {len(self._keys)} parameters)"
+
+    # Column access
+
+    def column(self, key):
+        """
+        Stored array of a parameter (no copy), one entry per fault in catalog order. Entries of
+        faults without the parameter are given by `present`. The fault traces are returned as
+        one (nvertex, ncoord) array, see `trace_offsets`.
+        """
+        if key == TRACE_KEY and TRACE_KEY not in self._columns:
+            return self._trace
+        return self._columns[key]
+
+    def present(self, key):
+        """Boolean mask of the faults defining `key`."""
+        if key not in self._keys:
+            return np.zeros(len(self._names), dtype=bool)
+        mask = self._present.get(key)
+        return np.ones(len(self._names), dtype=bool) if mask is None else np.asarray(mask)
+
+    @property
+    def trace_offsets(self):
+        return self._trace_offsets
+
+    def columnar(self):
+        """The catalog as the dictionary of `faults_to_catalog`, sharing the stored columns."""
+        columns = dict(self._columns)
+        trace, offsets = self._trace, self._trace_offsets
+        if TRACE_KEY in columns:
+            traces = [np.asarray(vertices if vertices is not None else [], dtype=float).reshape(-1, trace.shape[1])
+                      for vertices in columns.pop(TRACE_KEY)]
+            offsets = np.zeros(len(traces) + 1, dtype=np.int64)
+            np.cumsum([len(vertices) for vertices in traces], out=offsets[1:])
+            trace = np.concatenate(traces) if traces else trace[:0]
+        return {"names": np.array(self._names, dtype=str), "keys": list(self._keys), "columns": columns,
+                "present": self._present, "null": self._null, "integer": sorted(self._integer), "trace": trace,
+                "trace_offsets": offsets}
+
+    def to_dict(self):
+        """Converts the catalog to a plain fault dictionary."""
+        return {name: dict(self[name]) for name in self._names}
+
+    # Storage
+
+    def _has(self, i, key):
+        if key not in self._keys:
+            return False
+        mask = self._present.get(key)
+        return mask is None or bool(mask[i])
+
+    def _get(self, i, key):
+        if not self._has(i, key):
+            raise KeyError(key)
+        if key == TRACE_KEY and TRACE_KEY not in self._columns:
+            return self._trace[self._trace_offsets[i]:self._trace_offsets[i + 1]].tolist()
+        column = self._columns[key]
+        if column.dtype == object:
+            return column[i]
+        if key in self._null and self._null[key][i]:
+            return None
+        value = column[i].item()
+        if key in self._integer and math.isfinite(value):
+            return int(value)
+        return value
+
+    def _mask(self, key):
+        if key not in self._present:
+            self._present[key] = np.ones(len(self._names), dtype=bool)
+        elif not self._present[key].flags.writeable:
+            self._present[key] = np.array(self._present[key])
+        return self._present[key]
+
+    def _materialize_trace(self):
+        """Moves the ragged traces to an object column of vertex lists, so they can be replaced."""
+        if TRACE_KEY in self._columns or TRACE_KEY not in self._keys:
+            return
+        offsets = self._trace_offsets
+        column = np.empty(len(self._names), dtype=object)
+        column[:] = [self._trace[offsets[i]:offsets[i + 1]].tolist() for i in range(len(self._names))]
+        self._columns[TRACE_KEY] = column
+
+    def _set(self, i, key, value):
+        if key == TRACE_KEY:
+            self._materialize_trace()
+        if key not in self._keys:
+            self._keys.append(key)
+            self._present[key] = np.zeros(len(self._names), dtype=bool)
+            if isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_)):
+                self._columns[key] = np.zeros(len(self._names), dtype=np.int64)
+            elif isinstance(value, (float, np.floating)):
+                self._columns[key] = np.full(len(self._names), np.nan)
+            else:
+                self._columns[key] = np.full(len(self._names), None, dtype=object)
+
+        column = self._columns[key]
+        if column.dtype != object:
+            is_int = isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_))
+            if column.dtype.kind == 'i':
+                fits = is_int
+            elif column.dtype.kind == 'f':
+                fits = is_int if key in self._integer else isinstance(value, (float, np.floating))
+            else:
+                fits = False
+            if not fits:
+                # Mixed types are kept exactly in an object column
+                values = [self._get(j, key) if self._has(j, key) else None for j in range(len(self._names))]
+                column = np.empty(len(self._names), dtype=object)
+                column[:] = values
+                self._integer.discard(key)
+                self._null.pop(key, None)
+        if not column.flags.writeable:
+            column = np.array(column)
+        self._columns[key] = column
+        column[i] = value
+        if key in self._present:
+            self._mask(key)[i] = True
+        if key in self._null:
+            self._clear_null(i, key)
+
+    def _clear_null(self, i, key):
+        if not self._null[key].flags.writeable:
+            self._null[key] = np.array(self._null[key])
+        self._null[key][i] = False
+
+    def _delete(self, i, key):
+        if not self._has(i, key):
+            raise KeyError(key)
+        if key == TRACE_KEY:
+            self._materialize_trace()
+        self._mask(key)[i] = False
+        if self._columns[key].dtype == object:
+            self._columns[key][i] = None
+        if key in self._null:
+            self._clear_null(i, key)
+
+    def _append(self, name):
+        self._materialize_trace()
+        for key, column in self._columns.items():
+            blank = None if column.dtype == object else ('' if column.dtype.kind == 'U' else 0)
+            self._columns[key] = np.append(column, np.array([blank], dtype=column.dtype))
+        for key in self._keys:
+            self._present[key] = np.append(self._mask(key), False)
+        for key, null in self._null.items():
+            self._null[key] = np.append(null, False)
+        self._names.append(name)
+        self._index[name] = len(self._names) - 1
@@ -0,0 +1,422 @@
+# FQSHA - Fault-based Seismic Hazard Assessment Toolkit
+# Copyright (C) 2025 Tavakolizadeh et al., (2025)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# HazardPreview.py
+
+"""
+Classical PSHA preview of the fault sources, computed with NumPy in a few seconds.
+
+The faults are read as `export_faults_to_xml` writes them to OpenQuake (simple fault
+geometry, incremental MFD from the ``rates`` of `sactivityrate`, magnitude scaling
+relationship and rupture aspect ratio), ruptures float along strike and dip over a
+``mesh_spacing`` km mesh, and PGA exceedance curves are computed on the ``job.ini`` region
+grid with the AkkarBommer2010 and/or BooreAtkinson2008 GMPEs. It is meant for exploring
+settings before the OpenQuake run, not to replace it.
+"""
+
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+from ._lazy import lazy_import
+
+special = lazy_import('scipy.special')
+
+
+# Settings of the classical calculation written to job.ini by `generate_job_ini`
+PGA_LEVELS = (0.01, 0.02, 0.04, 0.06, 0.08, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.2, 1.4, 1.6, 1.8, 2.0)
+INVESTIGATION_TIME = 50
+TRUNCATION_LEVEL = 5
+MAXIMUM_DISTANCE = 300
+MAP_POES = (0.02, 0.1)
+
+# Rupture aspect ratio of the exported simpleFaultSource elements
+RUPTURE_ASPECT_RATIO = 2.0
+
+EARTH_RADIUS = 6371.0
+
+# Joyner-Boore distances (km) at which the GMPEs are evaluated, evenly spaced in log(1 + r / 1 km);
+# each rupture is counted at the nearest one (about 1.5% apart beyond a few km)
+DISTANCE_STEP = np.log1p(MAXIMUM_DISTANCE) / 400
+DISTANCE_GRID = np.expm1(DISTANCE_STEP * np.arange(401))
+
+
+# Ground-motion models (PGA only), as implemented in openquake.hazardlib
+
+def akkar_bommer_2010_pga(mag, rjb, rake, vs30):
+    """
+    Akkar and Bommer (2010) PGA, with the updated coefficients of Bommer et al. (2012).
+
+    Returns
+    -------
+    mean : ndarray
+        Natural logarithm of the median PGA (g), broadcast over `mag` and `rjb`.
+    sigma : float
+        Total standard deviation (natural logarithm).
+    """
+    b1, b2, b3, b4, b5, b6, b7, b8, b9, b10 = (1.43525, 0.74866, -0.06520, -2.72950, 0.25139, 7.74959,
+                                               0.08320, 0.00766, -0.05823, 0.07087)
+    fn, fr = float(-135 <= rake <= -45), float(45 <= rake <= 135)
+    ss, sa = float(vs30 < 360.0), float(360.0 <= vs30 <= 750.0)
+    log10_pga = (b1 + b2 * mag + b3 * mag ** 2 + (b4 + b5 * mag) * np.log10(np.sqrt(rjb ** 2 + b6 ** 2))
+                 + b7 * ss + b8 * sa + b9 * fn + b10 * fr)
+    # cm/s² to g
+    return np.log(10.0 ** (log10_pga - 2.0) / 9.80665), np.log(10.0) * 0.281646179
+
+
+def boore_atkinson_2008_pga(mag, rjb, rake, vs30):
+    """
+    Boore and Atkinson (2008) PGA, with the non-linear site amplification.
+
+    Returns
+    -------
+    mean : ndarray
+        Natural logarithm of the median PGA (g), broadcast over `mag` and `rjb`.
+    sigma : float
+        Total standard deviation (natural logarithm).
+    """
+    c1, c2, c3, h = -0.66050, 0.11970, -0.01151, 1.35
+    e2, e3, e4, e5, e6, e7, mh = -0.50350, -0.75472, -0.50970, 0.28805, -0.10164, 0.0, 6.75
+    blin, b1, b2 = -0.36, -0.64, -0.14
+
+    ns, rs = float(-150 < rake < -30), float(30 < rake < 150)
+    ss = float(abs(rake) <= 30.0 or 180.0 - abs(rake) <= 30.0)
+    mag = np.asarray(mag, dtype=float)
+    magnitude = np.where(mag <= mh, e5 * (mag - mh) + e6 * (mag - mh) ** 2, e7 * (mag - mh))
+    magnitude = magnitude + e2 * ss + e3 * ns + e4 * rs
+    r = np.sqrt(rjb ** 2 + h ** 2)
+    pga4nl = np.exp(magnitude + (c1 + c2 * (mag - 4.5)) * np.log(r) + c3 * (r - 1.0))
+
+    if vs30 <= 180.0:
+        bnl = b1
+    elif vs30 <= 300.0:
+        bnl = (b1 - b2) * np.log(vs30 / 300.0) / np.log(180.0 / 300.0) + b2
+    elif vs30 < 760.0:
+        bnl = b2 * np.log(vs30 / 760.0) / np.log(300.0 / 760.0)
+    else:
+        bnl = 0.0
+    a1, a2, pga_low = 0.03, 0.09, 0.06
+    dx = np.log(a2 / a1)
+    dy = bnl * np.log(a2 / pga_low)
+    c = (3 * dy - bnl * dx) / dx ** 2
+    d = -(2 * dy - bnl * dx) / dx ** 3
+    x = np.log(np.clip(pga4nl, a1, a2) / a1)
+    nonlinear = np.where(pga4nl > a2, bnl * np.log(pga4nl / 0.1),
+                         bnl * np.log(pga_low / 0.1) + c * x ** 2 + d * x ** 3)
+    return np.log(pga4nl) + blin * np.log(vs30 / 760.0) + nonlinear, 0.564
+
+
+PREVIEW_GMPES = {
+    "AkkarBommer2010": akkar_bommer_2010_pga,
+    "BooreAtkinson2008": boore_atkinson_2008_pga,
+}
+
+
+# Magnitude scaling relationships (median rupture area in km²)
+
+def wc1994_area(mag, rake):
+    """Wells and Coppersmith (1994) median rupture area, by rake as in OpenQuake."""
+    if rake is None:
+        return 10.0 ** (-3.49 + 0.91 * mag)
+    if -45 <= rake <= 45 or rake >= 135 or rake <= -135:
+        return 10.0 ** (-3.42 + 0.90 * mag)
+    if rake > 0:
+        return 10.0 ** (-3.99 + 0.98 * mag)
+    return 10.0 ** (-2.87 + 0.82 * mag)
+
+
+def peer_area(mag, rake):
+    """PEER test magnitude-area relationship."""
+    return 10.0 ** (mag - 4.0)
+
+
+MAG_SCALE_AREAS = {"WC1994": wc1994_area, "PeerMSR": peer_area}
+
+
+# Sources and sites
+
+def fault_mfd(fault_info):
+    """
+    Magnitudes and annual rates of the incremental MFD written for a fault by
+    `export_faults_to_xml` (``minMag`` = rates_Mmin or Mmin, ``binWidth`` = bin, ``occurRates`` = rates).
+    """
+    rates = np.asarray(fault_info.get("rates", []), dtype=float)
+    bin_width = fault_info.get("bin", 0.1)
+    min_mag = fault_info.get("rates_Mmin", fault_info.get("Mmin"))
+    mags = float(min_mag) + bin_width * np.arange(len(rates))
+    return mags, rates
+
+
+def _project(lons, lats, lon0, lat0):
+    """Equirectangular projection (km) around (lon0, lat0)."""
+    x = EARTH_RADIUS * np.radians(np.asarray(lons, dtype=float) - lon0) * np.cos(np.radians(lat0))
+    y = EARTH_RADIUS * np.radians(np.asarray(lats, dtype=float) - lat0)
+    return x, y
+
+
+def region_grid(min_lat, max_lat, min_lon, max_lon, spacing):
+    """Longitudes and latitudes of the sites of a region, `spacing` km apart."""
+    lat_step = np.degrees(spacing / EARTH_RADIUS)
+    lon_step = lat_step / np.cos(np.radians(0.5 * (min_lat + max_lat)))
+    lats = np.arange(min_lat, max_lat + 0.5 * lat_step, lat_step)
+    lons = np.arange(min_lon, max_lon + 0.5 * lon_step, lon_step)
+    lons, lats = np.meshgrid(lons, lats)
+    return lons.ravel(), lats.ravel()
+
+
+def fault_surface(fault_info, lon0, lat0, mesh_spacing=1.0):
+    """
+    Nodes of the simple fault surface projected to the ground, in km around (lon0, lat0).
+
+    The trace is resampled every `mesh_spacing` km and translated down dip, perpendicular to
+    the direction from its first to its last vertex, as OpenQuake builds a simple fault surface.
+
+    Returns
+    -------
+    nodes : ndarray
+        Shape (nstrike, ndip, 2).
+    length, width : float
+        Fault length along the trace and width down dip (km).
+    """
+    trace = np.asarray(fault_info["fault_trace"], dtype=float)
+    x, y = _project(trace[:, 0], trace[:, 1], lon0, lat0)
+    along = np.concatenate(([0.0], np.cumsum(np.hypot(np.diff(x), np.diff(y)))))
+    length = along[-1]
+    nstrike = max(int(round(length / mesh_spacing)), 1) + 1
+    s = np.linspace(0.0, length, nstrike)
+    points = np.stack([np.interp(s, along, x), np.interp(s, along, y)], axis=-1)
+
+    dip = np.radians(float(fault_info["Dip"]))
+    upper, lower = float(fault_info["upperSeismoDepth"]), float(fault_info["lowerSeismoDepth"])
+    width = (lower - upper) / np.sin(dip)
+    ndip = max(int(round(width / mesh_spacing)), 1) + 1
+    # The trace is at the ground surface, the top edge at the upper seismogenic depth
+    strike = np.arctan2(x[-1] - x[0], y[-1] - y[0])
+    dip_direction = np.array([np.cos(strike), -np.sin(strike)])
+    offsets = np.linspace(upper / np.tan(dip), lower / np.tan(dip), ndip)
+    nodes = points[:, None, :] + offsets[None, :, None] * dip_direction
+    return nodes, length, width
+
+
+def _window_min(values, width):
+    """Minimum of every `width` consecutive entries of `values` along its first axis."""
+    n = len(values)
+    span = 1
+    while 2 * span <= width:
+        values = np.minimum(values[:-span], values[span:])
+        span *= 2
+    return np.minimum(values[:n - width + 1], values[width - span:])
+
+
+def _poe_table(gmpe, mags, rake, vs30, levels, truncation_level):
+    """Probabilities of exceeding `levels`, shape (nmag, len(DISTANCE_GRID), nlevel)."""
+    mean, sigma = gmpe(mags[:, None], DISTANCE_GRID[None, :], rake, vs30)
+    z = (np.log(levels) - mean[..., None]) / sigma
+    if truncation_level is None:
+        return special.ndtr(-z)
+    t = truncation_level
+    return np.clip((special.ndtr(t) - special.ndtr(z)) / (special.ndtr(t) - special.ndtr(-t)), 0.0, 1.0)
+
+
+def _distance_weights(rjb, weight):
+    """
+    Sums the rate `weight` of the ruptures at the nearest `DISTANCE_GRID` distance, per site
+    (last axis of `rjb`). Ruptures beyond `MAXIMUM_DISTANCE` are left out.
+    Returns shape (nsite, len(DISTANCE_GRID)).
+    """
+    nsite, ngrid = rjb.shape[-1], len(DISTANCE_GRID)
+    index = np.minimum(np.rint(np.log1p(rjb) / DISTANCE_STEP), ngrid).astype(np.intp)
+    index += (ngrid + 1) * np.arange(nsite)
+    weights = np.bincount(index.ravel(order='K'), minlength=nsite * (ngrid + 1)) * weight
+    return weights.reshape(nsite, ngrid + 1)[:, :ngrid]
+
+
+def fault_exceedance_rates(fault_info, lons, lats, gmpes, vs30=800.0, levels=PGA_LEVELS,
+                           mesh_spacing=1.0, truncation_level=TRUNCATION_LEVEL, block_size=2 ** 22):
+    """
+    Annual rates of exceeding `levels` at the sites from the ruptures of one fault.
+
+    Parameters
+    ----------
+    fault_info : dict
+        Fault parameters after `sactivityrate` (``rates``, ``Mmin``, ``mag_scale`` ...).
+    lons, lats : ndarray
+        Site coordinates.
+    gmpes : list of str
+        Names from `PREVIEW_GMPES`.
+    block_size : int, optional
+        Maximum number of site-node distances held at once.
+
+    Returns
+    -------
+    ndarray
+        Shape (len(gmpes), nsite, nlevel).
+    """
+    levels = np.asarray(levels, dtype=float)
+    result = np.zeros((len(gmpes), len(lons), len(levels)))
+    mags, rates = fault_mfd(fault_info)
+    mags, rates = mags[rates > 0], rates[rates > 0]
+    if rates.size == 0 or len(lons) == 0:
+        return result
+
+    trace = np.asarray(fault_info["fault_trace"], dtype=float)
+    lon0, lat0 = trace[:, 0].mean(), trace[:, 1].mean()
+    mesh_spacing = float(mesh_spacing)
+    nodes, length, width = fault_surface(fault_info, lon0, lat0, mesh_spacing)
+    nstrike, ndip = nodes.shape[:2]
+    rake = float(fault_info["fault_rake"])
+    area = MAG_SCALE_AREAS.get(fault_info.get("mag_scale"), wc1994_area)
+
+    # Rupture size in mesh nodes, as OpenQuake floats ruptures on a simple fault
+    sizes = []
+    for mag in mags:
+        rupture_area = area(mag, rake)
+        rupture_length = np.sqrt(rupture_area * RUPTURE_ASPECT_RATIO)
+        rupture_width = rupture_area / rupture_length
+        if rupture_width > width:
+            rupture_width = width
+            rupture_length = rupture_area / rupture_width
+        rupture_length = min(rupture_length, length)
+        sizes.append((min(int(round(rupture_length / mesh_spacing)) + 1, nstrike),
+                      min(int(round(rupture_width / mesh_spacing)) + 1, ndip)))
+
+    tables = [_poe_table(PREVIEW_GMPES[name], mags, rake, vs30, levels, truncation_level) for name in gmpes]
+
+    x, y = _project(lons, lats, lon0, lat0)
+    extent = np.hypot(*(nodes.reshape(-1, 2).max(axis=0) - nodes.reshape(-1, 2).min(axis=0)))
+    near = np.flatnonzero(np.hypot(x, y) <= MAXIMUM_DISTANCE + extent)
+    nodes = nodes.astype(np.float32)
+    x, y = x.astype(np.float32), y.astype(np.float32)
+    step = max(block_size // (nstrike * ndip), 1)
+    for start in range(0, len(near), step):
+        block = near[start:start + step]
+        # Sites on the last axis, so the window minima run over contiguous rows
+        distances = np.hypot(nodes[:, :, None, 0] - x[block], nodes[:, :, None, 1] - y[block]).transpose(1, 0, 2)
+        along_dip = {}
+        weights = np.empty((len(block), len(mags), len(DISTANCE_GRID)))
+        for k, (rupture_strike, rupture_dip) in enumerate(sizes):
+            if rupture_dip not in along_dip:
+                along_dip[rupture_dip] = _window_min(distances, rupture_dip).transpose(1, 0, 2)
+            rjb = _window_min(along_dip[rupture_dip], rupture_strike)
+            # The rate of a magnitude is shared by its rupture positions
+            weights[:, k] = _distance_weights(rjb, rates[k] / rjb[..., 0].size)
+        weights = weights.reshape(len(block), -1)
+        for g, table in enumerate(tables):
+            result[g, block] = weights @ table.reshape(-1, len(levels))
+    return result
+
+
+def hazard_curves(faults, lons, lats, gmpes=None, vs30=800.0, levels=PGA_LEVELS,
+                  investigation_time=INVESTIGATION_TIME, mesh_spacing=1.0,
+                  truncation_level=TRUNCATION_LEVEL, progress=None):
+    """
+    Mean probabilities of exceeding `levels` in `investigation_time` years at the sites.
+
+    Parameters
+    ----------
+    faults : dict or iterable
+        Fault parameters after `sactivityrate`, keyed by fault name, or (fault name,
+        parameters) pairs (as for `export_faults_to_xml`).
+    lons, lats : array_like
+        Site coordinates.
+    gmpes : dict, optional
+        GMPE weights, e.g. ``{"AkkarBommer2010": 1.0}``. Models missing from `PREVIEW_GMPES`
+        are left out; AkkarBommer2010 is used when none is available.
+    progress : callable, optional
+        Called as ``progress(done, total)`` after each fault (`total` is None for an iterable).
+
+    Returns
+    -------
+    ndarray
+        Shape (nsite, nlevel). The curves of the GMPEs are averaged with their weights, as
+        OpenQuake computes the mean hazard curves.
+    """
+    gmpes = dict(gmpes or {})
+    weights = {name: float(weight) for name, weight in gmpes.items() if name in PREVIEW_GMPES}
+    skipped = sorted(set(gmpes) - set(weights))
+    if skipped:
+        print(f"⚠️ Not available in the hazard preview: {', '.join(skipped)}")
+    if not weights or sum(weights.values()) <= 0:
+        print("⚠️ Hazard preview uses AkkarBommer2010")
+        weights = {"AkkarBommer2010": 1.0}
+    names = list(weights)
+
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    rates = np.zeros((len(names), len(lons), len(levels)))
+    total = len(faults) if isinstance(faults, Mapping) else None
+    done = 0
+    for fault_name, fault_info in (faults.items() if isinstance(faults, Mapping) else faults):
+        if "rates" in fault_info and "fault_trace" in fault_info:
+            rates += fault_exceedance_rates(fault_info, lons, lats, names, vs30=vs30, levels=levels,
+                                            mesh_spacing=mesh_spacing, truncation_level=truncation_level)
+        done += 1
+        if progress is not None:
+            progress(done, total)
+
+    poes = 1.0 - np.exp(-rates * investigation_time)
+    weight = np.array([weights[name] for name in names]) / sum(weights.values())
+    return np.tensordot(weight, poes, axes=1)
+
+
+def hazard_map(poes, levels=PGA_LEVELS, map_poes=MAP_POES):
+    """
+    PGA with the probabilities of exceedance `map_poes`, interpolated on the hazard curves in
+    log-log space as OpenQuake does. Sites whose curve stays below a probability get 0.
+
+    Returns
+    -------
+    ndarray
+        Shape (nsite, len(map_poes)).
+    """
+    poes = np.asarray(poes, dtype=float)
+    log_levels = np.log(np.asarray(levels, dtype=float))
+    nlevel = len(log_levels)
+    with np.errstate(divide='ignore'):
+        log_poes = np.log(poes)
+    rows = np.arange(len(poes))
+    result = np.zeros((len(poes), len(map_poes)))
+    for j, poe in enumerate(map_poes):
+        count = (poes >= poe).sum(axis=1)
+        k = np.clip(count - 1, 0, nlevel - 2)
+        lower, upper = log_poes[rows, k], log_poes[rows, k + 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.nan_to_num(np.clip((np.log(poe) - lower) / (upper - lower), 0.0, 1.0))
+        values = np.exp(log_levels[k] + t * (log_levels[k + 1] - log_levels[k]))
+        values[count == 0] = 0.0
+        values[count == nlevel] = np.exp(log_levels[-1])
+        result[:, j] = values
+    return result
+
+
+def write_hazard_preview(output_directory, lons, lats, poes, levels=PGA_LEVELS, map_poes=MAP_POES):
+    """
+    Writes ``hazard_curve-preview.csv`` and ``hazard_map-preview.csv`` (read by
+    `Mapping.create_contour_map_with_faults`). Returns the path of the hazard map.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    curves_file = os.path.join(output_directory, "hazard_curve-preview.csv")
+    header = "lon,lat," + ",".join(f"poe-{level}" for level in levels)
+    np.savetxt(curves_file, np.column_stack([lons, lats, poes]), delimiter=',', header=header,
+               comments='', fmt='%.5f,%.5f' + ',%.6e' * len(levels))
+
+    map_file = os.path.join(output_directory, "hazard_map-preview.csv")
+    header = "lon,lat," + ",".join(f"PGA-{poe}" for poe in map_poes)
+    np.savetxt(map_file, np.column_stack([lons, lats, hazard_map(poes, levels, map_poes)]), delimiter=',',
+               header=header, comments='', fmt='%.5f,%.5f' + ',%.6e' * len(map_poes))
+    print(f"Hazard preview saved to {map_file}")
+    return map_file
@@ -17,12 +17,14 @@
 # Copyright (C) 2025 Tavakolizadeh et al., (2025)
 # License: GNU Affero General Public License v3.0+
 
-import pandas as pd
-import pygmt
 import json
 import os
 import glob
 import re
+from ._lazy import lazy_import
+
+pd = lazy_import('pandas')
+pygmt = lazy_import('pygmt')
 
 def get_largest_hazard_map_csv(directory):
     """Finds the hazard_map-mean_*.csv file with the largest numeric suffix."""
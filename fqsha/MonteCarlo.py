@@ -0,0 +1,287 @@
+# FQSHA - Fault-based Seismic Hazard Assessment Toolkit
+# Copyright (C) 2025 Tavakolizadeh et al., (2025)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# MonteCarlo.py
+
+"""
+Monte Carlo sampling of the epistemic uncertainty of the fault parameters.
+
+The deterministic moment budget is computed once, then every fault gets `nsample` samples of
+(slip rate, Mmax, CV, b-value), from which the moment rate, the activity rates and the BPT
+and Poisson probabilities of each sample follow in vectorized form. Faults are processed in
+batches, each with its own child of one `numpy.random.SeedSequence`, so the percentile bands
+only depend on the seed, not on the number of worker processes.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .FQSHA_Functions import characteristic_gaussian_rates, truncated_gr_rates
+from .FaultCatalog import field_array, normalize_faults
+from .SeismicActivityRate import momentbudget_arrays, _recurrence_time, _bpt_probability, _poisson_probability
+
+
+# Percentiles of the returned bands
+PERCENTILES = (5, 16, 50, 84, 95)
+
+# Faults sampled together in one batch (one task of the process pool)
+BATCH_SIZE = 64
+
+# Standard deviation of the sampled b-values
+B_VALUE_SD = 0.1
+
+# Upper end of the default magnitude grid of the cumulative rates
+MAX_MAGNITUDE = 9.0
+
+# Per-fault parameters passed to the sampling batches
+SAMPLED_PARAMETERS = ("SRmin", "SRmax", "Mmax", "sdMmax", "V", "ShearModulus", "L_forTmean", "Width", "SCC",
+                      "Telap", "Mmin", "b-value")
+
+
+def draw_samples(params, nsample, rng, b_sd=B_VALUE_SD):
+    """
+    Draws `nsample` parameter sets per fault.
+
+    Parameters
+    ----------
+    params : dict
+        Arrays of `SAMPLED_PARAMETERS`, one value per fault (slip rates in mm/yr, lengths in m,
+        ShearModulus in Pa), as prepared by `monte_carlo`.
+    nsample : int
+        Number of samples per fault.
+    rng : numpy.random.Generator
+        Random generator.
+    b_sd : float, optional
+        Standard deviation of the normal b-value distribution.
+
+    Returns
+    -------
+    dict
+        (nfault, nsample) arrays: ``SlipRate`` (mm/yr, uniform between SRmin and SRmax),
+        ``Mmax`` (normal around the moment-budget Mmax with deviation sdMmax), ``b-value``,
+        and the derived ``MomentRate``, ``Tmean`` and ``CV``.
+
+    Notes
+    -----
+    - Tmean and CV follow the moment budget (Field, 1999) for the sampled slip rate and
+      magnitude, so CV = sqrt((c ln10 sdMmax)**2 + (dV / V)**2), without the rounding of Tmean.
+    """
+    d = 9.1;  c = 1.5
+    shape = (len(params["Mmax"]), nsample)
+    column = {key: np.asarray(params[key], dtype=float)[:, None] for key in SAMPLED_PARAMETERS}
+
+    slip = column["SRmin"] + (column["SRmax"] - column["SRmin"]) * rng.random(shape)
+    Mmax = column["Mmax"] + column["sdMmax"] * rng.standard_normal(shape)
+    b = column["b-value"] + b_sd * rng.standard_normal(shape)
+
+    V = slip / 1000
+    dV = column["V"] - column["SRmin"] / 1000
+    MomentRate = column["ShearModulus"] * V * column["L_forTmean"] * column["Width"] * column["SCC"]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Tmean = 10 ** (c * Mmax + d) / MomentRate
+        CV = np.sqrt((c * np.log(10) * column["sdMmax"]) ** 2 + (dV / V) ** 2)
+    return {"SlipRate": slip, "Mmax": Mmax, "b-value": b, "MomentRate": MomentRate, "Tmean": Tmean, "CV": CV}
+
+
+def sample_rates(params, samples, Fault_behaviour, w, bin, magnitudes, bpt=False):
+    """
+    Computes the activity rates and probabilities of every sample.
+
+    Parameters
+    ----------
+    params : dict
+        Per-fault parameters, as in `draw_samples`.
+    samples : dict
+        (nfault, nsample) arrays from `draw_samples`.
+    Fault_behaviour : str
+        'Characteristic Gaussian' or 'Truncated Gutenberg Richter', the model of the rates.
+    w : float
+        Time window (years) of the probabilities.
+    bin : float
+        Magnitude bin size.
+    magnitudes : ndarray
+        Magnitudes at which the cumulative rates are evaluated, `bin` apart.
+    bpt : bool, optional
+        Characteristic Gaussian rates balanced on the BPT-equivalent moment rate
+        Mo / Tfict (`CHGaussBPT`) instead of the moment rate (`CHGaussPoiss`).
+
+    Returns
+    -------
+    dict
+        (nfault, nsample) arrays ``Tm``, ``Hbpt`` and ``Hpois``, as in `sactivityrate_arrays`,
+        and ``rates`` with shape (nfault, nsample, len(magnitudes)): the annual rate of
+        earthquakes of magnitude >= each of `magnitudes`.
+
+    Notes
+    -----
+    - Truncated GR samples whose Mmax falls below Mmin are truncated at Mmin: the whole
+      moment rate of the sample is released in the Mmin bin.
+    """
+    nfault, nsample = samples["Mmax"].shape
+    Mmax = samples["Mmax"].ravel()
+    MomentRate = samples["MomentRate"].ravel()
+    sdMmax = np.repeat(np.asarray(params["sdMmax"], dtype=float), nsample)
+
+    kernel = characteristic_gaussian_rates(Mmax, sdMmax, bin)
+    Tm = _recurrence_time(Mmax, sdMmax, MomentRate, bin, kernel=kernel)
+    Telap = np.repeat(np.asarray(params["Telap"], dtype=float), nsample)
+    Telap = np.where(Telap > 10 * Tm, 10 * Tm, Telap)
+    Hbpt = _bpt_probability(Tm, Telap, samples["CV"].ravel(), w)
+    Hpois = _poisson_probability(Tm, w)
+
+    if Fault_behaviour == "Truncated Gutenberg Richter":
+        mts = np.repeat(np.asarray(params["Mmin"], dtype=float), nsample)
+        # A sampled Mmax below Mmin would leave an empty magnitude range: its moment goes to the Mmin bin
+        magnitude_range, offsets, rates = truncated_gr_rates(mts, np.maximum(Mmax, mts), MomentRate,
+                                                             samples["b-value"].ravel(), bin)
+        segment = np.repeat(np.arange(len(mts)), np.diff(offsets))
+    elif Fault_behaviour == "Characteristic Gaussian":
+        if bpt:
+            # Mean recurrence time giving the BPT probability in a Poisson model (Pace et al., 2006)
+            with np.errstate(divide='ignore'):
+                Tfict = (-1 * w) / np.log(1 - Hbpt)
+            MomentRate = samples["Tmean"].ravel() * MomentRate / Tfict
+        magnitude_range, offsets, unit_rates = kernel
+        segment = np.repeat(np.arange(len(Mmax)), np.diff(offsets))
+        rates = unit_rates * MomentRate[segment]
+    else:
+        raise ValueError(f"Unknown fault behaviour: {Fault_behaviour}")
+
+    # Incremental rates binned on the magnitude grid, then summed from the largest magnitude
+    nmag = len(magnitudes)
+    index = np.floor((magnitude_range - magnitudes[0]) / bin + 1e-6).astype(int)
+    keep = index >= 0
+    flat = segment[keep] * nmag + np.minimum(index[keep], nmag - 1)
+    binned = np.bincount(flat, weights=rates[keep], minlength=nfault * nsample * nmag)
+    cumulative = np.cumsum(binned.reshape(nfault * nsample, nmag)[:, ::-1], axis=1)[:, ::-1]
+
+    shape = (nfault, nsample)
+    return {"Tm": Tm.reshape(shape), "Hbpt": Hbpt.reshape(shape), "Hpois": Hpois.reshape(shape),
+            "rates": cumulative.reshape(nfault, nsample, nmag)}
+
+
+def _batch_bands(task):
+    """Samples one batch of faults and reduces it to percentile bands (process pool worker)."""
+    params, seed, options = task
+    rng = np.random.default_rng(seed)
+    samples = draw_samples(params, options["nsample"], rng, options["b_sd"])
+    results = sample_rates(params, samples, options["Fault_behaviour"], options["w"], options["bin"],
+                           options["magnitudes"], options["bpt"])
+    samples.update(results)
+    percentiles = options["percentiles"]
+    bands = {}
+    for key, values in samples.items():
+        band = np.percentile(values, percentiles, axis=1)
+        # Percentile axis last: (nfault, npercentile) or (nfault, nmag, npercentile)
+        bands[key] = np.moveaxis(band, 0, -1)
+    return bands
+
+
+def monte_carlo(faults, nsample=1000, Fault_behaviour="Characteristic Gaussian", w=50, bin=0.1,
+                Zeta=0.5, Khi=0.2, Siggma=0.3, b_sd=B_VALUE_SD, percentiles=PERCENTILES, magnitudes=None,
+                seed=None, batch_size=BATCH_SIZE, max_workers=None):
+    """
+    Percentile bands of the moment rate, activity rates and probabilities of every fault
+    under the uncertainty of its parameters.
+
+    Parameters
+    ----------
+    faults : dict or FaultCatalog
+        Fault catalog (JSON input schema). It is not modified.
+    nsample : int, optional
+        Number of samples per fault.
+    Fault_behaviour : str, optional
+        'Characteristic Gaussian' or 'Truncated Gutenberg Richter', the model of the rates.
+    w : float, optional
+        Time window (years) of the BPT and Poisson probabilities.
+    bin : float, optional
+        Magnitude bin size.
+    Zeta, Khi, Siggma : float, optional
+        Moment budget settings (see `momentbudget`).
+    b_sd : float, optional
+        Standard deviation of the sampled b-values.
+    percentiles : sequence of float, optional
+        Percentiles of the returned bands.
+    magnitudes : array_like, optional
+        Magnitudes of the cumulative rates, `bin` apart. Defaults to the smallest Mmin of the
+        catalog up to `MAX_MAGNITUDE`.
+    seed : int or numpy.random.SeedSequence, optional
+        Root seed. Each batch of `batch_size` faults draws from its own spawned child, so the
+        result is reproducible whatever `max_workers`.
+    batch_size : int, optional
+        Number of faults sampled together. Memory grows with ``batch_size * nsample``.
+    max_workers : int, optional
+        Number of worker processes, `os.cpu_count()` by default. With 0 the batches are run
+        one after the other in the calling process.
+
+    Returns
+    -------
+    dict
+        ``names``, ``percentiles``, ``magnitudes``, ``nsample``, ``seed`` (the root entropy),
+        the (nfault, npercentile) bands ``SlipRate``, ``Mmax``, ``b-value``, ``MomentRate``,
+        ``Tmean``, ``CV``, ``Tm``, ``Hbpt`` and ``Hpois``, and ``rates`` with shape
+        (nfault, len(magnitudes), npercentile), the cumulative annual rates.
+
+    Notes
+    -----
+    - The moment budget is computed once with `momentbudget_arrays`; invalid faults are
+      reported and left out, as in `momentbudget`.
+    - As in `sactivityrate`, the characteristic Gaussian rates follow the BPT model when the
+      last fault has an elapsed time, and the Poisson model otherwise.
+    - Mmax is sampled around the budget Mmax with deviation sdMmax (the spread of the
+      scaling relationships and Mobs), and the slip rate uniformly between SRmin and SRmax.
+      SCC and the geometry are kept at their input values.
+    """
+    columns, errors = normalize_faults(faults)
+    for fault_name, message in zip(errors['name'], errors['message']):
+        print(f"[{fault_name}] {message}")
+    budget = momentbudget_arrays(columns, Zeta, Khi, Siggma)
+
+    position = {name: i for i, name in enumerate(faults.keys())}
+    valid = np.array([position[name] for name in columns['name']], dtype=int)
+    params = {key: columns[key] for key in ("SRmin", "SRmax", "ShearModulus", "SCC")}
+    params.update({key: budget[key] for key in ("Mmax", "sdMmax", "V", "L_forTmean", "Width", "Telap")})
+    params["Mmin"] = field_array(faults, 'Mmin')[valid]
+    params["b-value"] = field_array(faults, 'b-value')[valid]
+
+    if magnitudes is None:
+        start = np.nanmin(params["Mmin"]) if np.isfinite(params["Mmin"]).any() else 5.0
+        magnitudes = np.round(np.arange(start, MAX_MAGNITUDE + bin / 2, bin), 10)
+    magnitudes = np.asarray(magnitudes, dtype=float)
+
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    nfault = len(valid)
+    starts = range(0, nfault, batch_size)
+    options = {"nsample": nsample, "b_sd": b_sd, "Fault_behaviour": Fault_behaviour, "w": w, "bin": bin,
+               "magnitudes": magnitudes, "percentiles": np.asarray(percentiles, dtype=float),
+               "bpt": bool(nfault and params["Telap"][-1])}
+    tasks = ((({key: values[start:start + batch_size] for key, values in params.items()}), child, options)
+             for start, child in zip(starts, root.spawn(len(starts))))
+
+    if max_workers == 0:
+        batches = [_batch_bands(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as executor:
+            batches = list(executor.map(_batch_bands, tasks))
+
+    result = {"names": np.array(columns['name']), "percentiles": options["percentiles"],
+              "magnitudes": magnitudes, "nsample": nsample, "seed": root.entropy}
+    keys = batches[0].keys() if batches else ()
+    for key in keys:
+        result[key] = np.concatenate([batch[key] for batch in batches])
+    return result
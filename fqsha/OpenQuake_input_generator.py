@@ -189,14 +189,20 @@ def gmpe_generate_xml(inputs, output_directory):
     print(f"✅ GMPE logic tree written with {len(selected_models)} model(s) to: {output_directory}/gmpe_logic_tree.xml")
 
 
-def source_model_logic_tree(faults, output_directory):
+def source_model_logic_tree(faults, output_directory, source_files=None):
     """
     Generates an OpenQuake source model logic tree XML file, including all fault names in the 'uncertaintyModel' section.
 
     Args:
         faults (dict): Dictionary of faults where keys are fault names.
         output_directory (str): Directory where the XML file should be saved.
+        source_files (list, optional): Source model files to list instead of the per-fault
+            ./Sources/<fault>.xml files, e.g. ['./Sources/source_model.xml'] for the single
+            file written by `export_source_model`.
     """
+    if source_files is None:
+        source_files = [f'./Sources/{fault_name}.xml' for fault_name in faults.keys()]
+
     # Start building the XML content
     xml_source_model = '''<?xml version="1.0" encoding="UTF-8"?>
 <nrml xmlns:gml="http://www.opengis.net/gml"
@@ -207,9 +213,9 @@ def source_model_logic_tree(faults, output_directory):
       <logicTreeBranch branchID="b1">
         <uncertaintyModel>\n'''
 
-    # Add the fault names from the dictionary into the 'uncertaintyModel' section
-    for fault_name in faults.keys():
-        xml_source_model += f'./Sources/{fault_name}.xml\n'
+    # Add the source model files into the 'uncertaintyModel' section
+    for source_file in source_files:
+        xml_source_model += f'{source_file}\n'
 
     # Close the uncertainty model and the rest of the XML
     xml_source_model += '''        </uncertaintyModel>
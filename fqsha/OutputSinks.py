@@ -0,0 +1,297 @@
+# FQSHA - Fault-based Seismic Hazard Assessment Toolkit
+# Copyright (C) 2025 Tavakolizadeh et al., (2025)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# OutputSinks.py
+
+"""
+Writers of the activity-rate and probability tables of `TruncatedGR`, `CHGaussPoiss` and
+`CHGaussBPT`.
+
+Each table is handed over as whole arrays: the rates of all faults as one flat array with
+the offsets of each fault (as returned by `truncated_gr_rates` and
+`characteristic_gaussian_rates`), so a sink writes it in one go. `TextSink` keeps the
+historical comma-separated ``.txt`` layout; `NpzSink`, `ParquetSink` and `Hdf5Sink` store
+the same columns for downstream tools:
+
+    id, Mmin, bin, offsets, rates, name            (rate tables)
+    id, Mmin, window, probability, name            (probability tables)
+
+Parquet needs pyarrow and HDF5 needs h5py; they are only imported when used.
+"""
+
+import importlib.util
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+from ._lazy import lazy_import
+
+pa = lazy_import('pyarrow')
+pq = lazy_import('pyarrow.parquet')
+h5py = lazy_import('h5py')
+
+
+# Folder of the tables and rate figures when no output root is given, relative to the working directory
+OUTPUT_ROOT = 'output_files'
+
+
+class OutputSink(ABC):
+    """
+    Base class of the table writers. Tables are written to ``<root>/<name><extension>``.
+
+    A table written again by the same sink is appended to, so the chunks of a streamed
+    catalog (`Pipeline.iter_seismic_activity`) end up in one table per model. Use one sink
+    per run, and `close` it (or use it as a context manager) once all tables are written.
+
+    Parameters
+    ----------
+    root : str, optional
+        Output folder, created when the first table is written. Defaults to `OUTPUT_ROOT`.
+    """
+
+    extension = ''
+
+    def __init__(self, root=None):
+        self.root = root or OUTPUT_ROOT
+        self._written = set()
+
+    def path(self, name):
+        """Path of table `name`, creating its folder."""
+        path = os.path.join(self.root, name + self.extension)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        return path
+
+    def _open(self, name):
+        """Path of table `name`, and whether this sink already wrote it (so the rows are appended)."""
+        path = self.path(name)
+        append = path in self._written
+        self._written.add(path)
+        return path, append
+
+    def close(self):
+        """Finalizes the written tables. Only `ParquetSink` keeps files open."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @abstractmethod
+    def write_rates(self, name, ids, Mmin, bin, offsets, rates, names, delimiter=', ', name_column=True):
+        """
+        Writes (or appends) the incremental rates of all faults.
+
+        Parameters
+        ----------
+        name : str
+            Table name, without extension.
+        ids, Mmin : array_like
+            Fault id and magnitude of the first rate, for each fault.
+        bin : float
+            Magnitude bin width.
+        offsets : ndarray of int
+            Start of each fault in `rates`, plus the total length.
+        rates : ndarray
+            Annual rates of all faults, from Mmin in steps of `bin`.
+        names : list of str
+            Fault names.
+        delimiter, name_column : optional
+            Layout of the text table only: separator of the rates and whether each row ends
+            with the fault name (the truncated GR table uses ' ' and no name).
+
+        Returns
+        -------
+        str
+            Path of the written table.
+        """
+
+    @abstractmethod
+    def write_probabilities(self, name, ids, Mmin, window, probabilities, names):
+        """
+        Writes (or appends) the probability of an event in the next `window` years for all
+        faults, with the same arguments as `write_rates`. Returns the path of the table.
+        """
+
+
+class TextSink(OutputSink):
+    """Comma-separated text tables, the format of the original FaultQuake outputs."""
+
+    extension = '.txt'
+
+    def _write_lines(self, name, header, lines):
+        path, append = self._open(name)
+        with open(path, 'a' if append else 'w') as fidout:
+            if not append:
+                fidout.write(header)
+            fidout.write(''.join(lines))
+        return path
+
+    def write_rates(self, name, ids, Mmin, bin, offsets, rates, names, delimiter=', ', name_column=True):
+        # Formatting the Python floats of the whole table at once is much faster than NumPy scalars
+        formatted = ['%5.4e' % rate for rate in np.asarray(rates, dtype=float).tolist()]
+        lines = []
+        for i in range(len(offsets) - 1):
+            row = f"{ids[i]}, {Mmin[i]:3.1f}, {bin:3.1f}, {delimiter.join(formatted[offsets[i]:offsets[i + 1]])}"
+            lines.append(f"{row}, {names[i]}\n" if name_column else f"{row}\n")
+        return self._write_lines(name, 'id Mmin bin rates name\n', lines)
+
+    def write_probabilities(self, name, ids, Mmin, window, probabilities, names):
+        lines = [f"{ids[i]}, {Mmin[i]:3.1f}, {window}, {probabilities[i]:5.3e}, {names[i]}\n"
+                 for i in range(len(names))]
+        return self._write_lines(name, 'id Mmin window Probability name\n', lines)
+
+
+class NpzSink(OutputSink):
+    """
+    NumPy ``.npz`` archives, one array per column (`numpy.load` reads them back).
+
+    An archive cannot be extended in place: appending rewrites it, so prefer `Hdf5Sink`
+    or `ParquetSink` for large streamed catalogs.
+    """
+
+    extension = '.npz'
+
+    def _save(self, name, columns, ragged=None):
+        """Saves `columns`, concatenated to the archive already written; `ragged` names the offsets column."""
+        path, append = self._open(name)
+        if append:
+            with np.load(path) as previous:
+                for key, value in columns.items():
+                    if np.ndim(value) == 0:
+                        continue
+                    if key == ragged:
+                        value = np.concatenate((previous[key][:-1], value + previous[key][-1]))
+                    else:
+                        value = np.concatenate((previous[key], value))
+                    columns[key] = value
+        np.savez(path, **columns)
+        return path
+
+    def write_rates(self, name, ids, Mmin, bin, offsets, rates, names, delimiter=', ', name_column=True):
+        return self._save(name, {"id": np.asarray(ids), "Mmin": np.asarray(Mmin, dtype=float),
+                                 "bin": np.float64(bin), "offsets": np.asarray(offsets, dtype=np.int64),
+                                 "rates": np.asarray(rates, dtype=float), "name": np.asarray(names, dtype=str)},
+                          ragged="offsets")
+
+    def write_probabilities(self, name, ids, Mmin, window, probabilities, names):
+        return self._save(name, {"id": np.asarray(ids), "Mmin": np.asarray(Mmin, dtype=float),
+                                 "window": np.float64(window),
+                                 "probability": np.asarray(probabilities, dtype=float),
+                                 "name": np.asarray(names, dtype=str)})
+
+
+class ParquetSink(OutputSink):
+    """
+    Parquet tables, one row per fault with the rates as a list column (requires pyarrow).
+
+    Appended rows go to the open file as new row groups; the files are complete once the
+    sink is closed.
+    """
+
+    extension = '.parquet'
+
+    def __init__(self, root=None):
+        super().__init__(root)
+        self._writers = {}
+
+    def _write_table(self, name, table):
+        path, append = self._open(name)
+        if not append:
+            self._writers[path] = pq.ParquetWriter(path, table.schema)
+        self._writers[path].write_table(table)
+        return path
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+    def write_rates(self, name, ids, Mmin, bin, offsets, rates, names, delimiter=', ', name_column=True):
+        rate_lists = pa.ListArray.from_arrays(pa.array(np.asarray(offsets, dtype=np.int32)),
+                                              pa.array(np.asarray(rates, dtype=float)))
+        table = pa.table({"id": np.asarray(ids), "Mmin": np.asarray(Mmin, dtype=float),
+                          "bin": np.full(len(names), bin, dtype=float), "rates": rate_lists,
+                          "name": pa.array(list(names), type=pa.string())})
+        return self._write_table(name, table)
+
+    def write_probabilities(self, name, ids, Mmin, window, probabilities, names):
+        table = pa.table({"id": np.asarray(ids), "Mmin": np.asarray(Mmin, dtype=float),
+                          "window": np.full(len(names), window, dtype=float),
+                          "probability": np.asarray(probabilities, dtype=float),
+                          "name": pa.array(list(names), type=pa.string())})
+        return self._write_table(name, table)
+
+
+class Hdf5Sink(OutputSink):
+    """HDF5 files, one resizable dataset per column and the scalars as attributes (requires h5py)."""
+
+    extension = '.h5'
+
+    def _save(self, name, attrs, columns, ragged=None):
+        """Writes `columns`, extending the datasets already written; `ragged` names the offsets column."""
+        path, append = self._open(name)
+        with h5py.File(path, 'a' if append else 'w') as f:
+            f.attrs.update(attrs)
+            for key, value in columns.items():
+                dtype = h5py.string_dtype() if key == "name" else None
+                if key not in f:
+                    f.create_dataset(key, data=value, dtype=dtype, maxshape=(None,), chunks=True)
+                    continue
+                dataset = f[key]
+                start = dataset.shape[0]
+                if key == ragged:
+                    value = value[1:] + dataset[start - 1]
+                dataset.resize((start + len(value),))
+                dataset[start:] = value
+        return path
+
+    def write_rates(self, name, ids, Mmin, bin, offsets, rates, names, delimiter=', ', name_column=True):
+        return self._save(name, {"bin": bin},
+                          {"id": np.asarray(ids), "Mmin": np.asarray(Mmin, dtype=float),
+                           "offsets": np.asarray(offsets, dtype=np.int64), "rates": np.asarray(rates, dtype=float),
+                           "name": list(names)}, ragged="offsets")
+
+    def write_probabilities(self, name, ids, Mmin, window, probabilities, names):
+        return self._save(name, {"window": window},
+                          {"id": np.asarray(ids), "Mmin": np.asarray(Mmin, dtype=float),
+                           "probability": np.asarray(probabilities, dtype=float), "name": list(names)})
+
+
+# Accepted values of the `output_format` run setting
+OUTPUT_SINKS = {"text": TextSink, "npz": NpzSink, "parquet": ParquetSink, "hdf5": Hdf5Sink}
+
+
+# Optional module needed by each output format, installed with the "sinks" extra
+SINK_DEPENDENCIES = {"parquet": "pyarrow", "hdf5": "h5py"}
+
+
+def check_output_format(output_format):
+    """
+    Raises a ValueError if `output_format` is not one of `OUTPUT_SINKS`, and an ImportError if
+    its optional dependency is missing, so a run fails before any fault is processed.
+    """
+    if output_format not in OUTPUT_SINKS:
+        raise ValueError(f"output_format must be one of {tuple(OUTPUT_SINKS)}, got {output_format!r}")
+    module = SINK_DEPENDENCIES.get(output_format)
+    if module is not None and importlib.util.find_spec(module) is None:
+        raise ImportError(f"output_format {output_format!r} requires {module}: "
+                          f"install it with pip install .[sinks]")
+
+
+def make_sink(output_format='text', root=None):
+    """Returns the `OUTPUT_SINKS` writer of `output_format`, writing to `root` (default `OUTPUT_ROOT`)."""
+    check_output_format(output_format)
+    return OUTPUT_SINKS[output_format](root)
@@ -0,0 +1,689 @@
+# FQSHA - Fault-based Seismic Hazard Assessment Toolkit
+# Copyright (C) 2025 Tavakolizadeh et al., (2025)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Pipeline.py
+
+"""
+FQSHA workflow shared by the GUI and the command-line runner:
+momentbudget -> sactivityrate -> XML export -> job.ini -> OpenQuake -> map.
+
+Nothing in this module imports PyQt5, and pygmt is only imported by the map step.
+"""
+
+import glob
+import json
+import os
+import re
+import signal
+import subprocess
+import threading
+from collections import deque
+
+import numpy as np
+
+from .SeismicActivityRate import elapsed_time, momentbudget, sactivityrate
+from .FQSHA_Functions import export_faults_to_xml, export_source_model, _json_default
+from .OpenQuake_input_generator import gmpe_generate_xml, source_model_logic_tree, generate_job_ini
+from .Plotting import ConflationStore, RateCurveStore, render_conflation, render_rate_curves
+from .Cache import ResultCache, cached_seismic_activity, renumber_faults
+from .OutputSinks import check_output_format, make_sink
+from .FaultCatalog import FaultCatalog, read_faults, iter_faults, iter_fault_chunks, is_catalog
+from .HazardPreview import hazard_curves, region_grid, write_hazard_preview
+
+
+# Settings of a run, with the defaults used by the GUI when a field is left blank
+DEFAULT_SETTINGS = {
+    "output_folder": "FQSHA_output",
+    "fault_behaviour": "Characteristic Gaussian",
+    "probability_time_interval": 50,
+    "bin": 0.1,
+    "zeta": 0.5,
+    "khi": 0.2,
+    "siggma": 0.3,
+    "mag_scale": "WC1994",
+    "calculation_mode": "classical",
+    "region": None,
+    "grid_spacing": 100,
+    "vs30": 800,
+    "gmpes": {"AkkarBommer2010": 1.0},
+    "source_model": "per_fault",
+    "figures_folder": "output_files",
+    "output_root": None,
+    "output_format": "text",
+    "plots": "none",
+    "run_openquake": True,
+    "create_map": True,
+    "cache_folder": None,
+    "cache_max_mb": 64,
+    "chunk_size": None,
+}
+
+# Name of the source model written in the Sources folder when "source_model" is "single"
+SINGLE_SOURCE_MODEL = "source_model.xml"
+
+# Hashes of the exported per-fault sources, used to skip unchanged faults on the next run
+SOURCES_MANIFEST = "sources_manifest.json"
+
+# Stages reported to the `progress` callbacks, in execution order
+STAGES = ("inputs", "momentbudget", "rates", "xml", "openquake", "map")
+
+# Stages reported by `run_preview`
+PREVIEW_STAGES = ("inputs", "momentbudget", "rates", "preview", "map")
+
+# Folder of the output directory holding the hazard preview
+PREVIEW_FOLDER = "Preview"
+
+# Progress line of the OpenQuake engine log, e.g.
+# [2025-01-01 10:00:00,123 #12 INFO] classical  40% [25 submitted, 3 queued]
+ENGINE_PROGRESS = re.compile(r"(?:#(?P<calc_id>\d+)[^\]]*\]\s*)?(?P<task>[A-Za-z_]\w*)\s+(?P<percent>\d{1,3})%\s+"
+                             r"\[(?P<submitted>\d+) submitted, (?P<queued>\d+) queued\]")
+
+# Keys of the GUI inputs dictionary read by the OpenQuake input generators
+REGION_KEYS = {"min_lat": "textEdit_7", "max_lat": "textEdit_2", "min_lon": "textEdit_5", "max_lon": "textEdit_6"}
+
+
+class PipelineCancelled(Exception):
+    """Raised inside the pipeline when its `cancel` event is set."""
+
+
+def _stage_reporter(progress, cancel):
+    """
+    Returns ``report(stage, done, total)``, which checks `cancel` (a `threading.Event`)
+    and forwards the call to `progress`.
+    """
+    def report(stage, done, total):
+        if cancel is not None and cancel.is_set():
+            raise PipelineCancelled(f"Cancelled during the '{stage}' stage")
+        if progress is not None:
+            progress(stage, done, total)
+    return report
+
+
+def load_config(config_file, chunk_size=None):
+    """
+    Reads a JSON run configuration and completes it with `DEFAULT_SETTINGS`.
+
+    The ``faults`` entry is either the fault dictionary itself or the path to the JSON
+    fault file or columnar catalog folder (`FaultCatalog.save_catalog`), relative to the
+    configuration file. A catalog folder is opened as a memory-mapped `FaultCatalog`. With
+    a ``chunk_size``, a JSON or NDJSON fault file is not loaded: its path is returned and
+    `run_pipeline` streams it. `chunk_size` overrides the configuration value.
+
+    Returns
+    -------
+    settings : dict
+        Run settings.
+    faults : dict, FaultCatalog or str
+        Fault parameters keyed by fault name, or the path of the fault file to stream.
+    """
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+
+    unknown = set(config) - set(DEFAULT_SETTINGS) - {"faults"}
+    if unknown:
+        raise ValueError(f"Unknown configuration keys: {', '.join(sorted(unknown))}")
+    if "faults" not in config:
+        raise ValueError("The configuration must define 'faults' (a fault dictionary or a JSON file path)")
+
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update({key: value for key, value in config.items() if key != "faults"})
+    if chunk_size:
+        settings["chunk_size"] = chunk_size
+
+    faults = config["faults"]
+    if isinstance(faults, str):
+        fault_file = os.path.join(os.path.dirname(os.path.abspath(config_file)), faults)
+        if settings["chunk_size"] and not is_catalog(fault_file):
+            return settings, fault_file
+        if is_catalog(fault_file):
+            faults = FaultCatalog.load(fault_file)
+        else:
+            faults = read_faults(fault_file)
+        print(f"Loaded fault data: {len(faults)} faults found.")
+    return settings, faults
+
+
+def settings_to_inputs(settings, faults):
+    """
+    Converts run settings to the inputs dictionary collected by the GUI
+    (``Ui_Frame.collect_inputs``), as read by the OpenQuake input generators.
+    """
+    region = settings.get("region") or {}
+    inputs = {model: True for model in settings["gmpes"]}
+    inputs['weights'] = {model: str(weight) for model, weight in settings["gmpes"].items()}
+    for key, text_edit in REGION_KEYS.items():
+        inputs[text_edit] = str(region[key]) if region.get(key) is not None else ''
+    inputs['textEdit_10'] = str(settings["grid_spacing"])
+    inputs['textEdit_9'] = str(settings["vs30"])
+    inputs['textEdit_12'] = settings["mag_scale"]
+    inputs['textEdit_13'] = settings["output_folder"]
+    inputs['comboBox_2'] = settings["calculation_mode"]
+    inputs['faults'] = faults
+    return inputs
+
+
+def get_output_directory(output_folder):
+    """Returns the main output directory (under the working directory) and its Sources folder."""
+    main_output_directory = os.path.join(os.getcwd(), output_folder or "FQSHA_output")
+    sources_directory = os.path.join(main_output_directory, "Sources")
+    return main_output_directory, sources_directory
+
+
+def export_inputs(inputs, main_output_directory, filename='inputs.json'):
+    """Writes the inputs dictionary and the fault traces (fault_traces.json) to the output directory."""
+    os.makedirs(main_output_directory, exist_ok=True)
+
+    full_path = os.path.join(main_output_directory, filename)
+    with open(full_path, 'w') as file:
+        json.dump(inputs, file, indent=4, default=_json_default)
+    print(f"Inputs saved to {full_path}")
+
+    fault_traces = {
+        fault_name: {'fault_trace': fault_info['fault_trace']}
+        for fault_name, fault_info in inputs.get('faults', {}).items()
+        if 'fault_trace' in fault_info
+    }
+    fault_traces_path = os.path.join(main_output_directory, 'fault_traces.json')
+    with open(fault_traces_path, 'w') as file:
+        json.dump(fault_traces, file, indent=4)
+    print(f"Fault traces saved to {fault_traces_path}")
+
+
+def trace_bounds(traces, bounds=None):
+    """
+    Returns the (lon_min, lon_max, lat_min, lat_max) box of fault traces, or None without any
+    vertex. `bounds` is a previous box to extend, for traces read in several passes.
+    """
+    for trace in traces:
+        trace = np.asarray(trace, dtype=float)
+        if trace.size == 0:
+            continue
+        box = (trace[:, 0].min(), trace[:, 0].max(), trace[:, 1].min(), trace[:, 1].max())
+        if bounds is not None:
+            box = (min(box[0], bounds[0]), max(box[1], bounds[1]), min(box[2], bounds[2]), max(box[3], bounds[3]))
+        bounds = tuple(float(value) for value in box)
+    return bounds
+
+
+def fill_region_defaults(inputs, faults, confidence=0.3, bounds=None):
+    """
+    Completes the empty region, magnitude scale, grid spacing and Vs30 fields of `inputs`.
+
+    The region is the bounding box of all fault traces (or `bounds`, see `trace_bounds`),
+    widened by `confidence` times its extent on each side.
+    """
+    if bounds is None:
+        bounds = trace_bounds(fault_data['fault_trace'] for fault_data in faults.values() if 'fault_trace' in fault_data)
+
+    if bounds is not None:
+        lon_min, lon_max, lat_min, lat_max = bounds
+        lon_range = lon_max - lon_min
+        lat_range = lat_max - lat_min
+
+        region = {
+            'textEdit_7': lat_min - (lat_range * confidence),
+            'textEdit_2': lat_max + (lat_range * confidence),
+            'textEdit_5': lon_min - (lon_range * confidence),
+            'textEdit_6': lon_max + (lon_range * confidence),
+        }
+        for key, value in region.items():
+            if inputs[key] == '':
+                inputs[key] = str(value)
+
+    if inputs['textEdit_12'] == '':
+        inputs['textEdit_12'] = 'WC1994'
+    if inputs['textEdit_10'] == '':
+        inputs['textEdit_10'] = str(100)
+    if inputs['textEdit_9'] == '':
+        inputs['textEdit_9'] = str(800)
+    return inputs
+
+
+def run_seismic_activity(faults, settings, progress=None, cancel=None, sink=None, first_id=1, bpt=None):
+    """
+    Runs `momentbudget` and `sactivityrate` on `faults` with the run settings.
+
+    `progress` and `cancel` are as in `run_pipeline`; the moment budget reports the
+    number of faults processed. When ``settings["cache_folder"]`` is set, the moment budget
+    of faults whose parameters and budget settings are unchanged is served from the cache
+    (see `Cache.py`); the activity rates, tables and rate figures are then computed for
+    the whole merged catalog, so they always cover every fault. The rate and
+    probability tables are written in ``settings["output_format"]`` (see
+    `OutputSinks.OUTPUT_SINKS`) to ``settings["output_root"]``, 'output_files' by default,
+    or appended to the tables of `sink` when it is given (and closed by the caller). The
+    faults get consecutive ids from `first_id` before their rates are computed, and `bpt`
+    selects the probability model of `sactivityrate`.
+
+    Returns
+    -------
+    dict
+        The updated faults dictionary.
+    """
+    report = _stage_reporter(progress, cancel)
+    ProjFol = settings["figures_folder"] or 'output_files'
+    plots = settings["plots"]
+    Zeta, Khi, Siggma = float(settings["zeta"]), float(settings["khi"]), float(settings["siggma"])
+    w, bin = float(settings["probability_time_interval"]), float(settings["bin"])
+
+    own_sink = sink is None
+    if own_sink:
+        sink = make_sink(settings["output_format"], settings["output_root"])
+
+    def budget(subset):
+        plot_store = ConflationStore() if plots == 'lazy' else None
+        momentbudget(subset, Zeta, Khi, Siggma, ProjFol=ProjFol, logical_nan='NAN, "",NaN',
+                     logical_nan_sdmag='NAN, "",NaN', plots=plots, plot_store=plot_store,
+                     progress=lambda done, total: report("momentbudget", done, total))
+        if plots == 'lazy':
+            render_conflation(plot_store, ProjFol, max_workers=None)
+
+    if settings.get("cache_folder"):
+        cache = ResultCache(settings["cache_folder"], max_bytes=int(float(settings["cache_max_mb"]) * 2 ** 20))
+        parameters = {"Zeta": Zeta, "Khi": Khi, "Siggma": Siggma}
+        cached_seismic_activity(faults, parameters, budget, cache)
+    else:
+        budget(faults)
+    renumber_faults(faults, start=first_id)
+    for key, sub_dict in faults.items():
+        sub_dict['mag_scale'] = settings["mag_scale"]
+
+    # The rates, tables and figures always cover the whole catalog, cached faults included
+    report("rates", 0, 1)
+    rate_store = RateCurveStore() if plots == 'lazy' else None
+    try:
+        sactivityrate(faults, settings["fault_behaviour"], w, bin, ProjFol=ProjFol, plots=plots,
+                      plot_store=rate_store, sink=sink, bpt=bpt)
+    finally:
+        if own_sink:
+            sink.close()
+    if plots == 'lazy':
+        render_rate_curves(rate_store, max_workers=None)
+    report("rates", 1, 1)
+    return faults
+
+
+def iter_seismic_activity(chunks, settings, total=None, progress=None, cancel=None, bpt=None):
+    """
+    Runs `run_seismic_activity` on successive fault dictionaries (e.g. from
+    `FaultCatalog.iter_fault_chunks`) and yields the ``(fault name, parameters)`` pairs of
+    each processed chunk, so only one chunk is held in memory when the pairs are consumed
+    by a streaming writer (`export_source_model`, `export_faults_to_xml`).
+
+    Fault ids continue from one chunk to the next, and the rows of every chunk are appended
+    to one rate/probability table per model through a single sink, as in an unchunked run.
+    The BPT or Poisson model of the characteristic Gaussian probabilities is chosen once for
+    all chunks: `bpt` (the `elapsed_time` of the last fault of the catalog, given by
+    `scan_fault_file`), or by default from the last fault of the first chunk.
+    `progress` receives the number of faults processed out of `total` under the
+    "momentbudget" stage.
+    """
+    report = _stage_reporter(progress, cancel)
+    next_id = 1
+    done = 0
+    with make_sink(settings["output_format"], settings["output_root"]) as sink:
+        for chunk in chunks:
+            if bpt is None and chunk:
+                bpt = bool(elapsed_time(list(chunk.values())[-1]))
+            run_seismic_activity(chunk, settings, cancel=cancel, sink=sink, first_id=next_id, bpt=bpt)
+            next_id = renumber_faults(chunk, start=next_id)
+            done += len(chunk)
+            report("momentbudget", done, total or done)
+            yield from chunk.items()
+    report("rates", 1, 1)
+
+
+def scan_fault_file(fault_file, traces_file=None):
+    """
+    Reads a JSON or NDJSON fault file once, keeping only the fault names, the bounding box
+    of the traces (`trace_bounds`) and whether the elapsed time of the last fault is set
+    (the `bpt` argument of `iter_seismic_activity`). When `traces_file` is given the traces
+    are written to it, as `export_inputs` does for the map.
+    """
+    names = []
+    bounds = None
+    fault = {}
+    traces = open(traces_file, 'w') if traces_file else None
+    try:
+        if traces:
+            traces.write('{')
+        for name, fault in iter_faults(fault_file):
+            names.append(name)
+            if 'fault_trace' in fault:
+                bounds = trace_bounds([fault['fault_trace']], bounds)
+                if traces:
+                    separator = ',' if traces.tell() > 1 else ''
+                    traces.write(f"{separator}\n    {json.dumps(name)}: "
+                                 f"{json.dumps({'fault_trace': fault['fault_trace']})}")
+        if traces:
+            traces.write('\n}\n')
+    finally:
+        if traces:
+            traces.close()
+    return names, bounds, bool(elapsed_time(fault))
+
+
+def _terminate(process, timeout=10):
+    """Terminates `process` and the engine workers it started, killing them after `timeout` seconds."""
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGTERM)
+        else:
+            process.terminate()
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.wait()
+    except ProcessLookupError:
+        pass
+
+
+def parse_engine_progress(line):
+    """
+    Parses an OpenQuake engine progress line such as
+    ``[2025-01-01 10:00:00,123 #12 INFO] classical  40% [25 submitted, 3 queued]``.
+
+    Returns
+    -------
+    dict or None
+        ``task``, ``percent``, ``submitted``, ``queued`` and ``calc_id`` (None when the line
+        has no log prefix), or None if `line` is not a progress line.
+    """
+    match = ENGINE_PROGRESS.search(line)
+    if match is None:
+        return None
+    return {
+        "task": match.group("task"),
+        "percent": int(match.group("percent")),
+        "submitted": int(match.group("submitted")),
+        "queued": int(match.group("queued")),
+        "calc_id": int(match.group("calc_id")) if match.group("calc_id") else None,
+    }
+
+
+def stream_command(command, cwd, on_line=print, on_progress=None, cancel=None, buffer_lines=1000,
+                   poll_interval=0.5):
+    """
+    Runs `command` in its own process group and streams its merged stdout/stderr line by line.
+
+    Parameters
+    ----------
+    command : list of str
+        Command and arguments.
+    cwd : str
+        Working directory.
+    on_line : callable, optional
+        Called with every output line (without the newline) as it arrives. Defaults to print.
+    on_progress : callable, optional
+        Called with the `parse_engine_progress` dictionary of every progress line.
+    cancel : threading.Event, optional
+        Checked every `poll_interval` seconds; when set, the process is terminated and
+        `PipelineCancelled` is raised.
+    buffer_lines : int, optional
+        Number of most recent lines kept in memory.
+
+    Returns
+    -------
+    returncode : int
+    tail : list of str
+        The last `buffer_lines` output lines.
+
+    Notes
+    -----
+    - The callbacks run on a reader thread, so they must be thread-safe (Qt signal
+      emission and print are).
+    """
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                               bufsize=1, start_new_session=(os.name == 'posix'))
+    tail = deque(maxlen=buffer_lines)
+
+    def read_output():
+        for line in process.stdout:
+            line = line.rstrip('\n')
+            tail.append(line)
+            if on_line is not None:
+                on_line(line)
+            if on_progress is not None:
+                event = parse_engine_progress(line)
+                if event is not None:
+                    on_progress(event)
+
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
+    while True:
+        try:
+            process.wait(timeout=poll_interval)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel is not None and cancel.is_set():
+                _terminate(process)
+                reader.join(timeout=poll_interval)
+                raise PipelineCancelled(f"Cancelled: {' '.join(command)} was terminated")
+    reader.join()
+    process.stdout.close()
+    return process.returncode, list(tail)
+
+
+def run_oq_engine(main_output_directory, cancel=None, on_line=print, on_progress=None):
+    """
+    Runs the OpenQuake engine on the job.ini of the output directory, streaming its log.
+
+    Parameters
+    ----------
+    main_output_directory : str
+        Folder holding job.ini.
+    cancel : threading.Event, optional
+        When set, the engine and its workers are terminated and `PipelineCancelled` is raised.
+    on_line, on_progress : callable, optional
+        Output line and progress event callbacks, see `stream_command`.
+
+    Returns
+    -------
+    bool
+        True if the calculation completed.
+    """
+    for command in (['oq', 'engine', '--delete-uncompleted-calculations'],
+                    ['oq', 'engine', '--run', 'job.ini', '--exports=csv']):
+        returncode, tail = stream_command(command, main_output_directory, on_line=on_line,
+                                          on_progress=on_progress, cancel=cancel)
+        if returncode != 0:
+            print("An error occurred while running the command:", "\n".join(tail[-20:]))
+            return False
+    return True
+
+
+def find_latest_hazard_map(output_directory):
+    """Returns the most recently modified hazard_map-mean_*.csv of the OutPut folder, or None."""
+    output_dir = os.path.join(output_directory, "OutPut")
+    files = glob.glob(os.path.join(output_dir, "hazard_map-mean_*.csv"))
+
+    if not files:
+        print("No hazard map files found.")
+        return None
+
+    files.sort(key=lambda f: os.path.getmtime(f), reverse=True)
+    return files[0]
+
+
+def create_map(main_output_directory):
+    """Draws the contour map of the latest hazard map CSV with the fault traces (requires pygmt)."""
+    csv_file = find_latest_hazard_map(main_output_directory)
+    if csv_file is None:
+        print("No suitable hazard map CSV file found.")
+        return None
+
+    from .Mapping import create_contour_map_with_faults
+    fault_file = os.path.join(main_output_directory, "fault_traces.json")
+    create_contour_map_with_faults(csv_file, fault_file, main_output_directory)
+    return csv_file
+
+
+def run_pipeline(settings, faults, inputs=None, progress=None, cancel=None):
+    """
+    Runs the full FQSHA workflow without the GUI.
+
+    Parameters
+    ----------
+    settings : dict
+        Run settings, see `DEFAULT_SETTINGS`.
+    faults : dict, FaultCatalog or str
+        Fault parameters keyed by fault name, or the path of a JSON or NDJSON fault file
+        processed ``settings["chunk_size"]`` faults at a time (see `iter_seismic_activity`).
+    inputs : dict, optional
+        GUI inputs dictionary (``Ui_Frame.collect_inputs``). Built from `settings` by default.
+    progress : callable, optional
+        Called as ``progress(stage, done, total)``, with `stage` one of `STAGES`.
+    cancel : threading.Event, optional
+        Checked between stages and while OpenQuake runs; when set, `PipelineCancelled` is raised.
+
+    Returns
+    -------
+    str
+        Main output directory.
+    """
+    report = _stage_reporter(progress, cancel)
+    # Fail on a missing optional writer before the moment budget runs
+    check_output_format(settings["output_format"])
+
+    report("inputs", 0, 1)
+    streaming = isinstance(faults, str)
+    main_output_directory, sources_directory = get_output_directory(settings["output_folder"])
+    if inputs is None:
+        inputs = settings_to_inputs(settings, {} if streaming else faults)
+    export_inputs(inputs, main_output_directory)
+
+    bounds = None
+    if streaming:
+        fault_file = faults
+        names, bounds, bpt = scan_fault_file(fault_file, os.path.join(main_output_directory, 'fault_traces.json'))
+        print(f"Streaming {len(names)} faults from {fault_file} in chunks of {settings['chunk_size']}")
+        faults = dict.fromkeys(names, {})
+
+    if settings["source_model"] not in ("per_fault", "single"):
+        raise ValueError(f"Invalid source_model '{settings['source_model']}': expected 'per_fault' or 'single'")
+    single = settings["source_model"] == "single"
+    source_files = [f'./Sources/{SINGLE_SOURCE_MODEL}'] if single else None
+    source_model_logic_tree(faults, main_output_directory, source_files=source_files)
+    fill_region_defaults(inputs, faults, bounds=bounds)
+    generate_job_ini(inputs, main_output_directory, faults)
+    report("inputs", 1, 1)
+
+    if streaming:
+        # Chunks are computed as the XML writers below consume them
+        chunks = iter_fault_chunks(iter_faults(fault_file), int(settings["chunk_size"]))
+        faults = iter_seismic_activity(chunks, settings, total=len(names), progress=progress, cancel=cancel,
+                                       bpt=bpt)
+    else:
+        run_seismic_activity(faults, settings, progress=progress, cancel=cancel)
+
+    report("xml", 0, 1)
+    gmpe_generate_xml(inputs, main_output_directory)
+    if single:
+        export_source_model(faults, os.path.join(sources_directory, SINGLE_SOURCE_MODEL))
+    else:
+        export_faults_to_xml(faults, sources_directory,
+                             manifest=os.path.join(main_output_directory, SOURCES_MANIFEST))
+    print("Seismic activity rate calculation and OpenQuake input generation completed.")
+    report("xml", 1, 1)
+
+    if settings["run_openquake"]:
+        report("openquake", 0, 1)
+        # Engine progress arrives on the reader thread: forward it without the cancel check,
+        # which the engine runner does itself
+        on_progress = None
+        if progress is not None:
+            on_progress = lambda event: progress("openquake", event["percent"], 100)
+        completed = run_oq_engine(main_output_directory, cancel=cancel, on_progress=on_progress)
+        print("Hazard Calculation Completed.")
+        report("openquake", 1, 1)
+        if completed and settings["create_map"]:
+            report("map", 0, 1)
+            create_map(main_output_directory)
+            report("map", 1, 1)
+    return main_output_directory
+
+
+def run_preview(settings, faults, mesh_spacing=1.0, grid_spacing=None, progress=None, cancel=None):
+    """
+    Runs the moment budget and activity rates, then the NumPy hazard preview
+    (`HazardPreview.hazard_curves`) on the job.ini region grid instead of OpenQuake.
+
+    Parameters
+    ----------
+    settings : dict
+        Run settings, see `DEFAULT_SETTINGS`. The GMPEs of ``settings["gmpes"]`` available in
+        `HazardPreview.PREVIEW_GMPES` are used with their weights.
+    faults : dict, FaultCatalog or str
+        As in `run_pipeline`.
+    mesh_spacing : float, optional
+        Rupture mesh spacing (km). job.ini uses 0.4 km, which is rarely worth the cost here.
+    grid_spacing : float, optional
+        Site spacing (km), ``settings["grid_spacing"]`` by default.
+    progress : callable, optional
+        Called as ``progress(stage, done, total)``, with `stage` one of `PREVIEW_STAGES`.
+    cancel : threading.Event, optional
+        Checked between faults; when set, `PipelineCancelled` is raised.
+
+    Returns
+    -------
+    str
+        Path of ``<output folder>/Preview/hazard_map-preview.csv``. Its contour map is drawn
+        next to it when ``settings["create_map"]`` is set.
+    """
+    report = _stage_reporter(progress, cancel)
+    check_output_format(settings["output_format"])
+
+    report("inputs", 0, 1)
+    streaming = isinstance(faults, str)
+    main_output_directory, _ = get_output_directory(settings["output_folder"])
+    preview_directory = os.path.join(main_output_directory, PREVIEW_FOLDER)
+    os.makedirs(preview_directory, exist_ok=True)
+    inputs = settings_to_inputs(settings, {} if streaming else faults)
+    traces_file = os.path.join(preview_directory, 'fault_traces.json')
+    if streaming:
+        fault_file = faults
+        names, bounds, bpt = scan_fault_file(fault_file, traces_file)
+        fill_region_defaults(inputs, {}, bounds=bounds)
+        chunks = iter_fault_chunks(iter_faults(fault_file), int(settings["chunk_size"]))
+        faults = iter_seismic_activity(chunks, settings, total=len(names), progress=progress, cancel=cancel,
+                                       bpt=bpt)
+        total = len(names)
+    else:
+        fill_region_defaults(inputs, faults)
+        with open(traces_file, 'w') as f:
+            json.dump({name: {'fault_trace': fault['fault_trace']} for name, fault in faults.items()
+                       if 'fault_trace' in fault}, f, indent=4, default=_json_default)
+        run_seismic_activity(faults, settings, progress=progress, cancel=cancel)
+        total = len(faults)
+    report("inputs", 1, 1)
+
+    lons, lats = region_grid(float(inputs['textEdit_7']), float(inputs['textEdit_2']),
+                             float(inputs['textEdit_5']), float(inputs['textEdit_6']),
+                             float(grid_spacing or inputs['textEdit_10']))
+    print(f"Hazard preview on {len(lons)} sites")
+    report("preview", 0, total)
+    poes = hazard_curves(faults, lons, lats, gmpes=settings["gmpes"], vs30=float(inputs['textEdit_9']),
+                         mesh_spacing=mesh_spacing, progress=lambda done, _: report("preview", done, total))
+    csv_file = write_hazard_preview(preview_directory, lons, lats, poes)
+
+    if settings["create_map"]:
+        report("map", 0, 1)
+        from .Mapping import create_contour_map_with_faults
+        create_contour_map_with_faults(csv_file, traces_file, preview_directory)
+        report("map", 1, 1)
+    return csv_file
@@ -0,0 +1,400 @@
+# FQSHA - Fault-based Seismic Hazard Assessment Toolkit
+# Copyright (C) 2025 Tavakolizadeh et al., (2025)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# Plotting.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import numpy as np
+from ._lazy import lazy_import
+
+stats = lazy_import('scipy.stats')
+plt = lazy_import('matplotlib.pyplot')
+
+
+# Accepted values of the `plots` argument of the moment budget and activity rate stages
+PLOT_MODES = ("none", "lazy", "eager")
+
+
+def check_plot_mode(plots):
+    """Raises a ValueError if `plots` is not one of `PLOT_MODES`."""
+    if plots not in PLOT_MODES:
+        raise ValueError(f"plots must be one of {PLOT_MODES}, got {plots!r}")
+
+
+def figures_directory(ProjFol):
+    """Returns (and creates) the Figures folder of a project, 'output_files/Figures' by default."""
+    directory = os.path.join(ProjFol if len(ProjFol) > 0 else 'output_files', 'Figures')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+class _RaggedStore:
+    """
+    Base of the figure stores: per-fault float32 values appended to one flat buffer with offsets.
+    """
+
+    def __init__(self):
+        self._index = {}
+        self._offsets = [0]
+        self._meta = []
+        self._chunks = []
+        self._values = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, fault_name):
+        return fault_name in self._index
+
+    def names(self):
+        """Returns the fault names in insertion order."""
+        return list(self._index)
+
+    def _append(self, fault_name, values, meta):
+        self._index[fault_name] = len(self._meta)
+        self._meta.append(meta)
+        self._chunks.append(np.asarray(values, dtype=np.float32))
+        self._offsets.append(self._offsets[-1] + self._chunks[-1].size)
+
+    def _record(self, fault_name):
+        if self._chunks:
+            self._values = np.concatenate([self._values] + self._chunks)
+            self._chunks = []
+        i = self._index[fault_name]
+        return self._values[self._offsets[i]:self._offsets[i + 1]].astype(float), self._meta[i]
+
+
+class ConflationStore(_RaggedStore):
+    """
+    Compact store of the per-fault conflation curves recorded by `momentbudget(plots='lazy')`.
+
+    The magnitude grid of each fault is kept as (start, step, length) and the PDF rows,
+    summed and conflated curves of every fault are appended to one float32 buffer,
+    so that thousands of faults can be plotted later by `render_conflation`, or never.
+    """
+
+    def add(self, fault_name, curves):
+        """
+        Records the conflation curves of one fault.
+
+        Parameters
+        ----------
+        fault_name : str
+            Name of the fault.
+        curves : dict
+            Per-fault curves as produced by the moment budget engine: x_range_of_mag,
+            pdf_magnitudes, summed_pdf_magnitudes, conflated, MAR_used, Mobs and sdMobs.
+        """
+        x_range_of_mag = curves['x_range_of_mag']
+        pdf_magnitudes = curves['pdf_magnitudes']
+        step = x_range_of_mag[1] - x_range_of_mag[0] if len(x_range_of_mag) > 1 else 0.0
+        meta = (x_range_of_mag[0], step, len(x_range_of_mag), pdf_magnitudes.shape[0],
+                bool(curves['MAR_used']), float(curves['Mobs']), float(curves['sdMobs']))
+        self._append(fault_name, np.concatenate([pdf_magnitudes.ravel(), curves['summed_pdf_magnitudes'],
+                                                 curves['conflated']]), meta)
+
+    def get(self, fault_name):
+        """Returns the curves of one fault in the format accepted by `plot_conflation`."""
+        values, (x0, step, npts, nrows, MAR_used, Mobs, sdMobs) = self._record(fault_name)
+        return {
+            "x_range_of_mag": x0 + np.arange(npts) * step,
+            "pdf_magnitudes": values[:nrows * npts].reshape(nrows, npts),
+            "summed_pdf_magnitudes": values[nrows * npts:(nrows + 1) * npts],
+            "conflated": values[(nrows + 1) * npts:],
+            "MAR_used": MAR_used,
+            "Mobs": Mobs,
+            "sdMobs": sdMobs,
+        }
+
+
+class RateCurveStore(_RaggedStore):
+    """
+    Compact store of the per-fault cumulative-rate curves recorded by the activity rate
+    models (`TruncatedGR`, `CHGaussPoiss`, `CHGaussBPT`) when called with plots='lazy'.
+    """
+
+    def add(self, fault_name, magnitude_range, cumulative_rates, color, figure_path):
+        """Records the cumulative-rate curve of one fault and where its figure goes."""
+        self._append(fault_name, np.concatenate([magnitude_range, cumulative_rates]),
+                     (len(magnitude_range), color, figure_path))
+
+    def get(self, fault_name):
+        """Returns the keyword arguments of `plot_cumulative_rates` for one fault."""
+        values, (npts, color, figure_path) = self._record(fault_name)
+        return {
+            "magnitude_range": values[:npts],
+            "cumulative_rates": values[npts:],
+            "color": color,
+            "figure_path": figure_path,
+        }
+
+
+def plot_conflation(fault_name, curves, ProjFol, show=True):
+    """
+    Draws and saves the conflation plot of one fault.
+
+    Parameters
+    ----------
+    fault_name : str
+        Name of the fault, used as title and in the file names.
+    curves : dict
+        Per-fault curves from the moment budget engine or `ConflationStore.get`.
+    ProjFol : str
+        Project folder, figures are written to its Figures subfolder.
+    show : bool, optional
+        Call `plt.show()` once the figure is saved.
+
+    Returns
+    -------
+    str
+        Path of the saved figure, without extension.
+    """
+    x_range_of_mag = curves['x_range_of_mag']
+    pdf_magnitudes = np.array(curves['pdf_magnitudes'], dtype=float)
+    summed_pdf_magnitudes = curves['summed_pdf_magnitudes']
+    conflated = curves['conflated']
+    mag = curves['Mobs']
+
+    # Scale the Mobs PDF back to its original (unconflated) standard deviation
+    pp = stats.norm.pdf(x_range_of_mag, mag, curves['sdMobs'])
+    pdf_magnitudes[-1] = pdf_magnitudes[-1] * (np.trapz(pp) / np.trapz(pdf_magnitudes[-1]))
+
+    namefig = 'Conflation_of_PDFs' + str(fault_name)
+    # Set up the figure with your desired style
+    plt.style.use('dark_background')
+    fig = plt.figure(figsize=(8, 6))
+    count_pdf = 0
+    plt.plot(x_range_of_mag, pdf_magnitudes[count_pdf, :], linewidth=1.2, linestyle='-', color='blue',
+             label='Label1')
+    count_pdf += 1
+    if curves['MAR_used']:
+        plt.plot(x_range_of_mag, pdf_magnitudes[count_pdf, :], linewidth=1.4, linestyle='-', color='lime',
+                 label='Label2')
+        count_pdf += 1
+    plt.plot(x_range_of_mag, pdf_magnitudes[count_pdf, :], linewidth=1.0, linestyle='-', color='red',
+             label='Label3')
+    count_pdf += 1
+    plt.plot(x_range_of_mag, pdf_magnitudes[count_pdf, :], linewidth=1.2, linestyle='-', color='cyan',
+             label='Label4')
+    count_pdf += 1
+    if not np.isnan(mag):
+        plt.plot(x_range_of_mag, pdf_magnitudes[count_pdf, :], linewidth=1.2, linestyle='-', color='magenta',
+                 label='Label5')
+    plt.plot(x_range_of_mag, summed_pdf_magnitudes, linewidth=1.2, linestyle='--', color='gray', label='Label6')
+    plt.plot(x_range_of_mag, conflated, linewidth=2.0, linestyle='-', color='gold', label='Label7')
+    Mmax1 = x_range_of_mag[np.argmax(conflated)]
+
+    # Make Mmax visible by changing the color to white
+    plt.stem(Mmax1, np.max(conflated), linefmt='k-', markerfmt='ko', basefmt=' ')
+    # Check LAR and Length conditions and define legend entries
+    legends_Mw = ['MRLD', 'MRA']
+    if curves['MAR_used']:
+        if not np.isnan(mag):
+            legendEntries = ['MMo'] + ['MAR'] + legends_Mw + ['MObs', 'SEM', 'CoP', 'Mmax']
+        else:
+            legendEntries = ['MMo'] + ['MAR'] + legends_Mw + ['SEM', 'CoP', 'Mmax']
+    else:
+        if not np.isnan(mag):
+            legendEntries = ['MMo'] + legends_Mw + ['MObs', 'SEM', 'CoP', 'Mmax']
+        else:
+            legendEntries = ['MMo'] + legends_Mw + ['SEM', 'CoP'] + [] + ['Mmax']
+    # Display the legend
+    plt.legend(legendEntries)
+    plt.fill_between(x_range_of_mag, 0, conflated, color='gold', alpha=0.25)
+    plt.xlabel('Magnitude', fontsize=14, fontname='DejaVu Serif')
+    plt.ylabel('Probability density function', fontsize=14, fontname='DejaVu Serif')
+    plt.title(fault_name)
+    plt.xlim(x_range_of_mag.min(), x_range_of_mag.max())
+    plt.subplots_adjust(left=0.075, right=0.98, top=0.96, bottom=0.1)  # Adjust margins of the plot
+
+    # Save the figure
+    figure_name = os.path.join(figures_directory(ProjFol), namefig)
+    plt.savefig(figure_name + '.pdf', dpi=1200, bbox_inches='tight')  # Adjust the DPI value as needed
+    plt.savefig(figure_name + '.png', dpi=600)  # Save the figure as a PNG file
+    if show:
+        plt.show()
+    plt.close(fig)
+    return figure_name
+
+
+def plot_cumulative_rates(fault_name, magnitude_range, cumulative_rates, color, figure_path, show=True):
+    """
+    Draws and saves the annual cumulative rates of one fault on a semi-log plot.
+
+    Parameters
+    ----------
+    fault_name : str
+        Name of the fault, used as title.
+    magnitude_range : ndarray
+        Magnitude bins.
+    cumulative_rates : ndarray
+        Annual cumulative rates of each bin.
+    color : str
+        Fill color under the curve.
+    figure_path : str
+        PNG file to write.
+    show : bool, optional
+        Call `plt.show()` once the figure is saved.
+
+    Returns
+    -------
+    str
+        Path of the saved figure.
+    """
+    plt.style.use('dark_background')
+    fig = plt.figure(figsize=(8, 6))
+    plt.semilogy(magnitude_range, cumulative_rates, 'oy')
+    plt.fill_between(magnitude_range, 0, cumulative_rates, color=color, alpha=0.3)
+    plt.xlabel('magnitude')
+    plt.ylabel('annual cumulative rates')
+    plt.title(fault_name)
+    plt.savefig(figure_path, format='png')
+    if show:
+        plt.show()  # Show the plot
+    plt.close(fig)
+    return figure_path
+
+
+def _init_render_worker():
+    """Switches the worker processes of `render_figures` to the non-interactive Agg backend."""
+    plt.switch_backend('Agg')
+
+
+def _render_job(job):
+    """Draws one figure job, see `render_figures`."""
+    kind, fault_name, kwargs = job
+    if kind == 'conflation':
+        return plot_conflation(fault_name, show=False, **kwargs)
+    if kind == 'rates':
+        return plot_cumulative_rates(fault_name, show=False, **kwargs)
+    raise ValueError(f"Unknown figure kind: {kind}")
+
+
+def render_figures(jobs, max_workers=None, max_pending=None):
+    """
+    Draws figure jobs in a pool of Agg worker processes.
+
+    Parameters
+    ----------
+    jobs : iterable of tuple
+        ``(kind, fault_name, kwargs)`` jobs, where kind is 'conflation' (kwargs of
+        `plot_conflation`) or 'rates' (kwargs of `plot_cumulative_rates`). The kwargs hold
+        plain arrays, so a job can be drawn in any process.
+    max_workers : int, optional
+        Number of worker processes, `os.cpu_count()` by default. With 0 the jobs are drawn
+        one after the other in the calling process.
+    max_pending : int, optional
+        Maximum number of jobs submitted and not yet finished, twice the number of workers
+        by default. `jobs` is consumed lazily, so memory stays bounded for large catalogs.
+
+    Returns
+    -------
+    list of str
+        Names of the faults whose figure was written, in completion order.
+    """
+    drawn = []
+    if max_workers == 0:
+        for job in jobs:
+            _render_job(job)
+            drawn.append(job[1])
+        return drawn
+
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker) as executor:
+        pending = {}
+        for job in jobs:
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                    drawn.append(pending.pop(future))
+            pending[executor.submit(_render_job, job)] = job[1]
+        for future in as_completed(pending):
+            future.result()
+            drawn.append(pending[future])
+    return drawn
+
+
+def conflation_jobs(store, ProjFol, names=None):
+    """Yields the `render_figures` jobs of the conflation plots recorded in a `ConflationStore`."""
+    for fault_name in (store.names() if names is None else names):
+        if fault_name not in store:
+            print(f"[{fault_name}] No conflation curves recorded, skipping the plot.")
+            continue
+        yield 'conflation', fault_name, {"curves": store.get(fault_name), "ProjFol": ProjFol}
+
+
+def rate_curve_jobs(store, names=None):
+    """Yields the `render_figures` jobs of the cumulative-rate plots recorded in a `RateCurveStore`."""
+    for fault_name in (store.names() if names is None else names):
+        if fault_name not in store:
+            print(f"[{fault_name}] No cumulative rates recorded, skipping the plot.")
+            continue
+        yield 'rates', fault_name, store.get(fault_name)
+
+
+def render_conflation(store, ProjFol, names=None, show=False, max_workers=0):
+    """
+    Draws the conflation plots recorded in a `ConflationStore`.
+
+    Parameters
+    ----------
+    store : ConflationStore
+        Curves recorded by `momentbudget(plots='lazy')`.
+    ProjFol : str
+        Project folder, figures are written to its Figures subfolder.
+    names : list of str, optional
+        Subset of faults to draw. Defaults to every fault in the store.
+    show : bool, optional
+        Call `plt.show()` after each figure (only when drawing in this process).
+    max_workers : int, optional
+        Worker processes used by `render_figures`. 0 (default) draws in this process.
+
+    Returns
+    -------
+    list of str
+        Names of the faults that were drawn.
+    """
+    if show and max_workers == 0:
+        drawn = []
+        for _, fault_name, kwargs in conflation_jobs(store, ProjFol, names):
+            plot_conflation(fault_name, show=True, **kwargs)
+            drawn.append(fault_name)
+        return drawn
+    return render_figures(conflation_jobs(store, ProjFol, names), max_workers=max_workers)
+
+
+def render_rate_curves(store, names=None, max_workers=0):
+    """
+    Draws the cumulative-rate plots recorded in a `RateCurveStore`.
+
+    Parameters
+    ----------
+    store : RateCurveStore
+        Curves recorded by the activity rate models with plots='lazy'.
+    names : list of str, optional
+        Subset of faults to draw. Defaults to every fault in the store.
+    max_workers : int, optional
+        Worker processes used by `render_figures`. 0 (default) draws in this process.
+
+    Returns
+    -------
+    list of str
+        Names of the faults that were drawn.
+    """
+    return render_figures(rate_curve_jobs(store, names), max_workers=max_workers)
@@ -15,355 +15,358 @@
 # along with this program. If not, see <https://www.gnu.org/licenses/>.
 
 
-import math
-import numpy as np
-from numpy.polynomial.polyutils import RankWarning
-import os
-from scipy.stats import norm, invgauss
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from .FQSHA_Functions import TruncatedGR, CHGaussPoiss, CHGaussBPT
-from .FQSHA_Functions import kin2coeff, coeff2mag, conflate_pdfs
 import numpy as np
+from ._lazy import lazy_import
+from .FQSHA_Functions import TruncatedGR, CHGaussPoiss, CHGaussBPT, characteristic_gaussian_rates
+from .FQSHA_Functions import coeff2mag_arrays, conflate_normals
+from .FaultCatalog import fault_columns, field_array, normalize_faults, _to_float
+from .Plotting import check_plot_mode, plot_conflation
+
+stats = lazy_import('scipy.stats')
 #from scipy.integrate import trapezoid
 
 
-def momentbudget(faults, Zeta, Khi, Siggma, ProjFol, logical_nan, logical_nan_sdmag):
-    for fault, values in faults.items():
-        if 'ShearModulus' in values and (values['ShearModulus'] is None):
-            print(f"Fault {fault} has a 'NaN' ShearModulus value.")
-            values['ShearModulus'] = 3 * 1e10
-        else:
-            values['ShearModulus'] = values['ShearModulus'] * 1e10
-
-        if 'StrainDrop' in values and (values['StrainDrop'] is None):
-            values['StrainDrop'] = 3 * 1e-5
-        else:
-            values['StrainDrop'] = values['StrainDrop'] * 1e-5
-
-        if 'Last_eq_time' in values:
-            if values['Last_eq_time'] is None or str(values['Last_eq_time']).lower() == 'nan' or values['Last_eq_time'] == '':
-                if logical_nan:
-                    values['Last_eq_time'] = math.nan
-            else:
-                values['Last_eq_time'] = float(values['Last_eq_time'])
-
-        if 'sdmag' in values:
-            if values['sdmag'] is None or str(values['sdmag']).lower() == 'nan' or values['sdmag'] == '':
-                if logical_nan_sdmag:
-                    values['sdmag'] = math.nan
-            else:
-                values['sdmag'] = float(values['sdmag'])
+# Grid step of the magnitude PDFs conflated by the moment budget
+MAG_STEP = 0.01
+
+
+def _scaling_estimates(columns, sl):
+    """
+    Magnitude estimates of the scaling relationships and fault geometry of the faults in `sl`,
+    the part of the moment budget that does not depend on Zeta, Khi and Siggma.
+    """
+    d = 9.1;  c = 1.5
+    ScR = columns['ScR'][sl]
+    mu = columns['ShearModulus'][sl]
+    straindrop = columns['StrainDrop'][sl]
+    Slipmin = columns['SRmin'][sl]
+    Slipmax = columns['SRmax'][sl]
+
+    Length = columns['Length'][sl] * 1000
+    Width = (columns['Seismogenic_Thickness'][sl] * 1000) / np.sin(np.radians(columns['Dip'][sl]))
+    V = (Slipmin + Slipmax) / 2000
+
+    # Scale-relationship magnitudes from the coefficient registry, grouped by ScR code
+    MRLD, MRA, dMRLD, dMRA, MAR, dMAR, LAR = coeff2mag_arrays(ScR, Length, Width, mu, straindrop)
+    MMO = (1 / c) * (np.log10(straindrop * mu * Length ** 2 * Width) - d)
+    Mround = np.round(np.column_stack([MMO, MAR, MRLD, MRA]) * 100) / 100
+
+    return {
+        "MMO": MMO, "MAR": MAR, "MRLD": MRLD, "MRA": MRA, "LAR": LAR,
+        "dMAR": dMAR, "dMRLD": dMRLD, "dMRA": dMRA, "Mmean": np.nanmean(Mround, axis=1),
+        "Mobs": columns['Mobs'][sl], "sdMobs": columns['sdMobs'][sl], "SCC": columns['SCC'][sl],
+        "mu": mu, "Length": Length, "Width": Width, "V": V, "dV": V - (Slipmin / 1000),
+    }
+
+
+def _conflated_budget(estimates, Zeta, Khi, Siggma):
+    """
+    Conflates the magnitude estimates of `_scaling_estimates` and computes Mmax, sdMmax, Tmean
+    and CV for every (Zeta, Khi, Siggma) combination.
+
+    `Zeta`, `Khi` and `Siggma` are 1-D arrays of the same length C, and the results are
+    (nfault, C) arrays. The parameters only enter through the magnitude deviations, so the
+    magnitude grid (`_grid_budget`) is evaluated once per fault and distinct set of deviations.
+    With C == 1, "grid" holds the per-fault magnitude PDFs.
+    """
+    fault = lambda key: estimates[key][:, None]
+    mag = fault('Mobs')
+    n, ncombination = len(estimates['Mobs']), len(Zeta)
+    dMMO = np.broadcast_to(np.asarray(Siggma, dtype=float), (n, ncombination))
+    broadcast = lambda values: np.broadcast_to(values, (n, ncombination))
+
+    # Observed-magnitude uncertainty (OVCW): widen sdMobs when Mobs is far below the mean
+    dM1 = np.round(np.stack([dMMO] + [broadcast(fault(key)) for key in ('dMAR', 'dMRLD', 'dMRA')],
+                            axis=-1) * 100) / 100
+    gap = np.abs(mag - fault('Mmean'))
+    far = gap > Zeta
+    sdmag = np.where((mag < fault('Mmean')) & far, np.nanmean(dM1, axis=-1) + Khi * gap, fault('sdMobs'))
+
+    # Deviations of the estimates [MMO, MAR, MRLD, MRA, Mobs], one row per (fault, combination)
+    dM = np.round(np.stack([dMMO, broadcast(fault('dMAR')), broadcast(fault('dMRLD')),
+                            broadcast(fault('dMRA')), sdmag], axis=-1) * 100) / 100
+    dM = dM.reshape(n * ncombination, 5)
+    if ncombination == 1:
+        index = inverse = np.arange(n)
+    else:
+        keys = np.column_stack([np.repeat(np.arange(n), ncombination), np.nan_to_num(dM, nan=-1.0)])
+        _, index, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    faults = index // ncombination
+    budget = _grid_budget({key: values[faults] for key, values in estimates.items()}, dM[index])
+
+    results = {key: values[inverse.ravel()].reshape(n, ncombination)
+               for key, values in budget.items() if key != "grid"}
+    results.update({"sdmag": sdmag, "revise": (mag >= fault('Mmean')) & far, "grid": budget["grid"]})
+    return results
+
+
+def _grid_budget(estimates, dM):
+    """
+    Moment budget of faults with the magnitude deviations `dM` (one row of five per fault,
+    for [MMO, MAR, MRLD, MRA, Mobs]), from the magnitude PDFs on a padded 0.01 grid.
+    """
+    d = 9.1;  c = 1.5;  step = MAG_STEP
+    LAR, Length = estimates['LAR'], estimates['Length']
+    n = len(dM)
+
+    # Magnitude PDFs on a padded 0.01 grid, one row per estimate [MMO, MAR, MRLD, MRA, Mobs]
+    M = np.column_stack([estimates[key] for key in ('MMO', 'MAR', 'MRLD', 'MRA', 'Mobs')])
+    rows = np.isfinite(M) & np.isfinite(dM)
+    has_rows = rows.any(axis=1)
+    min_val = np.where(has_rows, np.floor(np.min(np.where(rows, M - dM, np.inf), axis=1)), 0)
+    max_val = np.where(has_rows, np.ceil(np.max(np.where(rows, M + dM, -np.inf), axis=1)), 0)
+    # Same sampling as np.arange(min_val, max_val + step, step)
+    npts = np.ceil(((max_val + step) - min_val) / step).astype(int)
+    grid = np.arange(npts.max()) if n else np.arange(0)
+    x_range_of_mag = min_val[:, None] + grid[None, :] * ((min_val + step) - min_val)[:, None]
+    inside = grid[None, :] < npts[:, None]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pdf_magnitudes = stats.norm.pdf(x_range_of_mag[:, None, :], np.where(rows, M, 0)[:, :, None],
+                                  np.where(rows, dM, 1)[:, :, None])
+        pdf_magnitudes = np.where(inside[:, None, :], pdf_magnitudes, 0.0)
+        pdf_magnitudes /= np.max(pdf_magnitudes, axis=2, keepdims=True)
+
+    # If LAR is greater or equal than Length then the MAR estimate (second row) is not used
+    used = rows & ~((np.cumsum(rows, axis=1) == 2) & (LAR >= Length)[:, None])
+    summed_pdf_magnitudes = np.sum(np.where(used[:, :, None], pdf_magnitudes, 0.0), axis=1)
+
+    # Every estimate is Gaussian, so their conflation is Gaussian too: Mmax is the grid
+    # magnitude closest to the conflated mean (the peak of the conflated PDF)
+    Mconflated, sdconflated = conflate_normals(M, dM, used)
+    delta = (min_val + step) - min_val
+    peak = np.clip(np.rint((Mconflated - min_val) / delta), 0, npts - 1).astype(int)
+    Mmax = np.round(x_range_of_mag[np.arange(n), peak] * 10) / 10
+
+    weights = summed_pdf_magnitudes.sum(axis=1)
+    weighted_mean = (x_range_of_mag * summed_pdf_magnitudes).sum(axis=1) / weights
+    weighted_std = np.sqrt((((x_range_of_mag - weighted_mean[:, None]) ** 2) * summed_pdf_magnitudes).sum(axis=1)
+                           / weights)
+    sigma_Mmax = np.round(weighted_std * 10) / 10
+
+    # Average recurrence time as defined in Field, 1999 and its coefficient of variation
+    mu, V, Width, SCC = estimates['mu'], estimates['V'], estimates['Width'], estimates['SCC']
+    L_forTmean = np.where(LAR >= Length, Length, LAR)
+    Mo = 10 ** (d + c * Mmax)
+    Tmean = np.round(Mo / (mu * V * L_forTmean * Width))
+    Tmean = np.round(Tmean * (1 / SCC))
+    varTep = ((Mo * c * np.log(10) / (mu * V * L_forTmean * Width)) ** 2 * (sigma_Mmax ** 2) +
+              (Mo / (mu * (V ** 2) * L_forTmean * Width)) ** 2 * (estimates['dV'] ** 2))
+    varTep *= (1 / SCC) ** 2
+    alfa = np.sqrt(varTep) / Tmean
+
+    return {
+        "Mmax": Mmax, "sdMmax": sigma_Mmax, "Mmax_weighted": np.round(weighted_mean * 10) / 10,
+        "Tmean": Tmean, "CV": alfa, "MomentRate": Mo / Tmean, "L_forTmean": L_forTmean,
+        "Mconflated": Mconflated, "sdconflated": sdconflated,
+        "grid": {"x_range_of_mag": x_range_of_mag, "npts": npts, "used": used,
+                 "pdf_magnitudes": pdf_magnitudes, "summed_pdf_magnitudes": summed_pdf_magnitudes},
+    }
+
+
+def _momentbudget_chunks(columns, Zeta, Khi, Siggma, chunk_size=512, keep_curves=False):
+    """
+    Computes the moment budget of a fault column table, one chunk of faults at a time.
+
+    Yields ``(slice, results, curves)`` tuples, where `results` holds the arrays described in
+    `momentbudget_arrays` for the faults in `slice` and `curves` is a list with the per-fault
+    magnitude PDFs and their conflation (or None when `keep_curves` is False).
+    """
+    nfault = len(columns['name'])
+
+    for start in range(0, nfault, chunk_size):
+        sl = slice(start, min(start + chunk_size, nfault))
+        names = columns['name'][sl]
+        estimates = _scaling_estimates(columns, sl)
+        budget = _conflated_budget(estimates, np.array([float(Zeta)]), np.array([float(Khi)]),
+                                   np.array([float(Siggma)]))
+        for i in np.flatnonzero(budget['revise'][:, 0]):
+            print(f"[{names[i]}] Warning: Please consider revising the geometry parameters.")
+
+        results = {key: estimates[key] for key in ("MMO", "MAR", "MRLD", "MRA", "LAR", "Width", "V")}
+        results.update({key: values[:, 0] for key, values in budget.items() if key not in ("revise", "grid")})
+        results["Telap"] = columns['year_for_calculations'][sl] - columns['Last_eq_time'][sl]
+
+        curves = None
+        if keep_curves:
+            grid = budget['grid']
+            npts, LAR, Length = grid['npts'], estimates['LAR'], estimates['Length']
+            conflated = stats.norm.pdf(grid['x_range_of_mag'], results['Mconflated'][:, None],
+                                       results['sdconflated'][:, None])
+            curves = [{
+                "x_range_of_mag": grid['x_range_of_mag'][i, :npts[i]],
+                "pdf_magnitudes": grid['pdf_magnitudes'][i, grid['used'][i], :npts[i]],
+                "summed_pdf_magnitudes": grid['summed_pdf_magnitudes'][i, :npts[i]],
+                "conflated": conflated[i, :npts[i]],
+                "MAR_used": bool(LAR[i] < Length[i]),
+                "Mobs": estimates['Mobs'][i],
+                "sdMobs": estimates['sdMobs'][i],
+            } for i in range(len(names))]
+
+        yield sl, results, curves
+
+
+def momentbudget_arrays(columns, Zeta, Khi, Siggma, chunk_size=512):
+    """
+    Computes the moment budget of every fault of a column table in vectorized form.
+
+    Parameters
+    ----------
+    columns : dict
+        Column table from `FaultCatalog.normalize_faults`, with ShearModulus in Pa and
+        StrainDrop dimensionless.
+    Zeta, Khi, Siggma : float
+        OVCW magnitude difference, multiplication factor and Mw(M0) standard deviation.
+    chunk_size : int, optional
+        Number of faults evaluated together on the padded magnitude grid.
+
+    Returns
+    -------
+    dict
+        One array per quantity: MMO, MAR, MRLD, MRA, LAR, Mmax, sdMmax, Tmean, CV,
+        MomentRate, Telap, L_forTmean, Width, V, sdmag (the conflated Mobs deviation) and
+        Mconflated/sdconflated (the closed-form conflation of the magnitude estimates).
+
+    Notes
+    -----
+    - Gives the same values as the per-fault loop of `momentbudget`.
+    - Memory is bounded by `chunk_size` times the widest magnitude grid of a chunk.
+    """
+    nfault = len(columns['name'])
+    budget = {}
+    for sl, results, _ in _momentbudget_chunks(columns, Zeta, Khi, Siggma, chunk_size):
+        for key, values in results.items():
+            if key not in budget:
+                budget[key] = np.empty(nfault)
+            budget[key][sl] = values
+    return budget
+
+
+def momentbudget_sweep(faults, Zeta, Khi, Siggma, chunk_size=512):
+    """
+    Evaluates the moment budget of every fault for every combination of Zeta, Khi and Siggma.
+
+    Parameters
+    ----------
+    faults : dict or FaultCatalog
+        Fault catalog, or a column table from `FaultCatalog.normalize_faults`. It is not modified.
+    Zeta, Khi, Siggma : array_like
+        Grids of the OVCW magnitude difference, multiplication factor and Mw(M0) standard
+        deviation (see `momentbudget`).
+    chunk_size : int, optional
+        Number of (fault, combination) pairs evaluated together on the padded magnitude grid.
+
+    Returns
+    -------
+    dict
+        ``dims`` (``("fault", "Zeta", "Khi", "Siggma")``), the coordinates ``names``, ``Zeta``,
+        ``Khi`` and ``Siggma``, and the arrays ``Mmax``, ``sdMmax``, ``Tmean``, ``CV`` and
+        ``MomentRate`` with shape (nfault, len(Zeta), len(Khi), len(Siggma)).
+
+    Notes
+    -----
+    - Invalid faults are reported and left out, as in `momentbudget`.
+    - The scaling-relationship magnitudes of each fault are computed once and broadcast over
+      the parameter grid; ``sweep["Mmax"][:, i, j, k]`` equals the Mmax of `momentbudget_arrays`
+      run with ``Zeta[i], Khi[j], Siggma[k]``.
+    """
+    columns, errors = normalize_faults(faults)
+    for fault_name, message in zip(errors['name'], errors['message']):
+        print(f"[{fault_name}] {message}")
+    axes = [np.atleast_1d(np.asarray(values, dtype=float)) for values in (Zeta, Khi, Siggma)]
+    Zetas, Khis, Siggmas = (values.ravel() for values in np.meshgrid(*axes, indexing='ij'))
+    shape = tuple(len(values) for values in axes)
+
+    nfault = len(columns['name'])
+    keys = ("Mmax", "sdMmax", "Tmean", "CV", "MomentRate")
+    sweep = {key: np.empty((nfault, len(Zetas))) for key in keys}
+    step = max(1, chunk_size // len(Zetas))
+    for start in range(0, nfault, step):
+        sl = slice(start, min(start + step, nfault))
+        budget = _conflated_budget(_scaling_estimates(columns, sl), Zetas, Khis, Siggmas)
+        for key in keys:
+            sweep[key][sl] = budget[key]
+
+    result = {"dims": ("fault", "Zeta", "Khi", "Siggma"), "names": np.array(columns['name']),
+              "Zeta": axes[0], "Khi": axes[1], "Siggma": axes[2]}
+    result.update({key: values.reshape((nfault,) + shape) for key, values in sweep.items()})
+    return result
+
+
+def momentbudget(faults, Zeta, Khi, Siggma, ProjFol, logical_nan, logical_nan_sdmag, plots='eager',
+                 plot_store=None, progress=None):
+    """
+    Computes the maximum magnitude, recurrence time and moment rate of each fault.
+
+    Parameters
+    ----------
+    faults : dict
+        Dictionary of fault parameters keyed by fault name.
+    Zeta, Khi, Siggma : float
+        OVCW magnitude difference, multiplication factor and Mw(M0) standard deviation.
+    ProjFol : str
+        Project folder for the figures.
+    logical_nan, logical_nan_sdmag : bool
+        Kept for compatibility: empty Last_eq_time values are always read as NaN.
+    plots : {'eager', 'lazy', 'none'}, optional
+        'eager' draws, saves and shows the conflation plot of each fault, 'lazy' only records
+        the curves in `plot_store` for a later `Plotting.render_conflation`, 'none' skips them.
+    plot_store : Plotting.ConflationStore, optional
+        Store filled in 'lazy' mode.
+    progress : callable, optional
+        Called as ``progress(done, total)`` with the number of valid faults processed,
+        after each chunk.
+
+    Returns
+    -------
+    dict
+        The `faults` dictionary, where every valid fault is updated with id, Mmax, sdMmax,
+        Tmean, CV, Telap, MomentRate, L_forTmean, Width and V.
+
+    Notes
+    -----
+    - The catalog is validated and unit-normalized by `FaultCatalog.normalize_faults`, which
+      leaves `faults` untouched, so running twice on the same dictionary gives the same result.
+      Each invalid fault is reported and skipped, then the budget of all valid faults is
+      computed by `momentbudget_arrays` in chunks.
+    - The conflation curves are only computed when `plots` is 'eager' or 'lazy'.
+    """
+    check_plot_mode(plots)
+    if plots == 'lazy' and plot_store is None:
+        raise ValueError("plots='lazy' requires a ConflationStore as plot_store")
+
+    columns, errors = normalize_faults(faults)
+    for fault_name, message in zip(errors['name'], errors['message']):
+        print(f"[{fault_name}] {message}")
+    valid_faults = list(columns['name'])
 
     kk = 1
-    counter = 0
-
-    for fault_name, fault in faults.items():
-        flag_mobs = 0
-        valid_ScR_options = {"WC94-N", "WC94-R", "WC94-S", "WC94-A", "Le10-D", "Le10-S", "Le10-SCR"}
-
-        # Compute Seismogenic_Thickness if it's not already present
-        if 'Seismogenic_Thickness' not in fault:
-            fault['Seismogenic_Thickness'] = fault['lowerSeismoDepth'] - fault['upperSeismoDepth']
-
-        # Extract parameters
-
-        try:
-            # Check and validate ScR
-            ScR = fault['ScR']
-            if not isinstance(ScR, str) or ScR not in valid_ScR_options:
-                print(f"[{fault_name}] ScR type is incorrect, consider revising the input file or invalid value: {ScR}")
-                continue
-            Length = fault['Length']
-            if not isinstance(Length, (float, int)):
-                print(f"[{fault_name}] Length type is incorrect, consider revising the input file: {type(Length).__name__}")
-                continue
-            Slipmin = fault['SRmin']
-            if not isinstance(Slipmin, (float, int)):
-                print(f"[{fault_name}] SRmin type is incorrect, consider revising the input file: {type(Slipmin).__name__}")
-                continue
-            # Check Slipmax
-            Slipmax = fault['SRmax']
-            if not isinstance(Slipmax, (float, int)):
-                print(f"[{fault_name}] SRmax type is incorrect, consider revising the input file: {type(Slipmax).__name__}")
-                continue
-            # Check Seismogenic_Thickness
-            Seismogenic_thickness = fault['Seismogenic_Thickness']
-            if not isinstance(Seismogenic_thickness, int):
-                print(f"[{fault_name}] Seismogenic_Thickness type is incorrect, consider revising the input file: {type(Seismogenic_thickness).__name__}")
-                continue
-            Dip = fault['Dip']
-            if not isinstance(Dip, (float, int)):
-                print(f"[{fault_name}] SRmin type is incorrect, consider revising the input file: {type(Dip).__name__}")
-                continue
-
-            mag = fault['Mobs']
-            if not isinstance(mag, (float, int)):
-                print(f"[{fault_name}] SRmin type is incorrect, consider revising the input file: {type(mag).__name__}")
-                continue
-
-
-            sdmag = fault['sdMobs']
-            Last_eq_time = fault['Last_eq_time']
-            SCC = fault['SCC']
-            ShearModulusFromInputFile = fault['ShearModulus']
-            StrainDropFromInputFile = fault['StrainDrop']
-            yfc = fault['year_for_calculations']
-
-            # Continue with processing...
-            # e.g., print("✅ All inputs OK for", fault_name)
-
-        except KeyError as e:
-            print(f"[{fault_name}] Missing required parameter: {e}")
-            continue
-
-
-
-
-
-
-
-
-
-
-        ScR = fault['ScR']
-        Length = fault['Length']
-        Dip = fault['Dip']
-        Seismogenic_thickness = fault['Seismogenic_Thickness']
-        Slipmin = fault['SRmin']
-        Slipmax = fault['SRmax']
-        mag = fault['Mobs']
-        sdmag = fault['sdMobs']
-        Last_eq_time = fault['Last_eq_time']
-        SCC = fault['SCC']
-        ShearModulusFromInputFile = fault['ShearModulus']
-        StrainDropFromInputFile = fault['StrainDrop']
-        yfc = fault['year_for_calculations']
-
-        if isinstance(Last_eq_time, (int, float)) and not math.isnan(Last_eq_time):
-            Telap = yfc - Last_eq_time
-        else:
-            Telap = np.nan
-
-
-        Telap = yfc - Last_eq_time  # Perform element-wise subtraction
-        mu = ShearModulusFromInputFile;         straindrop = StrainDropFromInputFile;         Dip_radians = math.radians(Dip)  # Convert degrees to radians
-        sine_Dip = math.sin(Dip_radians);        Length = Length * 1000;        Width = (Seismogenic_thickness * 1000) / sine_Dip
-        V = (Slipmin + Slipmax) / 2000;        dV = V - (Slipmin / 1000)
-        # DEFINITION OF COEFFICIENTS coefficients by Hanks & Kanamori, 1985
-        d = 9.1;   c = 1.5;   dMMO = Siggma  # standard deviation of the magnitude calculated by the seismic moment definition
-        # Calculation of the coefficient of the imported scale-relationship
-        coeff, ARtable = kin2coeff(ScR)
-        MRLD, MRA, dMRLD, dMRA, MAR, ar_coeff, LAR, legends_Mw = coeff2mag(ScR, coeff, Length, Width, ARtable, mu,
-                                                                           straindrop)
-        MMO = (1 / c) * (np.log10(straindrop * mu * Length ** 2 * Width) - d)
-        M = np.array([MMO, MAR, MRLD, MRA]);        M = np.round(M * 100) / 100
-        dM1 = np.array([dMMO, ar_coeff[2], dMRLD, dMRA]);        dM1 = np.round(dM1 * 100) / 100
-        M = M[~np.isnan(M)];         dM1 = dM1[~np.isnan(dM1)];         Mmean = np.mean(M)
-        M1 = mag - Mmean
-        # Conflation of Maximum magnitudes
-        sdmagg=sdmag
-        if mag < Mmean:
-            flag_mobs = 1
-            if abs(mag - Mmean) < Zeta:
-                sdmag = sdmag
-            elif abs(mag - Mmean) > Zeta:
-                sdmag = np.mean(dM1) + Khi * abs(mag - Mmean)
-        else:
-            flag_mobs = 1
-            if abs(mag - Mmean) < Zeta:
-                sdmag = sdmag
-            elif abs(mag - Mmean) > Zeta:
-                print('Warning: Please consider revising the geometry parameters.')
-
-        M = [MMO, MAR, MRLD, MRA, mag];        dM = [dMMO, ar_coeff[2], dMRLD, dMRA, sdmag]
-        dM = np.round(np.array(dM) * 100) / 100  # Round to two decimal places
-        # Correctly assigning a row in a NumPy array
-        new_row = np.concatenate(([Length / 1000, LAR / 1000], M, dM)).reshape(1, -1)
-        # Initialize M_dM_Lengths_forLOGoutput or stack the new row on top if it already exists
-        if 'M_dM_Lengths_forLOGoutput' not in locals() or M_dM_Lengths_forLOGoutput.size == 0:
-            M_dM_Lengths_forLOGoutput = new_row
-        else:
-            M_dM_Lengths_forLOGoutput = np.vstack((M_dM_Lengths_forLOGoutput, new_row))
-        # Remove NaN values from M and dM
-        M = [value for value in M if not np.isnan(value)]
-        dM = [value for value in dM if not np.isnan(value)]
-        # Convert M and dM to NumPy arrays if they are not already
-        M = np.array(M)
-        dM = np.array(dM)
-        # Determine the minimum and maximum values considering M and dM
-        min_val = np.floor(np.min(M - dM));
-        max_val = np.ceil(np.max(M + dM))
-        # Create x_range_of_mag with a step of 0.01
-        step = 0.01
-        x_range_of_mag = np.arange(min_val, max_val + step, step)
-        ########################################### Including the n_sigma to truncate magnitudes:
-        # Calculate a probability density function by a normal distribution for each M
-        pdf_magnitudes = []
-        for k in range(len(M)):
-            pdf_magnitudes.append(norm.pdf(x_range_of_mag, M[k], dM[k]))
-        pdf_magnitudes = np.array(pdf_magnitudes)
-        pdf_magnitudes /= np.tile(np.max(pdf_magnitudes, axis=1)[:, np.newaxis], (1, pdf_magnitudes.shape[1]))
-        # calcuate the summed distribution if LAR is greater or equal than Length then LAR is not used
-        if LAR >= Length:
-            pdf_magnitudes = np.delete(pdf_magnitudes, 1, axis=0)
-        summed_pdf_magnitudes = np.sum(pdf_magnitudes, axis=0)
-        ############## Calculate conflated distribution using the previously defined conflate_pdfs function
-        conflated = conflate_pdfs(x_range_of_mag, pdf_magnitudes)
-
-
-
-        if flag_mobs==1:
-            pp= norm.pdf(x_range_of_mag, mag, sdmagg)
-
-            pdf_magnitudes[-1] = pdf_magnitudes[-1] * (np.trapz(pp)/np.trapz(pdf_magnitudes[-1]))
-
-        weighted_mean = np.average(x_range_of_mag, weights=summed_pdf_magnitudes)
-        weighted_std = np.sqrt(np.average((x_range_of_mag - weighted_mean) ** 2, weights=summed_pdf_magnitudes))
-
-        Mmax = weighted_mean
-        sigma_Mmax = weighted_std
-        pdf_test = norm.pdf(x_range_of_mag, Mmax, sigma_Mmax)
-        # Round to the first decimal
-        Mmax = round(Mmax * 10) / 10
-        sigma_Mmax = round(sigma_Mmax * 10) / 10
-        # Output the rounded values
-        print(f"Mmax: {Mmax}, sigma_Mmax: {sigma_Mmax}")
-        if 'output_Mmax_sigmaMmax' not in locals():
-            output_Mmax_sigmaMmax = np.empty((0, 2), float)
-        # Calculate the PDF using the normal distribution
-        gauss_fit = norm.pdf(x_range_of_mag, loc=Mmax, scale=sigma_Mmax)
-        ########################## PLOTS
-        ii = fault_name
-        namefig = 'Conflation_of_PDFs' + str(ii)
-        # Set up the figure with your desired style
-        plt.style.use('dark_background')
-        # plt.style.use('default')
-        plt.figure(figsize=(8, 6))
-        count_pdf = 0
-        plt.plot(x_range_of_mag, pdf_magnitudes[count_pdf, :], linewidth=1.2, linestyle='-', color='blue',
-                 label='Label1')
-        count_pdf += 1
-        if LAR < Length:
-            plt.plot(x_range_of_mag, pdf_magnitudes[count_pdf, :], linewidth=1.4, linestyle='-', color='lime',
-                     label='Label2')
-            count_pdf += 1
-        plt.plot(x_range_of_mag, pdf_magnitudes[count_pdf, :], linewidth=1.0, linestyle='-', color='red',
-                 label='Label3')
-        count_pdf += 1
-        plt.plot(x_range_of_mag, pdf_magnitudes[count_pdf, :], linewidth=1.2, linestyle='-', color='cyan',
-                 label='Label4')
-        count_pdf += 1
-        if not np.isnan(mag):
-            plt.plot(x_range_of_mag, pdf_magnitudes[count_pdf, :], linewidth=1.2, linestyle='-', color='magenta',
-                     label='Label5')
-        plt.plot(x_range_of_mag, summed_pdf_magnitudes, linewidth=1.2, linestyle='--', color='gray', label='Label6')
-        plt.plot(x_range_of_mag, conflated, linewidth=2.0, linestyle='-', color='gold', label='Label7')
-        aa = np.max(conflated)
-        Mmax1 = x_range_of_mag[np.argmax(conflated)]
-
-        # Make Mmax visible by changing the color to white
-        plt.stem(Mmax1, np.max(conflated), linefmt='k-', markerfmt='ko', basefmt=' ')
-        stem_proxy = mpatches.Patch(color='black', label='Mmax')
-        # Check LAR and Length conditions and define legend entries
-        if LAR < Length:
-            if not np.isnan(mag):
-                legendEntries = ['MMo'] + ['MAR'] + legends_Mw + ['MObs', 'SEM', 'CoP', 'Mmax']
-            else:
-                legendEntries = ['MMo'] + ['MAR'] + legends_Mw + ['SEM', 'CoP', 'Mmax']
-        else:
-            if not np.isnan(mag):
-                legendEntries = ['MMo'] + legends_Mw + ['MObs', 'SEM', 'CoP', 'Mmax']
-            else:
-                legendEntries = ['MMo'] + legends_Mw + ['SEM', 'CoP'] + [] + ['Mmax']
-        # Display the legend
-        plt.legend(legendEntries)
-        # plt.plot([Mmax1 - sigma_Mmax, Mmax1 + sigma_Mmax], [np.max(conflated), np.max(conflated)], linewidth=1.5,
-        #          linestyle='-.', color='black')
-        plt.fill_between(x_range_of_mag, 0, conflated, color='gold', alpha=0.25)
-        plt.xlabel('Magnitude', fontsize=14, fontname='DejaVu Serif')
-        plt.ylabel('Probability density function', fontsize=14, fontname='DejaVu Serif')
-        plt.title(fault_name)
-        # Plot settings:
-        # plt.ylim(0,)
-        # plt.xlim(5,)
-        plt.xlim(x_range_of_mag.min(), x_range_of_mag.max())
-        plt.subplots_adjust(left=0.075, right=0.98, top=0.96, bottom=0.1)  # Adjust margins of the plot
-        # Save the figure
-
-        if len(ProjFol) > 0:
-            figure_name = "./" + ProjFol + "/Figures/" + namefig + '.pdf'
-            if not os.path.exists("./" + ProjFol + "/Figures/"):
-                # If it doesn't exist, create it
-                os.makedirs("./" + ProjFol + "/Figures/")
-        else:
-            figure_name = "./" + 'output_files' + "/Figures/" + namefig + '.pdf'
-            if not os.path.exists("./" + 'output_files' + "/Figures/"):
-                # If it doesn't exist, create it
-                os.makedirs("./" + 'output_files' + "/Figures/")
-
-
-
-        Mmax1 = round(Mmax1 * 10) / 10
-        Mmax = Mmax1
-        # Save the figure
-        plt.savefig(namefig + '.pdf', dpi=1200, bbox_inches='tight')  # Adjust the DPI value as needed
-        
-        Mmax1 = round(Mmax1 * 10) / 10
-        Mmax = Mmax1
-        # Save the figure
-        plt.savefig(namefig + '.png', dpi=600)  # Save the figure as a PNG file
-        plt.show()
-
-        if LAR >= Length:
-            L_forTmean = Length
-        else:
-            L_forTmean = LAR
-
-
-        # Calculate Tmean
-        Mmax=Mmax1
-        # sigma_Mmax=0.5
-        # Mmax=7.1
-        output_Mmax_sigmaMmax = np.vstack([output_Mmax_sigmaMmax, [Mmax, sigma_Mmax]])
-        Tmean = np.round(10 ** (d + c * Mmax) / (mu * V * L_forTmean * Width))  # Average recurrence time as defined in Field, 1999
-        Tmean = np.round(Tmean * (1 / SCC))
-        # Initialize Tep and varTep
-        Tep = np.empty_like(Mmax)
-        varTep = np.empty_like(Mmax)
-        # Calculate Tep
-        Tep = (10 ** (d + c * Mmax) / (mu * V * L_forTmean * Width) +
-               (10 ** (d + c * Mmax) * c * np.log(10) / (mu * V * L_forTmean * Width)) * sigma_Mmax -
-               10 ** (d + c * Mmax) / (mu * (V ** 2) * L_forTmean * Width) * dV)
-        # Scale Tep by 1/SCC
-        Tep *= (1 / SCC)
-        # Calculate varTep
-        varTep = ((10 ** (d + c * Mmax) * c * np.log(10) / (mu * V * L_forTmean * Width)) ** 2 * (sigma_Mmax ** 2) +
-                  (10 ** (d + c * Mmax) / (mu * (V ** 2) * L_forTmean * Width)) ** 2 * (dV ** 2))
-        # Scale varTep by (1/SCC)^2
-        varTep *= (1 / SCC) ** 2
-        # Calculate e
-        e = np.sqrt(varTep)
-        # Calculate alfa
-        alfa = e / Tmean
-        # Calculate MomentRate
-        MomentRate = 10 ** (d + c * Mmax) / Tmean
-        fault_data = {}
-        # Assuming 'i' is an index variable
-         # You can replace this with your actual index
-        # Create a dictionary to store fault data
-        fault_data = {
-            "id": kk,  # Your 'i' index
-            "Mmax": output_Mmax_sigmaMmax[kk - 1][0],  # Adjust the index, assuming 1-based indexing
-            "sdMmax": output_Mmax_sigmaMmax[kk - 1][1],  # Adjust the index
-            "Tmean": Tmean,
-            "CV": alfa,
-            "Telap": Telap,
-            "MomentRate": MomentRate.tolist()  # Convert MomentRate to a Python list
-        }
-        kk=kk+1
-        # Adding the outputs of the moment budget to the faults dictionary
-        faults[fault_name].update(fault_data)
+    chunks = _momentbudget_chunks(columns, Zeta, Khi, Siggma, keep_curves=(plots != 'none'))
+    for sl, results, curves in chunks:
+        for j, fault_name in enumerate(columns['name'][sl]):
+            print(f"Mmax: {results['Mmax_weighted'][j]}, sigma_Mmax: {results['sdMmax'][j]}")
+            if plots == 'eager':
+                plot_conflation(fault_name, curves[j], ProjFol)
+            elif plots == 'lazy':
+                plot_store.add(fault_name, curves[j])
+
+            # Adding the outputs of the moment budget to the faults dictionary
+            faults[fault_name].update({
+                "id": kk,
+                "Mmax": results['Mmax'][j],
+                "sdMmax": results['sdMmax'][j],
+                "Tmean": results['Tmean'][j],
+                "CV": results['CV'][j],
+                "Telap": results['Telap'][j],
+                "MomentRate": float(results['MomentRate'][j]),
+                "L_forTmean": results['L_forTmean'][j],
+                "Width": results['Width'][j],
+                "V": results['V'][j],
+            })
+            kk = kk + 1
+
+        if progress is not None:
+            progress(sl.stop, len(valid_faults))
 
     return faults
 
@@ -372,7 +375,184 @@ def momentbudget(faults, Zeta, Khi, Siggma, ProjFol, logical_nan, logical_nan_sd
 
 
 
-def sactivityrate(faults, Fault_behaviour, w, bin, ProjFol):
+def _recurrence_time(mag, sdmag, MomentRate, bin, kernel=None):
+    """
+    Moment-balanced recurrence time above Mmax - sdMmax, for every fault at once.
+
+    `kernel` is ``characteristic_gaussian_rates(mag, sdmag, bin)``, computed when not given.
+    """
+    nfault = len(mag)
+    if kernel is None:
+        kernel = characteristic_gaussian_rates(mag, sdmag, bin)
+    _, offsets, unit_rates = kernel
+    segment = np.repeat(np.arange(nfault), np.diff(offsets))
+    CumRateMmin = np.asarray(MomentRate, dtype=float) * np.bincount(segment, weights=unit_rates, minlength=nfault)
+    with np.errstate(divide='ignore'):
+        Tm = 1 / CumRateMmin
+    Tm[offsets[1:] == offsets[:-1]] = np.nan
+    return Tm
+
+
+def elapsed_time(fault):
+    """
+    Years since the last earthquake of one fault dictionary, as set in "Telap" by
+    `momentbudget` (NaN when Last_eq_time is unknown). `sactivityrate` uses the BPT model
+    when the elapsed time of the last fault is set.
+    """
+    return _to_float(fault.get('year_for_calculations')) - _to_float(fault.get('Last_eq_time'))
+
+
+def _bpt_probability(Tm, Telap, CV, w):
+    """
+    BPT probability of an event in the next `w` years given `Telap` years without one.
+
+    All arguments broadcast together. NaN elapsed times give a probability of 0.
+    """
+    Tm, Telap, CV, w = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (Tm, Telap, CV, w)))
+    known = ~np.isnan(Telap)
+    Hbpt = np.zeros(Telap.shape)
+    scale = Tm[known] / (CV[known] ** 2)
+    Hbpt_a1 = stats.invgauss.cdf((Telap[known] + w[known]) / scale, mu=Tm[known] / scale)
+    Hbpt_a2 = stats.invgauss.cdf(Telap[known] / scale, mu=Tm[known] / scale)
+    Hbpt[known] = np.minimum((Hbpt_a1 - Hbpt_a2) / (1 - Hbpt_a2), 1)
+    return Hbpt
+
+
+def _poisson_probability(Tm, w):
+    """Poisson probability of an event in the next `w` years, broadcasting `Tm` against `w`."""
+    return np.minimum(1 - np.exp(-1 * np.asarray(w, dtype=float) * (1 / np.asarray(Tm, dtype=float))), 1)
+
+
+def sactivityrate_arrays(mag, sdmag, MomentRate, Telap, CV, w, bin, ids=None, kernel=None):
+    """
+    Computes the recurrence time and the BPT/Poisson probabilities of every fault at once.
+
+    Parameters
+    ----------
+    mag, sdmag : ndarray
+        Maximum magnitude and its standard deviation.
+    MomentRate : ndarray
+        Seismic moment rate (N·m/yr).
+    Telap : ndarray
+        Time elapsed since the last earthquake (years), NaN when unknown.
+    CV : ndarray
+        Coefficient of variation (aperiodicity) of the BPT model.
+    w : float
+        Time window (years) for hazard calculation.
+    bin : float
+        Magnitude bin size for probability density function evaluation.
+    ids : ndarray, optional
+        Fault ids quoted in the warnings. Defaults to the fault index.
+    kernel : tuple, optional
+        ``characteristic_gaussian_rates(mag, sdmag, bin)``, to share it with the rate exporters.
+
+    Returns
+    -------
+    dict
+        ``Tm`` (moment-balanced recurrence time above Mmax - sdMmax), ``Telap`` (capped at
+        10 * Tm), ``Hbpt`` (0 where Telap is unknown) and ``Hpois``.
+
+    Notes
+    -----
+    - The magnitude ranges of all faults are evaluated as one ragged array, and each
+      `invgauss.cdf` term is a single call over the whole catalog.
+    """
+    mag = np.asarray(mag, dtype=float)
+    sdmag = np.asarray(sdmag, dtype=float)
+    MomentRate = np.asarray(MomentRate, dtype=float)
+    Telap = np.array(Telap, dtype=float)
+    CV = np.asarray(CV, dtype=float)
+    if ids is None:
+        ids = np.arange(len(mag))
+
+    Tm = _recurrence_time(mag, sdmag, MomentRate, bin, kernel=kernel)
+
+    capped = ~np.isnan(Telap) & (Telap > 10 * Tm)
+    for i in np.flatnonzero(capped):
+        print(f'Warning: Telap for fault id {ids[i]} is forced to be equal to 10*Tm to avoid computational problems')
+    Telap[capped] = 10 * Tm[capped]
+
+    Hbpt = _bpt_probability(Tm, Telap, CV, w)
+    Hpois = _poisson_probability(Tm, w)
+    return {"Tm": Tm, "Telap": Telap, "Hbpt": Hbpt, "Hpois": Hpois}
+
+
+def probability_cube(faults, windows, years=None, bin=0.1):
+    """
+    Computes BPT and Poisson probabilities for many time windows and forecast years at once.
+
+    Parameters
+    ----------
+    faults : dict
+        Dictionary of fault parameters after `momentbudget` (Mmax, sdMmax, MomentRate, CV,
+        Last_eq_time and year_for_calculations are used).
+    windows : array_like
+        Time windows (years), e.g. ``[1, 5, 10, 30, 50, 100]``.
+    years : array_like, optional
+        Forecast years. Defaults to the ``year_for_calculations`` of each fault, giving a
+        single year column.
+    bin : float, optional
+        Magnitude bin size for probability density function evaluation.
+
+    Returns
+    -------
+    dict
+        ``names``, ``windows``, ``years``, ``Tm`` (nfault,), ``Hbpt`` with shape
+        (nfault, nwindow, nyear) and ``Hpois`` with shape (nfault, nwindow), the Poisson
+        model being independent of the forecast year.
+
+    Notes
+    -----
+    - The elapsed time ``year - Last_eq_time`` is capped at 10 * Tm as in `sactivityrate`,
+      and faults without a last earthquake get Hbpt = 0.
+    - For a single window `w` and default years, Hbpt[:, 0, 0] and Hpois[:, 0] equal the
+      probabilities of `sactivityrate_arrays`.
+    """
+    names = list(faults.keys())
+    columns = fault_columns(faults, names)
+    fields = {key: np.array([_to_float(faults[name].get(key)) for name in names])
+              for key in ('Mmax', 'sdMmax', 'MomentRate', 'CV')}
+    windows = np.atleast_1d(np.asarray(windows, dtype=float))
+
+    Tm = _recurrence_time(fields['Mmax'], fields['sdMmax'], fields['MomentRate'], bin)
+    if years is None:
+        years = np.array([np.nan])
+        Telap = (columns['year_for_calculations'] - columns['Last_eq_time'])[:, None]
+    else:
+        years = np.atleast_1d(np.asarray(years, dtype=float))
+        Telap = years[None, :] - columns['Last_eq_time'][:, None]
+
+    capped = Telap > 10 * Tm[:, None]
+    for i in np.flatnonzero(capped.any(axis=1)):
+        print(f'Warning: Telap for fault {names[i]} is forced to be equal to 10*Tm to avoid computational problems')
+    Telap = np.where(capped, 10 * Tm[:, None], Telap)
+
+    Hbpt = _bpt_probability(Tm[:, None, None], Telap[:, None, :], fields['CV'][:, None, None],
+                            windows[None, :, None])
+    Hpois = _poisson_probability(Tm[:, None], windows[None, :])
+    return {"names": np.array(names), "windows": windows, "years": years,
+            "Tm": Tm, "Hbpt": Hbpt, "Hpois": Hpois}
+
+
+def save_probability_cube(filename, cube):
+    """
+    Writes a `probability_cube` result to a compressed ``.npz`` file.
+
+    Probabilities are stored as float32. Returns the path written.
+    """
+    np.savez_compressed(filename, names=cube["names"].astype(str), windows=cube["windows"],
+                        years=cube["years"], Tm=cube["Tm"],
+                        Hbpt=cube["Hbpt"].astype(np.float32), Hpois=cube["Hpois"].astype(np.float32))
+    return filename if str(filename).endswith('.npz') else f"{filename}.npz"
+
+
+def load_probability_cube(filename):
+    """Reads a probability cube written by `save_probability_cube`."""
+    with np.load(filename) as data:
+        return {key: data[key] for key in data.files}
+
+
+def sactivityrate(faults, Fault_behaviour, w, bin, ProjFol, plots='eager', plot_store=None, sink=None, bpt=None):
 
     """
     Computes the seismic activity rate for each fault, including characteristic or Gutenberg-Richter behavior,
@@ -390,6 +570,18 @@ def sactivityrate(faults, Fault_behaviour, w, bin, ProjFol):
         Magnitude bin size for probability density function evaluation.
     ProjFol : str
         Path to the directory for output files and plots.
+    plots : {'eager', 'lazy', 'none'}, optional
+        'eager' draws the cumulative-rate plot of each fault, 'lazy' records the curves in
+        `plot_store` for a later `Plotting.render_rate_curves`, 'none' skips them.
+    plot_store : Plotting.RateCurveStore, optional
+        Store filled in 'lazy' mode.
+    sink : OutputSinks.OutputSink, optional
+        Writer of the rate and probability tables (`OutputSinks.make_sink`), by default
+        text files in 'output_files'.
+    bpt : bool, optional
+        Probabilities of the characteristic Gaussian model from the BPT (True) or Poisson
+        (False) model. By default BPT when the elapsed time of the last fault is set; pass
+        it to keep one model for all the chunks of a catalog (see `elapsed_time`).
 
     Returns
     -------
@@ -401,90 +593,69 @@ def sactivityrate(faults, Fault_behaviour, w, bin, ProjFol):
     - Uses input magnitude distribution to estimate moment balancing and recurrence rates.
     - Supports both time-dependent (BPT) and time-independent (Poisson) hazard models.
     - Calls external plotting and PDF-construction functions depending on fault behavior.
+    - The XML sources are not written here: export the returned faults with
+      `export_faults_to_xml` or `export_source_model`.
+    - Faults without an id (rejected by `momentbudget`) are left unchanged.
 
     """
 
+    check_plot_mode(plots)
+    if plots == 'lazy' and plot_store is None:
+        raise ValueError("plots='lazy' requires a RateCurveStore as plot_store")
+
+    id = field_array(faults, 'id')
+    rejected = np.isnan(id)
+    if rejected.any():
+        # Faults rejected by the moment budget have no id and get no rates
+        names = list(faults.keys())
+        budgeted = {names[i]: faults[names[i]] for i in np.flatnonzero(~rejected)}
+        if budgeted:
+            sactivityrate(budgeted, Fault_behaviour, w, bin, ProjFol, plots=plots, plot_store=plot_store, sink=sink,
+                          bpt=bpt)
+        return faults
+
     d = 9.1;  c = 1.5
-    field_names = list(faults.keys())
-    nfault = len(field_names)
-    # Assuming 'faults' is your dictionary
-    field_names = list(faults.keys())
-    # Initializing arrays
-    id = np.empty(len(field_names))
-    mag = np.empty(len(field_names))
-    sdmag = np.empty(len(field_names))
-    Tmean = np.empty(len(field_names))
-    alpha_val = np.empty(len(field_names))
-    Telapsed = []
-    Morate_input = np.empty(len(field_names))
-    # ProbabilityOfOccurrence and Max_Telap aren't used in your MATLAB code
-    fault_name = []
-    idgr = np.empty(len(field_names))
-    mt = np.empty(len(field_names))
-    b = np.empty(len(field_names))
-    # Iterate over each fault
-    for i, field_name in enumerate(field_names):
-        sub_struct = faults[field_name]
-        id[i] = sub_struct.get('id', np.nan)
-        mag[i] = sub_struct.get('Mmax', np.nan)
-        sdmag[i] = sub_struct.get('sdMmax', np.nan)
-        Morate_input[i] = sub_struct.get('MomentRate', np.nan)
-        Tmean[i] = sub_struct.get('Tmean', np.nan)
-        Telapsed.append(faults[field_name]['Telap'])
-        alpha_val[i] = sub_struct.get('CV', np.nan)
-        idgr[i] = sub_struct.get('id', np.nan)
-        mt[i] = sub_struct.get('Mmin', np.nan)
-        b[i] = sub_struct.get('b-value', np.nan)
-        fault_name.append(field_name)
+    fault_name = list(faults.keys())
+    nfault = len(fault_name)
+    # Parameter columns, read without copying from a FaultCatalog
+    mag = field_array(faults, 'Mmax')
+    sdmag = field_array(faults, 'sdMmax')
+    Morate_input = field_array(faults, 'MomentRate')
+    Tmean = field_array(faults, 'Tmean')
+    Telapsed = field_array(faults, 'Telap', default=None)
+    alpha_val = field_array(faults, 'CV')
+    mt = field_array(faults, 'Mmin')
+    b = field_array(faults, 'b-value')
 
     Morate_fromTmean = 10 ** (c * mag + d) / Tmean
     Tmean_fromMorate = np.round(10 ** (c * mag + d) / Morate_input).astype(int)
 
     Morate = Morate_fromTmean
 
-    for i in range(nfault):
-        if Morate_fromTmean[i] != Morate_input[i]:
-            print(
-                f"Warning: Mo rate computed using M and Tmean for the fault # {i} is {Morate_fromTmean[i]:.4e}, different from Mo rate given in the input {Morate_input[i]:.4e}")
-    Hbpt = np.zeros(nfault)  # Initialize the Hbpt array
-    Hpois = np.zeros(nfault)
-    for i in range(nfault):
-        # sdmag[i]=0.5
-        magnitude_range = np.arange(mag[i] - sdmag[i], mag[i] + sdmag[i] + bin, bin)
-        M = 10 ** (c * magnitude_range + d)
-        pdf_mag = norm.pdf(magnitude_range, mag[i], sdmag[i])
-        total_moment = np.sum(pdf_mag * M)
-        ratio = Morate_input[i] / total_moment
-        balanced_pdf_moment = ratio * pdf_mag
-        CumRateMmin = np.sum(balanced_pdf_moment)
-        Tm = 1 / CumRateMmin
-
-        Telap = Telapsed[i]
-        if not np.isnan(Telap):
-            if Telap > 10 * Tm:
-                Telap = 10 * Tm
-                print(
-                    f'Warning: Telap for fault id {id[i]} is forced to be equal to 10*Tm to avoid computational problems')
-            alpha = alpha_val[i]
-
-            scale = Tm / (alpha ** 2)
-            # In Python: using scipy.stats.invgauss
-            Hbpt_a1 = invgauss.cdf((Telap + w) / scale, mu=Tm / scale)
-            Hbpt_a2 = invgauss.cdf((Telap) / scale, mu=Tm / scale)
-            Hbpt[i] = (Hbpt_a1 - Hbpt_a2) / (1 - Hbpt_a2)
-            if Hbpt[i] > 1:
-                Hbpt[i] = 1
-
-        # Assuming i, w, and Tm are defined earlier in your code
-        Hpois[i] = 1 - np.exp(-1 * w * (1 / Tm))
-        Hpois[Hpois > 1] = 1
-
-    if Fault_behaviour == "Characteristic Gaussian" and Telapsed[i]:
+    for i in np.flatnonzero(Morate_fromTmean != Morate_input):
+        print(
+            f"Warning: Mo rate computed using M and Tmean for the fault # {i} is {Morate_fromTmean[i]:.4e}, different from Mo rate given in the input {Morate_input[i]:.4e}")
+    # One characteristic Gaussian kernel for the probabilities and the rate exporters
+    kernel = characteristic_gaussian_rates(mag, sdmag, bin)
+    probabilities = sactivityrate_arrays(mag, sdmag, Morate_input, Telapsed, alpha_val, w, bin, ids=id,
+                                         kernel=kernel)
+    Hbpt = probabilities["Hbpt"]
+    Hpois = probabilities["Hpois"]
+
+    # BPT when the elapsed time of the last fault is set, as in the original dispatch
+    if bpt is None:
+        bpt = bool(Telapsed[-1])
+    if Fault_behaviour == "Characteristic Gaussian" and bpt:
         # bin=0.2
-        CHGaussBPT(faults, c, d, ProjFol, fault_name, mag, sdmag, Tmean, Morate, id, nfault, w, Hbpt, bin)
-    elif Fault_behaviour == "Characteristic Gaussian" and ~Telapsed[i]:
-        CHGaussPoiss(faults, c, d, ProjFol, fault_name, mag, sdmag, Morate, id, nfault, w, Hpois, bin)
+        CHGaussBPT(faults, c, d, ProjFol, fault_name, mag, sdmag, Tmean, Morate, id, nfault, w, Hbpt, bin,
+                   plots=plots, plot_store=plot_store, kernel=kernel, sink=sink)
+    elif Fault_behaviour == "Characteristic Gaussian" and not bpt:
+        CHGaussPoiss(faults, c, d, ProjFol, fault_name, mag, sdmag, Morate, id, nfault, w, Hpois, bin,
+                     plots=plots, plot_store=plot_store, kernel=kernel, sink=sink)
     elif Fault_behaviour == "Truncated Gutenberg Richter":
-        TruncatedGR(faults, c, d, ProjFol, fault_name, mag, mt, Morate, id, nfault, bin, b)
+        TruncatedGR(faults, c, d, ProjFol, fault_name, mag, mt, Morate, id, nfault, bin, b,
+                    plots=plots, plot_store=plot_store, sink=sink)
     else:
         print("wrong case")
+
+    return faults
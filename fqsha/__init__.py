@@ -4,8 +4,12 @@ import numpy as np
 # Temporary patch for openquake bug
 setattr(np, 'RankWarning', UserWarning)
 
-from .FQSHA import main
+
+def main():
+    """Starts the FQSHA graphical interface (PyQt5 is only imported here)."""
+    from .FQSHA import main as gui_main
+    return gui_main()
+
 
 if __name__ == "__main__":
     main()
-
@@ -1,5 +1,6 @@
-from .FQSHA import main
+import sys
 
-if __name__ == "__main__":
-    main()
+from .cli import main
 
+if __name__ == "__main__":
+    sys.exit(main())
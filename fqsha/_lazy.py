@@ -0,0 +1,57 @@
+# FQSHA - Fault-based Seismic Hazard Assessment Toolkit
+# Copyright (C) 2025 Tavakolizadeh et al., (2025)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# _lazy.py
+
+"""
+Deferred imports of the heavy dependencies (scipy.stats, matplotlib.pyplot, pandas, pygmt).
+
+    plt = lazy_import('matplotlib.pyplot')
+
+binds a placeholder module; the real module is imported the first time one of its
+attributes is used, so importing fqsha stays cheap in worker processes and on the CLI.
+"""
+
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Placeholder for a module that is imported on first attribute access."""
+
+    def _load(self):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return module
+
+    def __getattr__(self, attr):
+        # Only called for attributes not yet copied from the real module
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        loaded = "loaded" if self.__name__ in sys.modules else "not loaded"
+        return f"<lazy module '{self.__name__}' ({loaded})>"
+
+
+def lazy_import(name):
+    """Returns module `name`, or a `LazyModule` placeholder if it has not been imported yet."""
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
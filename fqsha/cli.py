@@ -0,0 +1,134 @@
+# FQSHA - Fault-based Seismic Hazard Assessment Toolkit
+# Copyright (C) 2025 Tavakolizadeh et al., (2025)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+# cli.py
+
+"""
+Command-line entry point.
+
+    fqsha run config.json [--output-folder DIR] [--chunk-size N] [--no-openquake] [--no-map]
+    fqsha preview config.json [--output-folder DIR] [--mesh-spacing KM] [--grid-spacing KM] [--no-map]
+    fqsha convert Faults.json catalog_dir     (or catalog_dir Faults.json)
+    fqsha gui
+
+Without arguments the graphical interface is started. The ``run`` command never imports PyQt5.
+"""
+
+import argparse
+import sys
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="fqsha",
+                                     description="FQSHA: Fault-based Seismic Hazard Assessment")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run = subparsers.add_parser("run", help="run the FQSHA workflow headless from a JSON configuration")
+    run.add_argument("config", help="JSON configuration file (see Pipeline.DEFAULT_SETTINGS)")
+    run.add_argument("--output-folder", help="override the output folder of the configuration")
+    run.add_argument("--plots", choices=["none", "lazy", "eager"], help="override the plotting mode")
+    run.add_argument("--output-format", choices=["text", "npz", "parquet", "hdf5"],
+                     help="format of the activity rate and probability tables (default text)")
+    run.add_argument("--output-root", help="folder of the activity rate tables (default output_files)")
+    run.add_argument("--chunk-size", type=int,
+                     help="stream the fault file, processing this many faults at a time")
+    run.add_argument("--no-openquake", action="store_true",
+                     help="only write the OpenQuake inputs, do not run the engine")
+    run.add_argument("--no-map", action="store_true", help="do not draw the hazard map")
+
+    preview = subparsers.add_parser("preview", help="compute a quick PGA hazard preview with NumPy instead of "
+                                                    "running OpenQuake")
+    preview.add_argument("config", help="JSON configuration file (see Pipeline.DEFAULT_SETTINGS)")
+    preview.add_argument("--output-folder", help="override the output folder of the configuration")
+    preview.add_argument("--chunk-size", type=int,
+                         help="stream the fault file, processing this many faults at a time")
+    preview.add_argument("--mesh-spacing", type=float, default=1.0, help="rupture mesh spacing in km (default 1)")
+    preview.add_argument("--grid-spacing", type=float, help="site spacing in km (default: the configuration's)")
+    preview.add_argument("--no-map", action="store_true", help="do not draw the hazard map")
+
+    convert = subparsers.add_parser("convert", help="convert a JSON fault file to a columnar catalog folder, "
+                                                    "or a catalog folder back to JSON")
+    convert.add_argument("source", help="JSON fault file or columnar catalog folder")
+    convert.add_argument("destination", help="output catalog folder or JSON file")
+
+    subparsers.add_parser("gui", help="start the graphical interface")
+    return parser
+
+
+def run_command(args):
+    from .Pipeline import load_config, run_pipeline
+
+    settings, faults = load_config(args.config, chunk_size=args.chunk_size)
+    if args.output_folder:
+        settings["output_folder"] = args.output_folder
+    if args.plots:
+        settings["plots"] = args.plots
+    if args.output_format:
+        settings["output_format"] = args.output_format
+    if args.output_root:
+        settings["output_root"] = args.output_root
+    if args.no_openquake:
+        settings["run_openquake"] = False
+    if args.no_map:
+        settings["create_map"] = False
+    run_pipeline(settings, faults)
+    return 0
+
+
+def preview_command(args):
+    from .Pipeline import load_config, run_preview
+
+    settings, faults = load_config(args.config, chunk_size=args.chunk_size)
+    if args.output_folder:
+        settings["output_folder"] = args.output_folder
+    if args.no_map:
+        settings["create_map"] = False
+    run_preview(settings, faults, mesh_spacing=args.mesh_spacing, grid_spacing=args.grid_spacing)
+    return 0
+
+
+def convert_command(args):
+    import json
+    from .FaultCatalog import is_catalog, load_catalog, catalog_to_faults, save_catalog
+
+    if is_catalog(args.source):
+        faults = catalog_to_faults(load_catalog(args.source))
+        with open(args.destination, 'w') as f:
+            json.dump(faults, f, indent=4)
+    else:
+        with open(args.source, 'r') as f:
+            faults = json.load(f)
+        save_catalog(faults, args.destination)
+    print(f"Converted {len(faults)} faults to {args.destination}")
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "run":
+        return run_command(args)
+    if args.command == "preview":
+        return preview_command(args)
+    if args.command == "convert":
+        return convert_command(args)
+
+    from .FQSHA import main as gui_main
+    return gui_main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import json
+import os
+import tempfile
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+FAULTS_FILE = os.path.join(TEST_DIR, 'Faults_test.json')
+
+
+def load_test_faults():
+    """Fault dictionary of Faults_test.json, a new copy on each call."""
+    with open(FAULTS_FILE) as f:
+        return json.load(f)
+
+
+class FaultsTestCase(unittest.TestCase):
+    """
+    Test case with the test faults in ``self.faults``, run in the temporary directory
+    ``self.tmp`` as working directory (restored after each test).
+    """
+
+    def setUp(self):
+        self.test_dir = TEST_DIR
+        self.faults = load_test_faults()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.tmp.name)
@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                      'benchmarks', 'run_benchmarks.py')
+
+
+@unittest.skipUnless(os.path.isfile(SCRIPT), "benchmarks are not part of the installed package")
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_script(self, *args):
+        return subprocess.run([sys.executable, SCRIPT, '--sizes', '10', '--repeat', '1', *args],
+                              cwd=self.tmp.name, capture_output=True, text=True, timeout=600)
+
+    def test_results_and_comparison(self):
+        output = os.path.join(self.tmp.name, 'results.json')
+        process = self.run_script('--output', output)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        with open(output) as f:
+            results = json.load(f)
+        stages = {r["stage"] for r in results["results"]}
+        self.assertEqual(stages, {"momentbudget", "sactivityrate[CG-BPT]", "sactivityrate[CG-Poisson]",
+                                  "sactivityrate[TGR]", "conflate_pdfs", "export_faults_to_xml",
+                                  "generate_job_ini"})
+        for result in results["results"]:
+            self.assertEqual(result["faults"], 10)
+            self.assertGreater(result["seconds"], 0)
+            self.assertGreaterEqual(result["peak_mb"], 0)
+
+        # A baseline much faster than any run is reported as a regression
+        for result in results["results"]:
+            result["seconds"] = 1e-9
+        with open(output, 'w') as f:
+            json.dump(results, f)
+        process = self.run_script('--no-memory', '--compare', output)
+        self.assertEqual(process.returncode, 1)
+        self.assertIn("slower", process.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import copy
+import json
+import os
+import unittest
+
+import matplotlib
+matplotlib.use("Agg")
+
+from fqsha import Pipeline
+from fqsha.Cache import ResultCache, _json_default
+
+from _fixtures import FaultsTestCase
+
+
+def _dump(faults):
+    return json.dumps(faults, sort_keys=True, default=_json_default)
+
+
+class TestResultCache(FaultsTestCase):
+    def _settings(self, fault_behaviour, cache_folder=None):
+        settings = dict(Pipeline.DEFAULT_SETTINGS)
+        settings.update({"fault_behaviour": fault_behaviour, "cache_folder": cache_folder})
+        return settings
+
+    def test_cached_run_matches_uncached(self):
+        for fault_behaviour in ["Characteristic Gaussian", "Truncated Gutenberg Richter"]:
+            with self.subTest(fault_behaviour=fault_behaviour):
+                cache_folder = os.path.join(self.tmp.name, fault_behaviour)
+                expected = Pipeline.run_seismic_activity(copy.deepcopy(self.faults), self._settings(fault_behaviour))
+
+                first = Pipeline.run_seismic_activity(copy.deepcopy(self.faults),
+                                                      self._settings(fault_behaviour, cache_folder))
+                self.assertEqual(_dump(first), _dump(expected))
+                self.assertEqual(len(ResultCache(cache_folder)), len(self.faults))
+
+                # Everything is served from the cache, then only the changed fault is recomputed
+                second = Pipeline.run_seismic_activity(copy.deepcopy(self.faults),
+                                                       self._settings(fault_behaviour, cache_folder))
+                self.assertEqual(_dump(second), _dump(expected))
+
+                changed = copy.deepcopy(self.faults)
+                name = next(iter(changed))
+                changed[name]["SRmax"] = float(changed[name]["SRmax"]) * 1.5
+                third = Pipeline.run_seismic_activity(changed, self._settings(fault_behaviour, cache_folder))
+                self.assertNotEqual(third[name]["MomentRate"], expected[name]["MomentRate"])
+                for other in list(changed)[1:]:
+                    self.assertEqual(_dump(third[other]), _dump(expected[other]))
+                self.assertEqual(len(ResultCache(cache_folder)), len(self.faults) + 1)
+
+    def test_tables_cover_cached_faults(self):
+        cache_folder = os.path.join(self.tmp.name, 'cache')
+        table = os.path.join('output_files', 'output_files_SAR_TruncatedGR.txt')
+        settings = self._settings("Truncated Gutenberg Richter", cache_folder)
+        expected = Pipeline.run_seismic_activity(copy.deepcopy(self.faults), settings)
+        with open(table) as f:
+            rows = f.read().splitlines()[1:]
+        ids = [float(fault['id']) for fault in expected.values() if 'id' in fault]
+        self.assertEqual([float(row.split(',')[0]) for row in rows], ids)
+
+        # One fault recomputed, then none: the table keeps every fault with its catalog id
+        changed = copy.deepcopy(self.faults)
+        name = next(iter(changed))
+        changed[name]["SRmax"] = float(changed[name]["SRmax"]) * 1.5
+        for faults in (changed, copy.deepcopy(changed)):
+            os.remove(table)
+            Pipeline.run_seismic_activity(faults, settings)
+            with open(table) as f:
+                self.assertEqual([float(row.split(',')[0]) for row in f.read().splitlines()[1:]], ids)
+
+    def test_eviction_respects_size_bound(self):
+        cache = ResultCache(os.path.join(self.tmp.name, 'cache'), max_bytes=1000)
+        for i in range(10):
+            cache.put(f"key{i}", {"rates": list(range(30))})
+            os.utime(cache._path(f"key{i}"), (i, i))
+        cache.get("key0")  # most recently used
+        cache.evict()
+        sizes = [entry.stat().st_size for entry in os.scandir(cache.directory)]
+        self.assertLessEqual(sum(sizes), 1000)
+        self.assertIn("key0", cache)
+        self.assertNotIn("key1", cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
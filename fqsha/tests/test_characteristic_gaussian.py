@@ -0,0 +1,66 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from copy import deepcopy
+
+import numpy as np
+from scipy import stats
+from fqsha.FQSHA_Functions import characteristic_gaussian_rates, export_faults_to_xml
+from fqsha.SeismicActivityRate import momentbudget, sactivityrate
+
+NRML = '{http://openquake.org/xmlns/nrml/0.4}'
+
+
+def characteristic_gaussian_loop(mag, sdmag, Morate, bin, c=1.5, d=9.1):
+    """Rates of one fault, as computed by the per-fault loop of CHGaussPoiss."""
+    magnitude_range = np.arange(mag - sdmag, mag + sdmag + bin, bin)
+    M = 10 ** (c * magnitude_range + d)
+    pdf_mag = stats.norm.pdf(magnitude_range, mag, sdmag)
+    return magnitude_range, Morate / np.sum(pdf_mag * M) * pdf_mag
+
+
+class TestCharacteristicGaussian(unittest.TestCase):
+    def test_matches_per_fault_loop(self):
+        rng = np.random.default_rng(5)
+        mags = rng.uniform(5.5, 7.5, 40)
+        sdmags = rng.uniform(0.1, 0.5, 40)
+        Morates = 10 ** rng.uniform(14, 18, 40)
+        magnitude_range, offsets, unit_rates = characteristic_gaussian_rates(mags, sdmags, 0.1)
+        self.assertEqual(len(offsets), 41)
+        for i in range(40):
+            expected_range, expected = characteristic_gaussian_loop(mags[i], sdmags[i], Morates[i], 0.1)
+            np.testing.assert_array_equal(magnitude_range[offsets[i]:offsets[i + 1]], expected_range)
+            np.testing.assert_allclose(unit_rates[offsets[i]:offsets[i + 1]] * Morates[i], expected, rtol=1e-12)
+
+    def test_export_starts_at_rates_mmin(self):
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(test_dir, 'Faults_test.json')) as f:
+            faults = json.load(f)
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            os.chdir(tmp)
+            try:
+                faults = momentbudget(faults, 0.5, 0.2, 0.3, 'cg', '', '', plots='none')
+                for fault in faults.values():
+                    fault['mag_scale'] = 'WC1994'
+                list(faults.values())[-1]['Telap'] = 0
+                result = sactivityrate(deepcopy(faults), "Characteristic Gaussian", 50, 0.1, 'cg', plots='none')
+                export_faults_to_xml(result, 'Sources')
+                for name, fault in result.items():
+                    if not fault.get('rates'):
+                        continue
+                    source = ET.parse(os.path.join('Sources', f'{name}.xml')).getroot()
+                    mfd = source.find(f'.//{NRML}incrementalMFD')
+                    occur_rates = mfd.find(f'{NRML}occurRates').text.split()
+                    self.assertEqual(len(occur_rates), len(fault['rates']))
+                    self.assertAlmostEqual(float(mfd.get('minMag')), fault['Mmax'] - fault['sdMmax'], places=1)
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    unittest.main()
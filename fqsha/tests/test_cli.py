@@ -0,0 +1,114 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+import matplotlib
+matplotlib.use("Agg")
+
+from fqsha.cli import main
+from fqsha import Pipeline
+
+from _fixtures import FAULTS_FILE, FaultsTestCase
+
+
+class TestHeadlessRun(FaultsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.config = os.path.join(self.tmp.name, 'config.json')
+        with open(self.config, 'w') as f:
+            json.dump({
+                "faults": FAULTS_FILE,
+                "fault_behaviour": "Truncated Gutenberg Richter",
+                "gmpes": {"AkkarBommer2010": 1.0, "BooreAtkinson2008": 1.0},
+                "run_openquake": False,
+            }, f)
+
+    def test_run_writes_openquake_inputs(self):
+        main(['run', self.config, '--output-folder', 'scenario_1'])
+        output = os.path.join(self.tmp.name, 'scenario_1')
+        for name in ['job.ini', 'gmpe_logic_tree.xml', 'source_model_logic_tree.xml', 'inputs.json']:
+            self.assertTrue(os.path.isfile(os.path.join(output, name)), name)
+        sources = os.listdir(os.path.join(output, 'Sources'))
+        self.assertEqual(len(sources), len(self.faults))
+
+    def test_streamed_run_matches_loaded_run(self):
+        with open(self.config) as f:
+            config = json.load(f)
+        config["source_model"] = "single"
+        with open(self.config, 'w') as f:
+            json.dump(config, f)
+        main(['run', self.config, '--output-folder', 'loaded'])
+        main(['run', self.config, '--output-folder', 'streamed', '--chunk-size', '4'])
+        sources = [os.path.join(self.tmp.name, folder, 'Sources', 'source_model.xml') for folder in ('loaded', 'streamed')]
+        with open(sources[0]) as loaded, open(sources[1]) as streamed:
+            self.assertEqual(loaded.read(), streamed.read())
+
+    def test_streamed_run_keeps_one_probability_model(self):
+        # The first chunk ends with a fault without elapsed time: the last fault still selects BPT
+        fourth = list(self.faults.values())[3]
+        fourth['Last_eq_time'] = fourth['year_for_calculations']
+        with open('faults.json', 'w') as f:
+            json.dump(self.faults, f)
+        with open(self.config) as f:
+            config = json.load(f)
+        config.update(faults=os.path.join(self.tmp.name, 'faults.json'), source_model="single",
+                      fault_behaviour="Characteristic Gaussian")
+        with open(self.config, 'w') as f:
+            json.dump(config, f)
+        main(['run', self.config, '--output-folder', 'loaded'])
+        main(['run', self.config, '--output-folder', 'streamed', '--chunk-size', '4'])
+        sources = [os.path.join(self.tmp.name, folder, 'Sources', 'source_model.xml') for folder in ('loaded', 'streamed')]
+        with open(sources[0]) as loaded, open(sources[1]) as streamed:
+            self.assertEqual(loaded.read(), streamed.read())
+
+    def test_unknown_configuration_key(self):
+        with open(self.config, 'w') as f:
+            json.dump({"faults": {}, "zetta": 0.5}, f)
+        with self.assertRaises(ValueError):
+            main(['run', self.config])
+
+    def test_progress_stages(self):
+        settings, faults = Pipeline.load_config(self.config)
+        stages = []
+        Pipeline.run_pipeline(settings, faults, progress=lambda stage, done, total: stages.append(stage))
+        self.assertEqual(list(dict.fromkeys(stages)), ['inputs', 'momentbudget', 'rates', 'xml'])
+
+    def test_cancel_terminates_subprocess(self):
+        cancel = threading.Event()
+        threading.Timer(0.3, cancel.set).start()
+        start = time.time()
+        with self.assertRaises(Pipeline.PipelineCancelled):
+            Pipeline.stream_command([sys.executable, '-c', 'import time; time.sleep(30)'], self.tmp.name,
+                                    cancel=cancel, poll_interval=0.1)
+        self.assertLess(time.time() - start, 15)
+
+    def test_stream_command_output_and_progress(self):
+        script = ("import sys\n"
+                  "for i in range(50): print('line', i)\n"
+                  "print('[2025-01-01 10:00:00,123 #12 INFO] classical  40% [25 submitted, 3 queued]')\n"
+                  "print('classical 100% [25 submitted, 0 queued]', file=sys.stderr)\n")
+        lines, events = [], []
+        returncode, tail = Pipeline.stream_command([sys.executable, '-c', script], self.tmp.name,
+                                                   on_line=lines.append, on_progress=events.append,
+                                                   buffer_lines=10)
+        self.assertEqual(returncode, 0)
+        self.assertEqual(len(lines), 52)
+        self.assertEqual(len(tail), 10)
+        self.assertEqual(tail[-1], lines[-1])
+        self.assertEqual([(e['task'], e['percent'], e['calc_id']) for e in events],
+                         [('classical', 40, 12), ('classical', 100, None)])
+
+    def test_cli_does_not_import_gui(self):
+        code = ("import sys, fqsha.cli, fqsha.Pipeline; "
+                "print(any(m in sys.modules for m in ('PyQt5', 'pygmt', 'fontTools')))")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(self.test_dir)))
+        self.assertEqual(result.stdout.strip(), 'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import contextlib
+import copy
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+
+from fqsha import Pipeline
+from fqsha.cli import main
+from fqsha.FaultCatalog import (Fault, FaultCatalog, catalog_columns, catalog_to_faults, fault_columns, faults_to_catalog, iter_fault_chunks,
+                                iter_faults, load_catalog, normalize_faults, save_catalog)
+from fqsha.FQSHA_Functions import export_faults_to_xml
+from fqsha.SeismicActivityRate import momentbudget
+
+from _fixtures import FAULTS_FILE, FaultsTestCase, load_test_faults
+
+
+class TestColumnarCatalog(FaultsTestCase):
+    def test_round_trip(self):
+        faults = copy.deepcopy(self.faults)
+        first = next(iter(faults))
+        del faults[first]['Mobs']
+        path = save_catalog(faults, os.path.join(self.tmp.name, 'catalog'))
+
+        catalog = load_catalog(path)
+        self.assertIsInstance(catalog['trace'], np.memmap)
+        self.assertEqual(catalog['trace_offsets'][-1], sum(len(fault['fault_trace']) for fault in faults.values()))
+        restored = catalog_to_faults(catalog)
+        self.assertEqual(json.dumps(restored, sort_keys=True), json.dumps(faults, sort_keys=True))
+        self.assertNotIn('Mobs', restored[first])
+
+    def test_null_values_take_the_defaults(self):
+        faults = copy.deepcopy(self.faults)
+        names = list(faults)
+        faults[names[0]]['ShearModulus'] = None
+        faults[names[1]]['StrainDrop'] = None
+        faults[names[2]].update(ShearModulus='', StrainDrop='nan')
+        catalog = load_catalog(save_catalog(faults, os.path.join(self.tmp.name, 'catalog')))
+        restored = catalog_to_faults(catalog)
+        self.assertIsNone(restored[names[0]]['ShearModulus'])
+        self.assertIsNone(restored[names[2]]['StrainDrop'])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = momentbudget(copy.deepcopy(faults), 0.5, 0.2, 0.3, 'output_files', '', '', plots='none')
+            converted = momentbudget(restored, 0.5, 0.2, 0.3, 'output_files', '', '', plots='none')
+            columnar = FaultCatalog(catalog)
+            momentbudget(columnar, 0.5, 0.2, 0.3, 'output_files', '', '', plots='none')
+        budget = lambda faults: json.dumps({name: {key: fault[key] for key in ('Mmax', 'sdMmax', 'Tmean', 'MomentRate')}
+                                            for name, fault in faults.items()}, sort_keys=True)
+        self.assertEqual(budget(converted), budget(expected))
+        self.assertEqual(budget(columnar), budget(expected))
+
+    def test_columns_without_fault_dictionaries(self):
+        catalog = load_catalog(save_catalog(faults_to_catalog(self.faults), os.path.join(self.tmp.name, 'catalog')))
+        expected = fault_columns(self.faults)
+        columns = catalog_columns(catalog)
+        self.assertEqual(list(columns['name']), list(expected['name']))
+        self.assertEqual(list(columns['ScR']), list(expected['ScR']))
+        for key, values in expected.items():
+            if values.dtype != object:
+                np.testing.assert_array_equal(columns[key], values, err_msg=key)
+
+    def test_convert_command(self):
+        catalog = os.path.join(self.tmp.name, 'catalog')
+        restored = os.path.join(self.tmp.name, 'restored.json')
+        main(['convert', FAULTS_FILE, catalog])
+        main(['convert', catalog, restored])
+        with open(restored) as f:
+            restored = json.load(f)
+        self.assertEqual(list(restored), list(self.faults))
+        self.assertEqual(restored['ZFF'], self.faults['ZFF'])
+
+    def test_mixed_parameter_is_rejected(self):
+        faults = json.loads(json.dumps(self.faults))
+        next(iter(faults.values()))['Dip'] = [40]
+        with self.assertRaises(ValueError):
+            faults_to_catalog(faults)
+
+
+class TestStreamingLoader(unittest.TestCase):
+    def setUp(self):
+        self.fault_file = FAULTS_FILE
+        self.faults = load_test_faults()
+
+    def test_json_object(self):
+        for buffer_size in [1, 100, 1 << 16]:
+            self.assertEqual(list(iter_faults(self.fault_file, buffer_size=buffer_size)), list(self.faults.items()))
+
+    def test_ndjson_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'faults.ndjson')
+            with open(path, 'w') as f:
+                for i, (name, fault) in enumerate(self.faults.items()):
+                    f.write(json.dumps(dict(fault, name=name) if i % 2 else {name: fault}) + '\n')
+            chunks = list(iter_fault_chunks(iter_faults(path), chunk_size=4))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, len(self.faults) - 4])
+        self.assertEqual({**chunks[0], **chunks[1]}, self.faults)
+
+
+class TestNormalization(unittest.TestCase):
+    def setUp(self):
+        self.faults = load_test_faults()
+
+    def test_error_table(self):
+        names = list(self.faults)
+        self.faults[names[0]]['ScR'] = 'XX'
+        self.faults[names[0]]['Length'] = '10'
+        self.faults[names[1]]['Dip'] = None
+        del self.faults[names[2]]['SCC']
+        self.faults[names[3]]['ShearModulus'] = None
+        table, errors = normalize_faults(self.faults)
+        self.assertEqual(list(zip(errors['name'], errors['parameter'])),
+                         [(names[0], 'ScR'), (names[0], 'Length'), (names[1], 'Dip'), (names[2], 'SCC')])
+        self.assertEqual(list(table['name']), names[3:])
+        self.assertEqual(table['ShearModulus'][0], 3e10)
+
+    def test_idempotent(self):
+        snapshot = json.dumps(self.faults)
+        table, _ = normalize_faults(self.faults)
+        self.assertEqual(json.dumps(self.faults), snapshot)
+        self.assertIs(normalize_faults(table)[0], table)
+        catalog_table, errors = normalize_faults(faults_to_catalog(self.faults))
+        self.assertEqual(len(errors['name']), 0)
+        for key, values in table.items():
+            if key != 'normalized':
+                np.testing.assert_array_equal(catalog_table[key], values, err_msg=key)
+
+        first = momentbudget(self.faults, 0.5, 0.2, 0.3, 'output_files', True, True, plots='none')
+        first = {name: fault['MomentRate'] for name, fault in first.items()}
+        second = momentbudget(self.faults, 0.5, 0.2, 0.3, 'output_files', True, True, plots='none')
+        self.assertEqual({name: fault['MomentRate'] for name, fault in second.items()}, first)
+
+
+class TestFaultCatalog(FaultsTestCase):
+    def test_fault_views(self):
+        catalog = FaultCatalog.from_faults(self.faults)
+        name = next(iter(self.faults))
+        fault = catalog[name]
+        self.assertIsInstance(fault, Fault)
+        self.assertFalse(hasattr(fault, '__dict__'))
+        self.assertEqual(list(catalog), list(self.faults))
+        self.assertEqual(dict(fault), self.faults[name])
+
+        fault['rates'] = [1.0, 2.0]
+        fault['Mmax'] = 7.5
+        del fault['Mobs']
+        self.assertEqual(catalog[name]['rates'], [1.0, 2.0])
+        self.assertEqual(catalog.column('Mmax')[0], 7.5)
+        self.assertNotIn('Mobs', catalog[name])
+        self.assertNotIn('rates', catalog[list(self.faults)[1]])
+
+    def test_memory_mapped_catalog_is_copied_on_write(self):
+        path = save_catalog(self.faults, 'catalog')
+        catalog = FaultCatalog.load(path)
+        name = next(iter(self.faults))
+        catalog[name]['SRmax'] = 2.5
+        self.assertEqual(catalog[name]['SRmax'], 2.5)
+        self.assertNotEqual(FaultCatalog.load(path)[name]['SRmax'], 2.5)
+
+    def test_run_matches_dictionary_run(self):
+        def run(faults, folder):
+            os.makedirs(folder)
+            os.chdir(folder)
+            try:
+                results = Pipeline.run_seismic_activity(faults, settings)
+                export_faults_to_xml(results, 'Sources')
+            finally:
+                os.chdir(self.tmp.name)
+            return json.dumps({name: dict(fault) for name, fault in results.items()}, sort_keys=True)
+
+        for fault_behaviour in ["Characteristic Gaussian", "Truncated Gutenberg Richter"]:
+            with self.subTest(fault_behaviour=fault_behaviour):
+                settings = dict(Pipeline.DEFAULT_SETTINGS)
+                settings["fault_behaviour"] = fault_behaviour
+                expected = run(copy.deepcopy(self.faults), f"dict_{fault_behaviour}")
+                catalog = FaultCatalog.load(save_catalog(self.faults, f"catalog_{fault_behaviour}"))
+                self.assertEqual(run(catalog, f"catalog_run_{fault_behaviour}"), expected)
+                for name in self.faults:
+                    with open(os.path.join(f"dict_{fault_behaviour}", "Sources", f"{name}.xml")) as f, \
+                            open(os.path.join(f"catalog_run_{fault_behaviour}", "Sources", f"{name}.xml")) as g:
+                        self.assertEqual(f.read(), g.read())
+
+    def test_run_with_null_values_matches_dictionary_run(self):
+        faults = copy.deepcopy(self.faults)
+        names = list(faults)
+        faults[names[0]]['ShearModulus'] = None
+        faults[names[1]]['StrainDrop'] = None
+        settings = dict(Pipeline.DEFAULT_SETTINGS)
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = Pipeline.run_seismic_activity(copy.deepcopy(faults), settings)
+            catalog = Pipeline.run_seismic_activity(FaultCatalog.from_faults(faults), settings)
+        self.assertEqual(json.dumps(catalog.to_dict(), sort_keys=True), json.dumps(expected, sort_keys=True))
+
+    def test_chunked_run_matches_single_run(self):
+        settings = dict(Pipeline.DEFAULT_SETTINGS)
+        settings["fault_behaviour"] = "Truncated Gutenberg Richter"
+        table = os.path.join('output_files', 'output_files_SAR_TruncatedGR.txt')
+
+        expected = Pipeline.run_seismic_activity(copy.deepcopy(self.faults), settings)
+        with open(table) as f:
+            expected_table = f.read()
+        os.remove(table)
+
+        chunks = iter_fault_chunks(iter(copy.deepcopy(self.faults).items()), chunk_size=4)
+        streamed = dict(Pipeline.iter_seismic_activity(chunks, settings))
+        self.assertEqual({name: fault.get('id') for name, fault in streamed.items()},
+                         {name: fault.get('id') for name, fault in expected.items()})
+        # One table for all chunks, with the catalog ids, and no per-fault XML files
+        with open(table) as f:
+            self.assertEqual(f.read(), expected_table)
+        self.assertEqual(os.listdir('output_files'), ['output_files_SAR_TruncatedGR.txt'])
+
+    def test_chunk_of_rejected_faults(self):
+        faults = copy.deepcopy(self.faults)
+        for name in ("Bad 1", "Bad 2"):
+            faults[name] = dict(faults["ZFF"], Length="unknown")
+        settings = dict(Pipeline.DEFAULT_SETTINGS)
+        chunks = iter_fault_chunks(iter(faults.items()), chunk_size=3)
+        with contextlib.redirect_stdout(io.StringIO()):
+            streamed = dict(Pipeline.iter_seismic_activity(chunks, settings))
+        self.assertEqual([fault.get('id') for fault in streamed.values()], [1, 2, 3, 4, 5, 6, None, None])
+        self.assertNotIn('rates', streamed["Bad 1"])
+        self.assertTrue(all(streamed[name]['rates'] for name in self.faults))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import copy
+import json
+import os
+import unittest
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+
+from fqsha import Pipeline
+from fqsha.cli import main
+from fqsha.HazardPreview import (PGA_LEVELS, PREVIEW_GMPES, _window_min, fault_surface, hazard_curves, hazard_map,
+                                 region_grid)
+
+from _fixtures import FAULTS_FILE, FaultsTestCase
+
+try:
+    from openquake.hazardlib.gsim.akkar_bommer_2010 import AkkarBommer2010
+    from openquake.hazardlib.gsim.boore_atkinson_2008 import BooreAtkinson2008
+    from openquake.hazardlib.imt import PGA
+except ImportError:
+    AkkarBommer2010 = None
+
+
+class TestHazardPreview(FaultsTestCase):
+    @unittest.skipIf(AkkarBommer2010 is None, "openquake.hazardlib is not installed")
+    def test_gmpes_match_openquake(self):
+        rjb = np.array([0.0, 1.0, 5.0, 20.0, 80.0, 250.0])
+        dtype = [('mag', float), ('rake', float), ('rjb', float), ('vs30', float), ('sids', int)]
+        for name, gsim in [("AkkarBommer2010", AkkarBommer2010()), ("BooreAtkinson2008", BooreAtkinson2008())]:
+            for rake, vs30, mag in [(0, 800, 5.0), (90, 400, 6.2), (-90, 250, 7.3), (40, 150, 6.7)]:
+                with self.subTest(gmpe=name, rake=rake, vs30=vs30, mag=mag):
+                    ctx = np.recarray(len(rjb), dtype=dtype)
+                    ctx.mag, ctx.rake, ctx.rjb, ctx.vs30, ctx.sids = mag, rake, rjb, vs30, np.arange(len(rjb))
+                    mean, sig, tau, phi = (np.zeros((1, len(rjb))) for _ in range(4))
+                    gsim.compute(ctx, [PGA()], mean, sig, tau, phi)
+                    expected_mean, expected_sigma = PREVIEW_GMPES[name](np.full(len(rjb), mag), rjb, rake, vs30)
+                    np.testing.assert_allclose(expected_mean, mean[0], atol=1e-10)
+                    np.testing.assert_allclose(expected_sigma, sig[0], atol=1e-10)
+
+    def test_window_min(self):
+        values = np.random.default_rng(1).random((23, 4))
+        for width in [1, 2, 3, 5, 8, 23]:
+            expected = np.array([values[i:i + width].min(axis=0) for i in range(len(values) - width + 1)])
+            np.testing.assert_array_equal(_window_min(values, width), expected)
+
+    def test_hazard_map_interpolation(self):
+        poes = np.array([[0.5, 0.1, 0.01], [0.01, 0.001, 0.0001], [0.9, 0.8, 0.5]])
+        levels = (0.1, 0.2, 0.4)
+        result = hazard_map(poes, levels, map_poes=(0.1, 0.02))
+        self.assertAlmostEqual(result[0, 0], 0.2)
+        self.assertTrue(0.2 < result[0, 1] < 0.4)
+        self.assertEqual(result[1, 0], 0.0)
+        self.assertEqual(result[2, 0], 0.4)
+
+    def test_preview_curves(self):
+        settings = dict(Pipeline.DEFAULT_SETTINGS)
+        settings.update({"fault_behaviour": "Truncated Gutenberg Richter", "create_map": False,
+                         "gmpes": {"AkkarBommer2010": 1.0, "BooreAtkinson2008": 1.0}})
+        faults = copy.deepcopy(self.faults)
+        csv_file = Pipeline.run_preview(settings, faults, grid_spacing=50)
+        self.assertTrue(os.path.isfile(csv_file))
+        data = np.loadtxt(os.path.join(os.path.dirname(csv_file), 'hazard_curve-preview.csv'),
+                          delimiter=',', skiprows=1)
+        poes = data[:, 2:]
+        self.assertEqual(poes.shape[1], len(PGA_LEVELS))
+        self.assertTrue(np.all(np.diff(poes, axis=1) <= 0))
+        self.assertGreater(poes[:, 0].max(), 0)
+
+        # The hazard decreases away from a fault
+        name = next(iter(faults))
+        fault = faults[name]
+        lon, lat = np.mean(fault['fault_trace'], axis=0)
+        near_far = hazard_curves({name: fault}, [lon, lon], [lat, lat + 2.0])
+        self.assertTrue(np.all(near_far[0] >= near_far[1]))
+        self.assertGreater(near_far[0, 5], near_far[1, 5])
+
+    def test_surface_starts_at_upper_depth(self):
+        fault = {"fault_trace": [[0.0, 0.0], [0.0, 0.3]], "Dip": 45, "upperSeismoDepth": 2, "lowerSeismoDepth": 12}
+        nodes, length, width = fault_surface(fault, 0.0, 0.0, mesh_spacing=1.0)
+        # Dipping east (to the right of a northward trace) from 2 km to 12 km away from it
+        np.testing.assert_allclose(nodes[0, [0, -1], 0], [2.0, 12.0])
+        self.assertAlmostEqual(width, 10 * np.sqrt(2))
+        self.assertEqual(nodes.shape[1], int(round(width)) + 1)
+
+    def test_region_grid_spacing(self):
+        lons, lats = region_grid(30.0, 31.0, 50.0, 51.0, 10.0)
+        self.assertAlmostEqual(np.diff(np.unique(lats))[0] * 111.195, 10.0, places=2)
+        self.assertEqual(len(lons), len(lats))
+
+    def test_preview_command(self):
+        config = os.path.join(self.tmp.name, 'config.json')
+        with open(config, 'w') as f:
+            json.dump({"faults": FAULTS_FILE,
+                       "fault_behaviour": "Truncated Gutenberg Richter", "grid_spacing": 50}, f)
+        main(['preview', config, '--output-folder', 'scenario', '--no-map'])
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp.name, 'scenario', Pipeline.PREVIEW_FOLDER,
+                                                    'hazard_map-preview.csv')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# Seconds allowed for importing the computational modules on top of numpy. Eagerly importing
+# scipy.stats and matplotlib.pyplot alone takes longer than this.
+IMPORT_BUDGET = 0.4
+
+HEAVY_MODULES = ['PyQt5', 'pygmt', 'fontTools', 'pandas', 'scipy.stats', 'matplotlib.pyplot']
+
+IMPORT_SCRIPT = """
+import sys, time
+import numpy
+start = time.perf_counter()
+import fqsha.FQSHA_Functions, fqsha.SeismicActivityRate, fqsha.Plotting, fqsha.Pipeline, fqsha.Mapping
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(','.join(name for name in %r if name in sys.modules))
+""" % (HEAVY_MODULES,)
+
+
+class TestImportTime(unittest.TestCase):
+    def run_import(self):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        result = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], capture_output=True, text=True,
+                                check=True, cwd=root)
+        elapsed, loaded = result.stdout.split('\n')[:2]
+        return float(elapsed), [name for name in loaded.split(',') if name]
+
+    def test_heavy_dependencies_are_not_imported(self):
+        _, loaded = self.run_import()
+        self.assertEqual(loaded, [])
+
+    def test_import_time_budget(self):
+        # Best of three runs, to keep a cold file cache from failing the test
+        elapsed = min(self.run_import()[0] for _ in range(3))
+        self.assertLess(elapsed, IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
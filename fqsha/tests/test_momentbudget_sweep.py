@@ -0,0 +1,34 @@
+import contextlib
+import io
+import json
+import os
+import unittest
+
+import numpy as np
+from fqsha.FaultCatalog import normalize_faults
+from fqsha.SeismicActivityRate import momentbudget_arrays, momentbudget_sweep
+
+
+class TestMomentBudgetSweep(unittest.TestCase):
+    def test_sweep_matches_single_runs(self):
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(test_dir, 'Faults_test.json')) as f:
+            faults = json.load(f)
+        Zeta, Khi, Siggma = [0.1, 0.5], [0.2, 0.6, 1.0], [0.2, 0.3]
+        sweep = momentbudget_sweep(faults, Zeta, Khi, Siggma, chunk_size=4)
+        self.assertEqual(sweep["dims"], ("fault", "Zeta", "Khi", "Siggma"))
+        self.assertEqual(sweep["Mmax"].shape, (len(faults), 2, 3, 2))
+        self.assertEqual(list(sweep["names"]), list(faults))
+
+        columns, _ = normalize_faults(faults)
+        for i, z in enumerate(Zeta):
+            for j, k in enumerate(Khi):
+                for l, s in enumerate(Siggma):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        budget = momentbudget_arrays(columns, z, k, s)
+                    for key in ("Mmax", "sdMmax", "Tmean", "CV", "MomentRate"):
+                        np.testing.assert_array_equal(sweep[key][:, i, j, l], budget[key])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import contextlib
+import copy
+import io
+import unittest
+
+import numpy as np
+
+from fqsha.MonteCarlo import monte_carlo, sample_rates
+from fqsha.SeismicActivityRate import momentbudget, sactivityrate
+
+from _fixtures import FaultsTestCase
+
+
+class TestMonteCarlo(FaultsTestCase):
+    def test_reproducible_with_workers(self):
+        serial = monte_carlo(self.faults, nsample=500, seed=7, batch_size=2, max_workers=0)
+        pooled = monte_carlo(self.faults, nsample=500, seed=7, batch_size=2, max_workers=2)
+        for key in ("MomentRate", "Mmax", "CV", "Hbpt", "rates"):
+            np.testing.assert_array_equal(serial[key], pooled[key])
+        self.assertEqual(serial["MomentRate"].shape, (len(self.faults), 5))
+        self.assertEqual(serial["rates"].shape, (len(self.faults), len(serial["magnitudes"]), 5))
+        # Bands are ordered and the cumulative rates decrease with magnitude
+        self.assertTrue(np.all(np.diff(serial["MomentRate"], axis=1) >= 0))
+        self.assertTrue(np.all(np.diff(serial["rates"][:, :, 2], axis=1) <= 0))
+
+    def test_single_sample_matches_truncated_gr(self):
+        faults = copy.deepcopy(self.faults)
+        with contextlib.redirect_stdout(io.StringIO()):
+            momentbudget(faults, 0.5, 0.2, 0.3, 'output_files', '', '', plots='none')
+            for fault in faults.values():
+                fault['mag_scale'] = 'WC1994'
+            sactivityrate(faults, "Truncated Gutenberg Richter", 50, 0.1, 'output_files', plots='none')
+        column = lambda key: np.array([fault[key] for fault in faults.values()], dtype=float)
+        Mmax = column('Mmax')
+        samples = {"Mmax": Mmax[:, None], "MomentRate": (10 ** (1.5 * Mmax + 9.1) / column('Tmean'))[:, None],
+                   "CV": column('CV')[:, None], "b-value": column('b-value')[:, None]}
+        params = {"sdMmax": column('sdMmax'), "Telap": column('Telap'), "Mmin": column('Mmin')}
+        magnitudes = np.round(np.arange(4.0, 9.05, 0.1), 10)
+        result = sample_rates(params, samples, "Truncated Gutenberg Richter", 50, 0.1, magnitudes)
+        for i, fault in enumerate(faults.values()):
+            expected = np.cumsum(fault['rates'][::-1])[::-1]
+            first = int(round((fault['Mmin'] - 4.0) / 0.1))
+            np.testing.assert_allclose(result['rates'][i, 0, first:first + len(expected)], expected, rtol=1e-9)
+
+    def test_mmax_below_mmin_goes_to_mmin_bin(self):
+        samples = {"Mmax": np.array([[5.5, 6.5]]), "MomentRate": np.array([[1e16, 1e16]]),
+                   "CV": np.array([[0.5, 0.5]]), "b-value": np.array([[1.0, 1.0]])}
+        params = {"sdMmax": np.array([0.2]), "Telap": np.array([0.0]), "Mmin": np.array([6.0])}
+        magnitudes = np.round(np.arange(4.0, 9.05, 0.1), 10)
+        with np.errstate(all='raise'):
+            result = sample_rates(params, samples, "Truncated Gutenberg Richter", 50, 0.1, magnitudes)
+        rates = result['rates'][0, 0]
+        self.assertTrue(np.all(np.isfinite(result['rates'])))
+        self.assertAlmostEqual(rates[20], 1e16 / 10 ** (1.5 * 6.0 + 9.1))
+        self.assertEqual(rates[21], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
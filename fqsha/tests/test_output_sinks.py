@@ -0,0 +1,147 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import unittest
+from copy import deepcopy
+
+import numpy as np
+from fqsha.OutputSinks import OutputSink, TextSink, NpzSink, ParquetSink, Hdf5Sink, make_sink
+from fqsha.SeismicActivityRate import momentbudget, sactivityrate
+
+# Two faults with rates and one with an empty magnitude range
+IDS = [1, 2, 3]
+MMIN = np.array([5.0, 6.2, np.nan])
+OFFSETS = np.array([0, 3, 5, 5])
+RATES = np.array([1e-2, 5e-3, 1e-4, 2e-3, 3e-4])
+NAMES = ["Fault A", "Fault B", "Fault C"]
+PROBABILITIES = np.array([0.1, 0.02, 0.0])
+
+
+class TestOutputSinks(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_text_layout(self):
+        sink = TextSink(self.tmp.name)
+        path = sink.write_rates("rates", IDS, MMIN, 0.1, OFFSETS, RATES, NAMES)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'id Mmin bin rates name')
+        self.assertEqual(lines[1], '1, 5.0, 0.1, 1.0000e-02, 5.0000e-03, 1.0000e-04, Fault A')
+        self.assertEqual(lines[3], '3, nan, 0.1, , Fault C')
+
+        path = sink.write_rates("gr", IDS, MMIN, 0.1, OFFSETS, RATES, NAMES, delimiter=' ', name_column=False)
+        with open(path) as f:
+            self.assertEqual(f.read().splitlines()[2], '2, 6.2, 0.1, 2.0000e-03 3.0000e-04')
+
+        path = sink.write_probabilities("prob", IDS, MMIN, 50, PROBABILITIES, NAMES)
+        with open(path) as f:
+            self.assertEqual(f.read().splitlines()[1], '1, 5.0, 50, 1.000e-01, Fault A')
+
+    def test_npz_round_trip(self):
+        sink = NpzSink(self.tmp.name)
+        with np.load(sink.write_rates("rates", IDS, MMIN, 0.1, OFFSETS, RATES, NAMES)) as table:
+            np.testing.assert_array_equal(table["rates"], RATES)
+            np.testing.assert_array_equal(table["offsets"], OFFSETS)
+            self.assertEqual(list(table["name"]), NAMES)
+        with np.load(sink.write_probabilities("prob", IDS, MMIN, 50, PROBABILITIES, NAMES)) as table:
+            np.testing.assert_array_equal(table["probability"], PROBABILITIES)
+            self.assertEqual(float(table["window"]), 50)
+
+    @unittest.skipUnless(importlib.util.find_spec("h5py"), "h5py is not installed")
+    def test_hdf5_round_trip(self):
+        import h5py
+        sink = Hdf5Sink(self.tmp.name)
+        with h5py.File(sink.write_rates("rates", IDS, MMIN, 0.1, OFFSETS, RATES, NAMES)) as f:
+            np.testing.assert_array_equal(f["rates"][:], RATES)
+            self.assertEqual([name.decode() for name in f["name"][:]], NAMES)
+            self.assertEqual(f.attrs["bin"], 0.1)
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_parquet_round_trip(self):
+        import pyarrow.parquet as pq
+        with ParquetSink(self.tmp.name) as sink:
+            path = sink.write_rates("rates", IDS, MMIN, 0.1, OFFSETS, RATES, NAMES)
+        table = pq.read_table(path)
+        self.assertEqual(table.column("rates").to_pylist()[1], list(RATES[3:5]))
+        self.assertEqual(table.column("name").to_pylist(), NAMES)
+
+    def test_append_chunks(self):
+        sinks = [TextSink, NpzSink] + ([Hdf5Sink] if importlib.util.find_spec("h5py") else [])
+        for sink_class in sinks:
+            with self.subTest(sink=sink_class.__name__):
+                whole = sink_class(os.path.join(self.tmp.name, 'whole'))
+                chunked = sink_class(os.path.join(self.tmp.name, 'chunked'))
+                with whole, chunked:
+                    expected = whole.write_rates("rates", IDS, MMIN, 0.1, OFFSETS, RATES, NAMES)
+                    chunked.write_rates("rates", IDS[:1], MMIN[:1], 0.1, OFFSETS[:2], RATES[:3], NAMES[:1])
+                    path = chunked.write_rates("rates", IDS[1:], MMIN[1:], 0.1, OFFSETS[1:] - 3, RATES[3:],
+                                               NAMES[1:])
+                if sink_class is TextSink:
+                    with open(path) as f, open(expected) as g:
+                        self.assertEqual(f.read(), g.read())
+                elif sink_class is NpzSink:
+                    with np.load(path) as table:
+                        np.testing.assert_array_equal(table["offsets"], OFFSETS)
+                        np.testing.assert_array_equal(table["rates"], RATES)
+                        self.assertEqual(list(table["name"]), NAMES)
+                else:
+                    import h5py
+                    with h5py.File(path) as f:
+                        np.testing.assert_array_equal(f["offsets"][:], OFFSETS)
+                        np.testing.assert_array_equal(f["rates"][:], RATES)
+                        self.assertEqual([name.decode() for name in f["name"][:]], NAMES)
+
+    @unittest.skipIf(importlib.util.find_spec("pyarrow"), "pyarrow is installed")
+    def test_missing_dependency_fails_before_the_run(self):
+        from fqsha import Pipeline
+        with self.assertRaisesRegex(ImportError, r"\.\[sinks\]"):
+            make_sink("parquet", self.tmp.name)
+        settings = dict(Pipeline.DEFAULT_SETTINGS, output_format="parquet",
+                        output_folder=os.path.join(self.tmp.name, 'run'))
+        with self.assertRaises(ImportError):
+            Pipeline.run_pipeline(settings, {})
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_partial_sink_fails_on_creation(self):
+        class RatesOnly(OutputSink):
+            def write_rates(self, name, ids, Mmin, bin, offsets, rates, names, delimiter=', ', name_column=True):
+                return self.path(name)
+
+        with self.assertRaises(TypeError):
+            RatesOnly(self.tmp.name)
+
+    def test_sactivityrate_output_root(self):
+        with self.assertRaises(ValueError):
+            make_sink("csv")
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(test_dir, 'Faults_test.json')) as f:
+            faults = json.load(f)
+        with contextlib.redirect_stdout(io.StringIO()):
+            faults = momentbudget(faults, 0.5, 0.2, 0.3, 'sink', '', '', plots='none')
+            for fault in faults.values():
+                fault['mag_scale'] = 'WC1994'
+            list(faults.values())[-1]['Telap'] = 0
+            root = os.path.join(self.tmp.name, 'tables')
+            cwd = os.getcwd()
+            os.chdir(self.tmp.name)
+            try:
+                sactivityrate(deepcopy(faults), "Characteristic Gaussian", 50, 0.1, 'sink', plots='none',
+                              sink=make_sink("npz", root))
+            finally:
+                os.chdir(cwd)
+        # Only the tables are written: the XML sources are exported by the pipeline
+        self.assertEqual(os.listdir(self.tmp.name), ['tables'])
+        self.assertEqual(sorted(os.listdir(root)), ['sink_SAR_ChGaussPoisson_Probability.npz',
+                                                    'sink_SAR_ChGaussPoisson_rates.npz'])
+        with np.load(os.path.join(root, 'sink_SAR_ChGaussPoisson_rates.npz')) as table:
+            self.assertEqual(len(table["name"]), len(faults))
+            self.assertEqual(table["offsets"][-1], len(table["rates"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+import unittest
+from copy import deepcopy
+
+import numpy as np
+from fqsha.SeismicActivityRate import (momentbudget, sactivityrate_arrays, probability_cube,
+                                       save_probability_cube, load_probability_cube)
+
+
+class TestProbabilityCube(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(test_dir, 'Faults_test.json')) as f:
+            faults = json.load(f)
+        cls.faults = momentbudget(deepcopy(faults), Zeta=0.5, Khi=0.2, Siggma=0.3, ProjFol=None,
+                                  logical_nan=True, logical_nan_sdmag=True, plots='none')
+
+    def test_single_window_matches_sactivityrate(self):
+        cube = probability_cube(self.faults, windows=[50], bin=0.1)
+        names = list(self.faults.keys())
+        get = lambda key: np.array([self.faults[name][key] for name in names], dtype=float)
+        expected = sactivityrate_arrays(get('Mmax'), get('sdMmax'), get('MomentRate'), get('Telap'),
+                                        get('CV'), 50, 0.1)
+        np.testing.assert_allclose(cube['Hbpt'][:, 0, 0], expected['Hbpt'])
+        np.testing.assert_allclose(cube['Hpois'][:, 0], expected['Hpois'])
+
+    def test_cube_shape_and_export(self):
+        windows = [1, 5, 10, 30, 50, 100]
+        years = np.arange(2025, 2035)
+        cube = probability_cube(self.faults, windows=windows, years=years)
+        self.assertEqual(cube['Hbpt'].shape, (len(self.faults), len(windows), len(years)))
+        self.assertEqual(cube['Hpois'].shape, (len(self.faults), len(windows)))
+        # Longer windows can only increase the probability
+        self.assertTrue(np.all(np.diff(cube['Hpois'], axis=1) >= 0))
+        self.assertTrue(np.all(np.diff(cube['Hbpt'], axis=1) >= -1e-12))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = save_probability_cube(os.path.join(tmp, 'cube'), cube)
+            loaded = load_probability_cube(path)
+        self.assertEqual(list(loaded['names']), list(cube['names']))
+        np.testing.assert_allclose(loaded['Hbpt'], cube['Hbpt'], atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
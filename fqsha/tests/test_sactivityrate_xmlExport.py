@@ -8,7 +8,10 @@ import os
 import math
 import numpy as np
 from fqsha.SeismicActivityRate import sactivityrate, momentbudget
-from fqsha.FQSHA_Functions import export_faults_to_xml
+from fqsha.FQSHA_Functions import export_faults_to_xml, export_source_model
+import gzip
+import tempfile
+import xml.etree.ElementTree as ET
 from copy import deepcopy
 
 
@@ -89,6 +92,46 @@ class TestSeismicActivityRate(unittest.TestCase):
         except Exception as e:
             self.fail(f"XML export failed: {str(e)}")
 
+    def test_single_source_model(self):
+        path = export_source_model(self.result, os.path.join(self.__class__.output_dir, 'source_model.xml'))
+        root = ET.parse(path).getroot()
+        sources = root.findall('.//{http://openquake.org/xmlns/nrml/0.4}simpleFaultSource')
+        self.assertEqual(len(sources), len(self.result))
+
+        # Each source is the same element as in the per-fault files
+        export_faults_to_xml(self.result, self.__class__.xml_dir)
+        for source in sources:
+            name = source.get('name')[:-len(' Source')]
+            single = ET.parse(os.path.join(self.__class__.xml_dir, f'{name}.xml')).getroot()
+            single = single.find('.//{http://openquake.org/xmlns/nrml/0.4}simpleFaultSource')
+            single.tail = source.tail = None
+            self.assertEqual(ET.tostring(single), ET.tostring(source))
+
+        gz_path = export_source_model(self.result, os.path.join(self.__class__.output_dir, 'source_model'),
+                                      compress=True)
+        self.assertTrue(gz_path.endswith('.gz'))
+        with gzip.open(gz_path, 'rt') as f, open(path) as g:
+            self.assertEqual(f.read(), g.read())
+
+    def test_incremental_export(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sources = os.path.join(tmp, 'Sources')
+            manifest = os.path.join(tmp, 'sources_manifest.json')
+            names = list(self.result)
+
+            self.assertEqual(export_faults_to_xml(self.result, sources, manifest=manifest), names)
+            self.assertEqual(export_faults_to_xml(self.result, sources, manifest=manifest), [])
+
+            # Only the fault whose export-relevant fields changed is rewritten
+            changed = deepcopy(self.result)
+            changed[names[0]]['rates'] = [2 * rate for rate in changed[names[0]]['rates']]
+            changed[names[1]]['SRmax'] = 99.0
+            self.assertEqual(export_faults_to_xml(changed, sources, manifest=manifest), [names[0]])
+
+            # A missing file is written again even if its hash is unchanged
+            os.remove(os.path.join(sources, f'{names[2]}.xml'))
+            self.assertEqual(export_faults_to_xml(changed, sources, manifest=manifest), [names[2]])
+
     def test_morate_calculation(self):
         valid_morate_count = 0
         for fault_name, fault_data in self.result.items():
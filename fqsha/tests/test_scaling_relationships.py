@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+
+from fqsha.FQSHA_Functions import SCALING_CODES, coeff2mag, coeff2mag_arrays, kin2coeff, scaling_index
+
+
+class TestScalingRegistry(unittest.TestCase):
+    def test_arrays_match_scalar_coeff2mag(self):
+        rng = np.random.default_rng(1)
+        codes = list(SCALING_CODES) + ['Le10-S', 'az15-ct', 'UNKNOWN']
+        ScR = np.array([codes[i % len(codes)] for i in range(3 * len(codes))], dtype=object)
+        Length = rng.uniform(5e3, 8e4, len(ScR))
+        Width = rng.uniform(5e3, 2e4, len(ScR))
+        mu = np.full(len(ScR), 3e10)
+        straindrop = np.full(len(ScR), 3e-5)
+
+        arrays = coeff2mag_arrays(ScR, Length, Width, mu, straindrop)
+        for i, code in enumerate(ScR):
+            if scaling_index(code) < 0:
+                self.assertTrue(all(np.isnan(values[i]) for values in arrays), code)
+                continue
+            coeff, ARtable = kin2coeff(code)
+            MRLD, MRA, dMRLD, dMRA, MAR, ar_coeff, LAR, _ = coeff2mag(code, coeff, Length[i], Width[i], ARtable,
+                                                                      mu[i], straindrop[i])
+            expected = [MRLD, MRA, dMRLD, dMRA, MAR, ar_coeff[2], LAR]
+            np.testing.assert_allclose([values[i] for values in arrays], expected, rtol=1e-12, atol=1e-12,
+                                       err_msg=code)
+
+    def test_registry_is_read_only(self):
+        coeff, ARtable = kin2coeff('WC94-R')
+        with self.assertRaises(ValueError):
+            coeff[0, 0] = 0
+        self.assertIsNone(kin2coeff('XXXX')[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+from fqsha.FQSHA_Functions import truncated_gr_rates
+
+
+def truncated_gr_loop(mt, mag, Morate, b, bin, c=1.5, d=9.1):
+    """Rates of one fault, as computed by the per-fault loop of TruncatedGR."""
+    magnitude_range = np.arange(mt, mag + bin, bin)
+    M = 10 ** (c * magnitude_range + d)
+    Beta = (2 / 3) * b
+    Mt = 10 ** (c * mt + d)
+    Mxp = 10 ** (c * (mag + bin) + d)
+    TruncGR = (((Mt / M) ** Beta - (Mt / Mxp) ** Beta) / (1 - (Mt / Mxp) ** Beta))
+    Incremental = np.concatenate((np.diff(TruncGR[::-1])[::-1], [TruncGR[-1]]))
+    Incremental_Morate = Incremental * M
+    Incremental_Morate_balanced = Incremental_Morate * Morate / np.sum(Incremental_Morate)
+    return magnitude_range, Incremental * Incremental_Morate_balanced / Incremental_Morate
+
+
+class TestTruncatedGR(unittest.TestCase):
+    def test_matches_per_fault_loop(self):
+        rng = np.random.default_rng(3)
+        mts = np.round(rng.uniform(4.5, 5.5, 50), 1)
+        mags = np.round(mts + rng.uniform(0.0, 3.0, 50), 1)
+        Morates = 10 ** rng.uniform(14, 18, 50)
+        bs = rng.uniform(0.7, 1.3, 50)
+        magnitude_range, offsets, rates = truncated_gr_rates(mts, mags, Morates, bs, 0.1)
+        self.assertEqual(len(offsets), 51)
+        for i in range(50):
+            expected_range, expected = truncated_gr_loop(mts[i], mags[i], Morates[i], bs[i], 0.1)
+            # The loop gives 0/0 = NaN when the last bin (at Mmax + bin) has no moment
+            expected = np.nan_to_num(expected)
+            np.testing.assert_array_equal(magnitude_range[offsets[i]:offsets[i + 1]], expected_range)
+            np.testing.assert_allclose(rates[offsets[i]:offsets[i + 1]], expected, rtol=1e-12,
+                                       atol=1e-12 * np.max(expected))
+        # Each fault releases its moment rate
+        moment = np.add.reduceat(rates * 10 ** (1.5 * magnitude_range + 9.1), offsets[:-1])
+        np.testing.assert_allclose(moment, Morates, rtol=1e-12)
+
+    def test_empty_range(self):
+        magnitude_range, offsets, rates = truncated_gr_rates([5.0, 6.0, 5.0], [6.0, np.nan, 5.5], [1e16] * 3,
+                                                             [1.0] * 3, 0.1)
+        self.assertEqual(offsets[2] - offsets[1], 0)
+        self.assertEqual(len(rates), offsets[-1])
+        self.assertTrue(np.all(np.isfinite(rates)))
+
+
+if __name__ == '__main__':
+    unittest.main()